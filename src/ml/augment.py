@@ -0,0 +1,263 @@
+"""
+Batch augmentation engine on decoded arrays.
+
+Works on a whole batch at once: images are (B, S, S, 3) uint8 and labels are a
+list of B float32 arrays of YOLO rows (cls, cx, cy, w, h; normalized), the same
+layout as shards.py. Mosaic, scale/crop, flips and colour jitter are done with
+vectorized NumPy indexing and broadcasting, and boxes are transformed to match.
+
+Use it offline (augment_shard writes N augmented copies of a shard split, no
+extra JPEGs) or on the fly (iter_batches yields augmented batches from a shard
+with a seeded RNG, so runs are reproducible).
+"""
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+	import numpy as np
+	_HAS_NP = True
+except Exception:
+	np = None  # type: ignore
+	_HAS_NP = False
+
+try:
+	from .shards import ShardReader, ShardWriter  # type: ignore
+except Exception:
+	try:
+		from src.ml.shards import ShardReader, ShardWriter  # type: ignore
+	except Exception:
+		from shards import ShardReader, ShardWriter  # type: ignore
+
+PAD_VALUE = 114
+MIN_BOX_PX = 2.0
+MIN_VISIBLE = 0.2
+
+STRENGTHS: Dict[str, Dict[str, float]] = {
+	"light": {"flip_lr": 0.5, "flip_ud": 0.0, "brightness": 0.15, "contrast": 0.15, "saturation": 0.2, "scale": 0.1, "translate": 0.05, "mosaic": 0.0},
+	"medium": {"flip_lr": 0.5, "flip_ud": 0.1, "brightness": 0.25, "contrast": 0.25, "saturation": 0.4, "scale": 0.25, "translate": 0.1, "mosaic": 0.3},
+	"heavy": {"flip_lr": 0.5, "flip_ud": 0.5, "brightness": 0.4, "contrast": 0.4, "saturation": 0.7, "scale": 0.5, "translate": 0.2, "mosaic": 0.7},
+}
+
+
+def _to_xyxy(lab: "np.ndarray", w: float, h: float) -> "np.ndarray":
+	out = np.empty((len(lab), 4), dtype=np.float32)
+	out[:, 0] = (lab[:, 1] - lab[:, 3] / 2) * w
+	out[:, 1] = (lab[:, 2] - lab[:, 4] / 2) * h
+	out[:, 2] = (lab[:, 1] + lab[:, 3] / 2) * w
+	out[:, 3] = (lab[:, 2] + lab[:, 4] / 2) * h
+	return out
+
+
+def _to_yolo(cls: "np.ndarray", xyxy: "np.ndarray", w: float, h: float) -> "np.ndarray":
+	out = np.empty((len(cls), 5), dtype=np.float32)
+	out[:, 0] = cls
+	out[:, 1] = (xyxy[:, 0] + xyxy[:, 2]) / 2 / w
+	out[:, 2] = (xyxy[:, 1] + xyxy[:, 3]) / 2 / h
+	out[:, 3] = (xyxy[:, 2] - xyxy[:, 0]) / w
+	out[:, 4] = (xyxy[:, 3] - xyxy[:, 1]) / h
+	return out
+
+
+def _clip_boxes(cls: "np.ndarray", xyxy: "np.ndarray", w: float, h: float) -> Tuple["np.ndarray", "np.ndarray"]:
+	"""Clip to the image and drop boxes that became too small or mostly left the frame."""
+	area0 = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
+	c = xyxy.copy()
+	c[:, [0, 2]] = np.clip(c[:, [0, 2]], 0, w)
+	c[:, [1, 3]] = np.clip(c[:, [1, 3]], 0, h)
+	bw = c[:, 2] - c[:, 0]
+	bh = c[:, 3] - c[:, 1]
+	keep = (bw >= MIN_BOX_PX) & (bh >= MIN_BOX_PX) & (bw * bh >= MIN_VISIBLE * np.maximum(area0, 1e-6))
+	return cls[keep], c[keep]
+
+
+def letterbox_batch(images: List["np.ndarray"], labels: List["np.ndarray"], size: int) -> Tuple["np.ndarray", List["np.ndarray"]]:
+	"""Pad (and if needed nearest-downscale) variable-size images into a (B, size, size, 3) batch."""
+	batch = np.full((len(images), size, size, 3), PAD_VALUE, dtype=np.uint8)
+	out_labels: List["np.ndarray"] = []
+	for i, (im, lab) in enumerate(zip(images, labels)):
+		h, w = im.shape[:2]
+		r = min(1.0, size / max(h, w))
+		if r < 1.0:
+			nh, nw = max(1, int(h * r)), max(1, int(w * r))
+			ys = (np.arange(nh) / r).astype(np.intp).clip(0, h - 1)
+			xs = (np.arange(nw) / r).astype(np.intp).clip(0, w - 1)
+			im = im[ys[:, None], xs[None, :]]
+			h, w = nh, nw
+		top, left = (size - h) // 2, (size - w) // 2
+		batch[i, top:top + h, left:left + w] = im[:, :, :3]
+		lab = np.asarray(lab, dtype=np.float32).reshape(-1, 5)
+		xyxy = _to_xyxy(lab, w, h)
+		xyxy[:, [0, 2]] += left
+		xyxy[:, [1, 3]] += top
+		out_labels.append(_to_yolo(lab[:, 0], xyxy, size, size))
+	return batch, out_labels
+
+
+class BatchAugmenter:
+	"""
+	Seeded, vectorized augmentation for square uint8 batches.
+	Parameters come from a strength preset ("light", "medium", "heavy") and can
+	be overridden by keyword (e.g. mosaic=0.5).
+	"""
+
+	def __init__(self, strength: str = "light", seed: Optional[int] = None, **overrides: float):
+		if not _HAS_NP:
+			raise RuntimeError("numpy not installed. Install with: pip install numpy")
+		if strength not in STRENGTHS:
+			raise ValueError(f"unknown augmentation strength: {strength}")
+		self.params = dict(STRENGTHS[strength], **overrides)
+		self.rng = np.random.default_rng(seed)
+
+	def __call__(self, images: "np.ndarray", labels: List["np.ndarray"]) -> Tuple["np.ndarray", List["np.ndarray"]]:
+		p = self.params
+		labels = [np.asarray(l, dtype=np.float32).reshape(-1, 5) for l in labels]
+		if p["mosaic"] > 0 and len(images) > 1:
+			images, labels = self.mosaic(images, labels)
+		if p["scale"] > 0 or p["translate"] > 0:
+			images, labels = self.scale_crop(images, labels)
+		images, labels = self.flip(images, labels)
+		images = self.color_jitter(images)
+		return images, labels
+
+	def mosaic(self, images: "np.ndarray", labels: List["np.ndarray"]) -> Tuple["np.ndarray", List["np.ndarray"]]:
+		"""2x2 tiles of random batch members, cropped back to SxS around a random centre."""
+		b, s = images.shape[0], images.shape[1]
+		use = self.rng.random(b) < self.params["mosaic"]
+		if not use.any():
+			return images, labels
+		perms = np.stack([np.arange(b)] + [self.rng.permutation(b) for _ in range(3)])  # (4, B)
+		canvas = np.empty((b, 2 * s, 2 * s, 3), dtype=np.uint8)
+		offsets = ((0, 0), (0, s), (s, 0), (s, s))  # (y, x) of each quadrant
+		for q, (oy, ox) in enumerate(offsets):
+			canvas[:, oy:oy + s, ox:ox + s] = images[perms[q]]
+		y0 = self.rng.integers(s // 4, 3 * s // 4 + 1, size=b)
+		x0 = self.rng.integers(s // 4, 3 * s // 4 + 1, size=b)
+		rows = y0[:, None] + np.arange(s)[None, :]
+		cols = x0[:, None] + np.arange(s)[None, :]
+		crops = canvas[np.arange(b)[:, None, None], rows[:, :, None], cols[:, None, :]]
+		out = np.where(use[:, None, None, None], crops, images)
+
+		out_labels = list(labels)
+		for i in np.nonzero(use)[0]:
+			cls_parts, box_parts = [], []
+			for q, (oy, ox) in enumerate(offsets):
+				lab = labels[perms[q, i]]
+				xyxy = _to_xyxy(lab, s, s)
+				xyxy[:, [0, 2]] += ox - x0[i]
+				xyxy[:, [1, 3]] += oy - y0[i]
+				cls_parts.append(lab[:, 0])
+				box_parts.append(xyxy)
+			cls, xyxy = _clip_boxes(np.concatenate(cls_parts), np.concatenate(box_parts), s, s)
+			out_labels[i] = _to_yolo(cls, xyxy, s, s)
+		return out, out_labels
+
+	def scale_crop(self, images: "np.ndarray", labels: List["np.ndarray"]) -> Tuple["np.ndarray", List["np.ndarray"]]:
+		"""Random zoom in/out about the centre plus translation; nearest-neighbour gather for the whole batch."""
+		b, s = images.shape[0], images.shape[1]
+		sc = 1.0 + self.rng.uniform(-self.params["scale"], self.params["scale"], size=b)
+		tx = self.rng.uniform(-self.params["translate"], self.params["translate"], size=b) * s
+		ty = self.rng.uniform(-self.params["translate"], self.params["translate"], size=b) * s
+		# Output pixel u samples source (u - c - t) / sc + c
+		c = (s - 1) / 2.0
+		grid = np.arange(s, dtype=np.float32)[None, :]
+		src_x = np.rint((grid - c - tx[:, None]) / sc[:, None] + c).astype(np.intp)  # (B, S)
+		src_y = np.rint((grid - c - ty[:, None]) / sc[:, None] + c).astype(np.intp)
+		valid = ((src_y >= 0) & (src_y < s))[:, :, None] & ((src_x >= 0) & (src_x < s))[:, None, :]
+		out = images[
+			np.arange(b)[:, None, None],
+			src_y.clip(0, s - 1)[:, :, None],
+			src_x.clip(0, s - 1)[:, None, :],
+		]
+		out[~valid] = PAD_VALUE
+
+		out_labels = []
+		for i, lab in enumerate(labels):
+			xyxy = _to_xyxy(lab, s, s)
+			xyxy[:, [0, 2]] = (xyxy[:, [0, 2]] - c) * sc[i] + c + tx[i]
+			xyxy[:, [1, 3]] = (xyxy[:, [1, 3]] - c) * sc[i] + c + ty[i]
+			cls, xyxy = _clip_boxes(lab[:, 0], xyxy, s, s)
+			out_labels.append(_to_yolo(cls, xyxy, s, s))
+		return out, out_labels
+
+	def flip(self, images: "np.ndarray", labels: List["np.ndarray"]) -> Tuple["np.ndarray", List["np.ndarray"]]:
+		b = images.shape[0]
+		lr = self.rng.random(b) < self.params["flip_lr"]
+		ud = self.rng.random(b) < self.params["flip_ud"]
+		if lr.any():
+			images = np.where(lr[:, None, None, None], images[:, :, ::-1], images)
+		if ud.any():
+			images = np.where(ud[:, None, None, None], images[:, ::-1], images)
+		out_labels = []
+		for i, lab in enumerate(labels):
+			lab = lab.copy()
+			if lr[i]:
+				lab[:, 1] = 1.0 - lab[:, 1]
+			if ud[i]:
+				lab[:, 2] = 1.0 - lab[:, 2]
+			out_labels.append(lab)
+		return images, out_labels
+
+	def color_jitter(self, images: "np.ndarray") -> "np.ndarray":
+		"""Per-sample brightness, contrast and saturation factors, broadcast over the batch."""
+		p = self.params
+		if not (p["brightness"] or p["contrast"] or p["saturation"]):
+			return images
+		b = images.shape[0]
+		bright = 1.0 + self.rng.uniform(-p["brightness"], p["brightness"], size=b).astype(np.float32)
+		contrast = 1.0 + self.rng.uniform(-p["contrast"], p["contrast"], size=b).astype(np.float32)
+		sat = 1.0 + self.rng.uniform(-p["saturation"], p["saturation"], size=b).astype(np.float32)
+		x = images.astype(np.float32)
+		gray = (x @ np.array([0.299, 0.587, 0.114], dtype=np.float32))[..., None]
+		x = gray + (x - gray) * sat[:, None, None, None]
+		mean = gray.mean(axis=(1, 2, 3), keepdims=True)
+		x = (x - mean) * contrast[:, None, None, None] + mean
+		x *= bright[:, None, None, None]
+		return np.clip(x, 0, 255).astype(np.uint8)
+
+
+def iter_batches(
+	reader: "ShardReader",
+	batch_size: int,
+	size: int,
+	augmenter: Optional[BatchAugmenter] = None,
+	shuffle: bool = True,
+	seed: Optional[int] = None,
+) -> Iterator[Tuple["np.ndarray", List["np.ndarray"], List[str]]]:
+	"""On-the-fly pipeline: yields (images, labels, names) batches from a shard split."""
+	order = np.arange(len(reader))
+	if shuffle:
+		np.random.default_rng(seed).shuffle(order)
+	for start in range(0, len(order), batch_size):
+		idx = order[start:start + batch_size]
+		images, labels = letterbox_batch([reader.image(int(i)) for i in idx], [reader.label(int(i)) for i in idx], size)
+		if augmenter is not None:
+			images, labels = augmenter(images, labels)
+		yield images, labels, [reader.names[int(i)] for i in idx]
+
+
+def augment_shard(
+	shard_dir: Path,
+	split: str,
+	copies: int,
+	strength: str = "light",
+	size: int = 640,
+	batch_size: int = 32,
+	seed: int = 0,
+	out_split: Optional[str] = None,
+) -> Dict[str, Any]:
+	"""
+	Offline generation: write `copies` augmented versions of every image in a
+	shard split to a new split (default "<split>_aug") in the same directory.
+	"""
+	reader = ShardReader(shard_dir, split)
+	out_split = out_split or f"{split}_aug"
+	augmenter = BatchAugmenter(strength, seed=seed)
+	written = 0
+	with ShardWriter(shard_dir, out_split) as writer:
+		for c in range(copies):
+			for images, labels, names in iter_batches(reader, batch_size, size, augmenter, shuffle=True, seed=seed + c):
+				for im, lab, name in zip(images, labels, names):
+					p = Path(name)
+					writer.add(f"{p.stem}_aug{c}{p.suffix}", im, lab)
+					written += 1
+	return {"split": out_split, "images": written, "copies": copies, "strength": strength}
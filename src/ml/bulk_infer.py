@@ -0,0 +1,306 @@
+"""
+Offline bulk scoring of image archives.
+
+Inputs can be a directory (scanned recursively), a glob pattern, or a text file
+with one image path per line. Work is sharded over a process pool; every process
+loads the model once and is limited to --threads intra-op threads so N processes
+do not oversubscribe the CPU. Results stream to JSONL (one object per image) or
+to a Parquet directory of part files, with a checkpoint every --checkpoint_every
+images. Re-running the same command skips images already scored successfully;
+rows with ok=false are retried. A model that fails to load aborts the run
+instead of producing rows.
+
+Example:
+  python src/ml/bulk_infer.py --input "archive/2024/**/*.jpg" --out scores/2024.jsonl --model models/best.pt --procs 8
+"""
+import glob
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+try:
+	from .inference import load_model, mock_detect, predict_image  # type: ignore
+except Exception:
+	try:
+		from src.ml.inference import load_model, mock_detect, predict_image  # type: ignore
+	except Exception:
+		from inference import load_model, mock_detect, predict_image  # type: ignore
+
+try:
+	from .utils import limit_threads  # type: ignore
+except Exception:
+	try:
+		from src.ml.utils import limit_threads  # type: ignore
+	except Exception:
+		from utils import limit_threads  # type: ignore
+
+try:
+	import pyarrow as pa  # type: ignore
+	import pyarrow.parquet as pq  # type: ignore
+	_HAS_ARROW = True
+except Exception:
+	_HAS_ARROW = False
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".gif"}
+
+# Per-process state set by _init_worker
+_WORKER: Dict[str, Any] = {}
+
+
+class ModelLoadError(RuntimeError):
+	pass
+
+
+def collect_inputs(spec: str) -> List[str]:
+	"""Expand a directory, glob pattern or list file into a sorted list of image paths."""
+	p = Path(spec)
+	if p.is_dir():
+		paths = (str(x) for x in p.rglob("*") if x.is_file() and x.suffix.lower() in IMAGE_EXTS)
+	elif p.is_file() and p.suffix.lower() not in IMAGE_EXTS:
+		with p.open("r", encoding="utf-8") as f:
+			paths = (line.strip() for line in f if line.strip() and not line.startswith("#"))
+	else:
+		paths = (x for x in glob.glob(spec, recursive=True) if Path(x).suffix.lower() in IMAGE_EXTS)
+	return sorted(set(paths))
+
+
+def _init_worker(model_path: str, threads: int, mock: bool, overlays_dir: str) -> None:
+	limit_threads(threads)
+	_WORKER.update(model_path=model_path, mock=mock, overlays_dir=overlays_dir, model=None, load_error=None)
+	if mock:
+		return
+	# Load once per process. An exception here would make the pool respawn the
+	# worker forever, so the error is kept and raised by the first _score call,
+	# which aborts the run in the parent.
+	try:
+		_WORKER["model"] = load_model(model_path)
+		if _WORKER["model"] is None:
+			_WORKER["load_error"] = f"cannot load model {model_path!r} (missing file, or ultralytics not installed)"
+	except Exception as e:
+		_WORKER["load_error"] = f"cannot load model {model_path!r}: {type(e).__name__}: {e}"
+
+
+def _overlay_path(image_path: str) -> Optional[str]:
+	out_dir = _WORKER.get("overlays_dir")
+	if not out_dir:
+		return None
+	digest = hashlib.sha1(image_path.encode("utf-8")).hexdigest()[:12]
+	return str(Path(out_dir) / f"{Path(image_path).stem}_{digest}.png")
+
+
+def _score(image_path: str) -> Dict[str, Any]:
+	if _WORKER.get("load_error"):
+		raise ModelLoadError(_WORKER["load_error"])
+	t0 = time.perf_counter()
+	overlay = _overlay_path(image_path)
+	try:
+		if _WORKER.get("mock"):
+			res = mock_detect(image_path, overlay)
+		else:
+			res = predict_image(_WORKER["model"], image_path, overlay)
+		row = {
+			"path": image_path,
+			"ok": True,
+			"width": res.get("width"),
+			"height": res.get("height"),
+			"detections": res.get("detections", []),
+			"error": None,
+		}
+		if overlay:
+			row["overlay_path"] = overlay
+	except Exception as e:
+		row = {"path": image_path, "ok": False, "width": None, "height": None, "detections": [], "error": str(e)}
+	row["elapsed_ms"] = round((time.perf_counter() - t0) * 1000.0, 2)
+	return row
+
+
+class JsonlSink:
+	"""Appends one JSON object per line; checkpoint() flushes and fsyncs."""
+
+	def __init__(self, path: Path):
+		self.path = path
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		self._fh = self.path.open("a", encoding="utf-8")
+
+	@staticmethod
+	def done_paths(path: Path) -> Set[str]:
+		"""
+		Paths already scored successfully (failed rows are retried, and the last
+		row for a path wins); truncates a trailing partial line left by a killed run.
+		"""
+		done: Set[str] = set()
+		if not path.exists():
+			return done
+		good_end = 0
+		with path.open("rb") as f:
+			for line in f:
+				try:
+					row = json.loads(line)
+					if row.get("ok"):
+						done.add(row["path"])
+					else:
+						done.discard(row["path"])
+					good_end += len(line)
+				except Exception:
+					break
+		if good_end < path.stat().st_size:
+			with path.open("r+b") as f:
+				f.truncate(good_end)
+		return done
+
+	def write(self, row: Dict[str, Any]) -> None:
+		self._fh.write(json.dumps(row, separators=(",", ":")) + "\n")
+
+	def checkpoint(self) -> None:
+		self._fh.flush()
+		os.fsync(self._fh.fileno())
+
+	def close(self) -> None:
+		self.checkpoint()
+		self._fh.close()
+
+
+class ParquetSink:
+	"""Buffers rows and writes one part file per checkpoint into a directory."""
+
+	def __init__(self, path: Path):
+		if not _HAS_ARROW:
+			raise RuntimeError("pyarrow not installed. Install with: pip install pyarrow")
+		self.path = path
+		self.path.mkdir(parents=True, exist_ok=True)
+		self._rows: List[Dict[str, Any]] = []
+		self._part = len(list(self.path.glob("part-*.parquet")))
+
+	@staticmethod
+	def done_paths(path: Path) -> Set[str]:
+		done: Set[str] = set()
+		if not _HAS_ARROW or not path.is_dir():
+			return done
+		for part in sorted(path.glob("part-*.parquet")):
+			table = pq.read_table(part, columns=["path", "ok"])
+			for p, ok in zip(table.column("path").to_pylist(), table.column("ok").to_pylist()):
+				if ok:
+					done.add(p)
+				else:
+					done.discard(p)
+		return done
+
+	def write(self, row: Dict[str, Any]) -> None:
+		flat = dict(row)
+		flat["num_detections"] = len(row.get("detections", []))
+		# Nested boxes are stored as a JSON string column to keep the schema flat
+		flat["detections"] = json.dumps(row.get("detections", []), separators=(",", ":"))
+		flat.setdefault("overlay_path", None)
+		self._rows.append(flat)
+
+	def checkpoint(self) -> None:
+		if not self._rows:
+			return
+		table = pa.Table.from_pylist(self._rows)
+		final = self.path / f"part-{self._part:05d}.parquet"
+		tmp = final.with_suffix(".parquet.tmp")
+		pq.write_table(table, tmp)
+		os.replace(tmp, final)
+		self._part += 1
+		self._rows = []
+
+	def close(self) -> None:
+		self.checkpoint()
+
+
+def bulk_score(
+	inputs: Iterable[str],
+	out_path: Path,
+	model_path: str = "",
+	fmt: str = "jsonl",
+	procs: int = 0,
+	threads: int = 1,
+	overlays_dir: str = "",
+	checkpoint_every: int = 500,
+	mock: bool = False,
+) -> Dict[str, Any]:
+	"""Score inputs into out_path, skipping images already present there. Returns run stats."""
+	if not mock and not model_path:
+		raise ValueError("no model given (use --model or MODEL_PATH, or --mock)")
+	sink_cls = ParquetSink if fmt == "parquet" else JsonlSink
+	done = sink_cls.done_paths(out_path)
+	todo = [p for p in inputs if p not in done]
+	procs = procs or max(1, (os.cpu_count() or 1) // max(1, threads))
+	if overlays_dir:
+		Path(overlays_dir).mkdir(parents=True, exist_ok=True)
+
+	stats = {"skipped_existing": len(done), "scored": 0, "failed": 0, "total": len(todo) + len(done)}
+	if not todo:
+		return stats
+
+	sink = sink_cls(out_path)
+	t0 = time.perf_counter()
+	ctx = mp.get_context("spawn")
+	pool = ctx.Pool(
+		processes=procs,
+		initializer=_init_worker,
+		initargs=(model_path, threads, mock, overlays_dir),
+	)
+	try:
+		chunksize = max(1, min(32, len(todo) // (procs * 16)))
+		since_checkpoint = 0
+		for row in pool.imap_unordered(_score, todo, chunksize=chunksize):
+			sink.write(row)
+			stats["scored"] += 1
+			stats["failed"] += 0 if row["ok"] else 1
+			since_checkpoint += 1
+			if since_checkpoint >= checkpoint_every:
+				sink.checkpoint()
+				since_checkpoint = 0
+				rate = stats["scored"] / (time.perf_counter() - t0)
+				print(f"\rscored {stats['scored']}/{len(todo)} ({rate:.1f} img/s)", end="", file=sys.stderr, flush=True)
+		pool.close()
+	except KeyboardInterrupt:
+		pool.terminate()
+		print("\ninterrupted; completed results are saved, re-run to resume", file=sys.stderr)
+	finally:
+		sink.close()
+		pool.terminate()
+		pool.join()
+	elapsed = time.perf_counter() - t0
+	stats["elapsed_s"] = round(elapsed, 2)
+	stats["images_per_sec"] = round(stats["scored"] / elapsed, 2) if elapsed > 0 else 0.0
+	return stats
+
+
+def main():
+	import argparse
+	parser = argparse.ArgumentParser(description="Score an image archive offline with a process pool; resumable.")
+	parser.add_argument("--input", required=True, help="Directory, glob pattern (quote it) or text file of paths")
+	parser.add_argument("--out", required=True, help="Output .jsonl file, or directory for --format parquet")
+	parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+	parser.add_argument("--model", default=os.getenv("MODEL_PATH", ""), help="Model path (default: MODEL_PATH env)")
+	parser.add_argument("--procs", type=int, default=0, help="Worker processes (0 = CPUs / threads)")
+	parser.add_argument("--threads", type=int, default=1, help="Intra-op threads per process")
+	parser.add_argument("--overlays_dir", default="", help="Write overlay PNGs here (off by default)")
+	parser.add_argument("--checkpoint_every", type=int, default=500, help="Flush results every N images")
+	parser.add_argument("--mock", action="store_true", help="Use mock_detect instead of the model")
+	args = parser.parse_args()
+
+	inputs = collect_inputs(args.input)
+	stats = bulk_score(
+		inputs,
+		Path(args.out),
+		model_path=args.model,
+		fmt=args.format,
+		procs=args.procs,
+		threads=args.threads,
+		overlays_dir=args.overlays_dir,
+		checkpoint_every=args.checkpoint_every,
+		mock=args.mock,
+	)
+	print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+	main()
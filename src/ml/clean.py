@@ -1,7 +1,7 @@
 import csv
 import os
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List, Optional
 
 try:
 	from PIL import Image
@@ -10,57 +10,75 @@ except Exception:
 	_HAS_PIL = False
 
 
-def clean_annotations(images_dir: Path, annotations_csv: Path, out_csv: Path) -> Dict[str, int]:
+FIELDS = ["filename", "xmin", "ymin", "xmax", "ymax", "label"]
+
+
+def iter_clean_records(images_dir: Path, records: Iterable[Dict], stats: Optional[Dict[str, int]] = None) -> Iterator[Dict]:
+	"""
+	Validate and clamp annotation records as they stream in. Rows whose image is
+	missing or whose box is empty after clamping are dropped and counted in stats.
+	Image size comes from "width"/"height" on the record when present.
+	"""
 	images_dir = images_dir.resolve()
-	ok, dropped_missing, dropped_invalid, total = 0, 0, 0, 0
+	if stats is None:
+		stats = {}
+	for key in ("kept", "dropped_missing", "dropped_invalid", "total"):
+		stats.setdefault(key, 0)
+	for row in records:
+		stats["total"] += 1
+		fname = str(row["filename"]).strip()
+		img_path = images_dir / fname
+		if not img_path.exists():
+			stats["dropped_missing"] += 1
+			continue
+		try:
+			w, h = row.get("width"), row.get("height")
+			if w and h:
+				w, h = int(w), int(h)
+			elif _HAS_PIL:
+				with Image.open(img_path) as im:
+					w, h = im.size
+			else:
+				# fallback: skip dimension checks if PIL missing
+				w = h = None
+			xmin = int(float(row["xmin"]))
+			ymin = int(float(row["ymin"]))
+			xmax = int(float(row["xmax"]))
+			ymax = int(float(row["ymax"]))
+			# clamp boxes within image bounds if known
+			if w is not None and h is not None:
+				xmin = max(0, min(xmin, w - 1))
+				xmax = max(0, min(xmax, w - 1))
+				ymin = max(0, min(ymin, h - 1))
+				ymax = max(0, min(ymax, h - 1))
+			# ensure proper ordering
+			if xmax <= xmin or ymax <= ymin:
+				stats["dropped_invalid"] += 1
+				continue
+			stats["kept"] += 1
+			yield {
+				"filename": fname,
+				"xmin": xmin,
+				"ymin": ymin,
+				"xmax": xmax,
+				"ymax": ymax,
+				"label": str(row["label"]).strip(),
+			}
+		except Exception:
+			stats["dropped_invalid"] += 1
+
+
+def clean_annotations(images_dir: Path, annotations_csv: Path, out_csv: Path) -> Dict[str, int]:
+	stats: Dict[str, int] = {}
 	out_csv.parent.mkdir(parents=True, exist_ok=True)
 
 	with annotations_csv.open("r", newline="", encoding="utf-8") as fin, out_csv.open("w", newline="", encoding="utf-8") as fout:
-		reader = csv.DictReader(fin)
-		fieldnames = ["filename", "xmin", "ymin", "xmax", "ymax", "label"]
-		writer = csv.DictWriter(fout, fieldnames=fieldnames)
+		writer = csv.DictWriter(fout, fieldnames=FIELDS)
 		writer.writeheader()
-		for row in reader:
-			total += 1
-			fname = row["filename"].strip()
-			img_path = images_dir / fname
-			if not img_path.exists():
-				dropped_missing += 1
-				continue
-			try:
-				if _HAS_PIL:
-					with Image.open(img_path) as im:
-						w, h = im.size
-				else:
-					# fallback: skip dimension checks if PIL missing
-					w = h = None
-				xmin = int(float(row["xmin"]))
-				ymin = int(float(row["ymin"]))
-				xmax = int(float(row["xmax"]))
-				ymax = int(float(row["ymax"]))
-				# clamp boxes within image bounds if known
-				if w is not None and h is not None:
-					xmin = max(0, min(xmin, w - 1))
-					xmax = max(0, min(xmax, w - 1))
-					ymin = max(0, min(ymin, h - 1))
-					ymax = max(0, min(ymax, h - 1))
-				# ensure proper ordering
-				if xmax <= xmin or ymax <= ymin:
-					dropped_invalid += 1
-					continue
-				writer.writerow({
-					"filename": fname,
-					"xmin": xmin,
-					"ymin": ymin,
-					"xmax": xmax,
-					"ymax": ymax,
-					"label": row["label"].strip(),
-				})
-				ok += 1
-			except Exception:
-				dropped_invalid += 1
+		for rec in iter_clean_records(images_dir, csv.DictReader(fin), stats):
+			writer.writerow(rec)
 
-	return {"kept": ok, "dropped_missing": dropped_missing, "dropped_invalid": dropped_invalid, "total": total}
+	return {"kept": stats["kept"], "dropped_missing": stats["dropped_missing"], "dropped_invalid": stats["dropped_invalid"], "total": stats["total"]}
 
 
 if __name__ == "__main__":
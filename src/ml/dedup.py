@@ -0,0 +1,352 @@
+"""
+Near-duplicate detection for image datasets using perceptual hashes.
+
+Burst shots from classification folders (make_fullbox_csv / retrain_quality) are
+often near-identical. This stage hashes every image in parallel, indexes the
+hashes in a BK-tree for Hamming-radius queries, and groups near-duplicates with
+union-find. The JSON report can be passed to preprocess_simple.py --groups_json
+so every group lands in a single split, and --drop_csv keeps one image per group.
+"""
+import csv
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+	from PIL import Image
+	_HAS_PIL = True
+except Exception:
+	_HAS_PIL = False
+
+try:
+	import numpy as np
+	_HAS_NP = True
+except Exception:
+	_HAS_NP = False
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".gif"}
+STREAM_BATCH = 64
+
+
+def dhash(img_path: Path, hash_size: int = 8) -> int:
+	"""Difference hash: compares horizontally adjacent pixels of a tiny grayscale image."""
+	with Image.open(img_path) as im:
+		small = im.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+		px = list(small.getdata())
+	value = 0
+	for row in range(hash_size):
+		base = row * (hash_size + 1)
+		for col in range(hash_size):
+			value = (value << 1) | (1 if px[base + col] > px[base + col + 1] else 0)
+	return value
+
+
+def _dct_matrix(n: int) -> "np.ndarray":
+	k = np.arange(n)[:, None]
+	i = np.arange(n)[None, :]
+	m = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+	m[0, :] = np.sqrt(1.0 / n)
+	return m
+
+
+def phash(img_path: Path, hash_size: int = 8, highfreq_factor: int = 4) -> int:
+	"""DCT hash: sign of the low-frequency DCT coefficients relative to their median."""
+	n = hash_size * highfreq_factor
+	with Image.open(img_path) as im:
+		small = np.asarray(im.convert("L").resize((n, n), Image.Resampling.BILINEAR), dtype=np.float64)
+	d = _dct_matrix(n)
+	low = (d @ small @ d.T)[:hash_size, :hash_size]
+	bits = (low > np.median(low)).ravel()
+	value = 0
+	for b in bits:
+		value = (value << 1) | int(b)
+	return value
+
+
+def _hash_one(args: Tuple[str, str, int]) -> Tuple[str, Optional[int]]:
+	path, method, hash_size = args
+	try:
+		fn = phash if method == "phash" else dhash
+		return path, fn(Path(path), hash_size)
+	except Exception:
+		return path, None
+
+
+def hash_images(paths: Iterable[Path], method: str = "dhash", hash_size: int = 8, workers: int = 0) -> Dict[str, int]:
+	"""Hash images in a process pool. Unreadable images are skipped."""
+	if not _HAS_PIL:
+		raise RuntimeError("Pillow not installed. Install with: pip install Pillow")
+	if method == "phash" and not _HAS_NP:
+		raise RuntimeError("numpy not installed (needed for phash). Install with: pip install numpy")
+	jobs = [(str(p), method, hash_size) for p in paths]
+	workers = workers or os.cpu_count() or 1
+	hashes: Dict[str, int] = {}
+	if workers == 1 or len(jobs) < 64:
+		for path, h in map(_hash_one, jobs):
+			if h is not None:
+				hashes[path] = h
+		return hashes
+	with ProcessPoolExecutor(max_workers=workers) as pool:
+		for path, h in pool.map(_hash_one, jobs, chunksize=max(1, len(jobs) // (workers * 8))):
+			if h is not None:
+				hashes[path] = h
+	return hashes
+
+
+def _hash_batch(jobs: List[Tuple[str, str, int]]) -> List[Tuple[str, Optional[int]]]:
+	return [_hash_one(job) for job in jobs]
+
+
+def hash_image_stream(paths: Iterable[Path], method: str = "dhash", hash_size: int = 8, workers: int = 0) -> Dict[str, int]:
+	"""
+	Like hash_images, but consumes paths lazily: batches go to the pool as they
+	arrive, so hashing overlaps with whatever is producing the paths.
+	"""
+	if not _HAS_PIL:
+		raise RuntimeError("Pillow not installed. Install with: pip install Pillow")
+	if method == "phash" and not _HAS_NP:
+		raise RuntimeError("numpy not installed (needed for phash). Install with: pip install numpy")
+	workers = workers or os.cpu_count() or 1
+	hashes: Dict[str, int] = {}
+	# spawn: this may run on a worker thread of pipeline.py, where forking is unsafe
+	with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+		pending = []
+		batch: List[Tuple[str, str, int]] = []
+		for p in paths:
+			batch.append((str(p), method, hash_size))
+			if len(batch) >= STREAM_BATCH:
+				pending.append(pool.submit(_hash_batch, batch))
+				batch = []
+		if batch:
+			pending.append(pool.submit(_hash_batch, batch))
+		for fut in pending:
+			for path, h in fut.result():
+				if h is not None:
+					hashes[path] = h
+	return hashes
+
+
+def hamming(a: int, b: int) -> int:
+	return bin(a ^ b).count("1")
+
+
+class BKTree:
+	"""
+	Burkhard-Keller tree over integer hashes with Hamming distance.
+	Radius queries only descend into children whose edge distance is within
+	[d - radius, d + radius], which prunes most of the tree for small radii.
+	"""
+
+	def __init__(self):
+		self._root: Optional[list] = None  # node = [hash, items, {distance: child}]
+		self._size = 0
+
+	def __len__(self) -> int:
+		return self._size
+
+	def add(self, value: int, item: str) -> None:
+		self._size += 1
+		if self._root is None:
+			self._root = [value, [item], {}]
+			return
+		node = self._root
+		while True:
+			d = hamming(value, node[0])
+			if d == 0:
+				node[1].append(item)
+				return
+			child = node[2].get(d)
+			if child is None:
+				node[2][d] = [value, [item], {}]
+				return
+			node = child
+
+	def query(self, value: int, radius: int) -> List[Tuple[int, str]]:
+		"""Return (distance, item) for every indexed item within radius of value."""
+		out: List[Tuple[int, str]] = []
+		if self._root is None:
+			return out
+		stack = [self._root]
+		while stack:
+			node = stack.pop()
+			d = hamming(value, node[0])
+			if d <= radius:
+				out.extend((d, it) for it in node[1])
+			lo, hi = d - radius, d + radius
+			for edge, child in node[2].items():
+				if lo <= edge <= hi:
+					stack.append(child)
+		return out
+
+
+def group_near_duplicates(hashes: Dict[str, int], radius: int = 4) -> List[List[str]]:
+	"""Union-find over all pairs within radius; returns groups sorted, singletons included."""
+	parent: Dict[str, str] = {k: k for k in hashes}
+
+	def find(x: str) -> str:
+		while parent[x] != x:
+			parent[x] = parent[parent[x]]
+			x = parent[x]
+		return x
+
+	tree = BKTree()
+	# Query before inserting so each pair is seen once
+	for item in sorted(hashes):
+		h = hashes[item]
+		for _, other in tree.query(h, radius):
+			ra, rb = find(item), find(other)
+			if ra != rb:
+				parent[max(ra, rb)] = min(ra, rb)
+		tree.add(h, item)
+
+	groups: Dict[str, List[str]] = {}
+	for item in hashes:
+		groups.setdefault(find(item), []).append(item)
+	return sorted((sorted(g) for g in groups.values()), key=lambda g: g[0])
+
+
+def _list_images(images_dir: Path, annotations_csv: Optional[Path]) -> List[Path]:
+	if annotations_csv is not None:
+		with annotations_csv.open("r", newline="", encoding="utf-8") as f:
+			names = sorted({row["filename"] for row in csv.DictReader(f)})
+		return [images_dir / n for n in names if (images_dir / n).exists()]
+	return sorted(p for p in images_dir.rglob("*") if p.is_file() and p.suffix.lower() in IMAGE_EXTS)
+
+
+def _write_report(
+	images_dir: Path,
+	raw: Dict[str, int],
+	num_paths: int,
+	method: str,
+	radius: int,
+	report_json: Path,
+) -> Tuple[Dict, List[List[str]]]:
+	hashes = {Path(p).relative_to(images_dir).as_posix(): h for p, h in raw.items()}
+	groups = group_near_duplicates(hashes, radius)
+
+	dup_groups = [g for g in groups if len(g) > 1]
+	group_of = {name: gi for gi, g in enumerate(groups) for name in g}
+	report = {
+		"method": method,
+		"radius": radius,
+		"num_images": len(hashes),
+		"num_unreadable": num_paths - len(raw),
+		"num_groups": len(groups),
+		"num_duplicate_groups": len(dup_groups),
+		"num_redundant_images": sum(len(g) - 1 for g in dup_groups),
+		"duplicate_groups": dup_groups,
+		"group_of": group_of,
+	}
+	report_json.parent.mkdir(parents=True, exist_ok=True)
+	with report_json.open("w", encoding="utf-8") as f:
+		json.dump(report, f, indent=2)
+	return report, groups
+
+
+def _summary(report: Dict) -> Dict:
+	return {k: v for k, v in report.items() if k not in ("duplicate_groups", "group_of")}
+
+
+def dedup_dataset(
+	images_dir: Path,
+	report_json: Path,
+	annotations_csv: Optional[Path] = None,
+	out_csv: Optional[Path] = None,
+	method: str = "dhash",
+	radius: int = 4,
+	workers: int = 0,
+) -> Dict:
+	"""
+	Hash, group and report near-duplicates. Group keys in the report are file
+	names relative to images_dir (the same keys used in annotation CSVs).
+	If out_csv is set, writes annotations_csv filtered to one image per group.
+	"""
+	images_dir = images_dir.resolve()
+	paths = _list_images(images_dir, annotations_csv)
+	raw = hash_images(paths, method=method, workers=workers)
+	report, groups = _write_report(images_dir, raw, len(paths), method, radius, report_json)
+
+	if out_csv is not None and annotations_csv is not None:
+		keep = {g[0] for g in groups}
+		out_csv.parent.mkdir(parents=True, exist_ok=True)
+		kept_rows = 0
+		with annotations_csv.open("r", newline="", encoding="utf-8") as fin, out_csv.open("w", newline="", encoding="utf-8") as fout:
+			reader = csv.DictReader(fin)
+			writer = csv.DictWriter(fout, fieldnames=reader.fieldnames or ["filename", "xmin", "ymin", "xmax", "ymax", "label"])
+			writer.writeheader()
+			for row in reader:
+				if row["filename"] in keep:
+					writer.writerow(row)
+					kept_rows += 1
+		report["kept_rows"] = kept_rows
+
+	return _summary(report)
+
+
+def dedup_records(
+	images_dir: Path,
+	records: Iterable[Dict],
+	report_json: Path,
+	method: str = "dhash",
+	radius: int = 4,
+	workers: int = 0,
+) -> Dict:
+	"""
+	Streaming variant of dedup_dataset for pipeline.py: hashes each record's image
+	as the record arrives, then groups and writes the same report.
+	"""
+	images_dir = images_dir.resolve()
+	seen = set()
+	found = [0]
+
+	def paths() -> Iterator[Path]:
+		for r in records:
+			name = str(r["filename"])
+			if name in seen:
+				continue
+			seen.add(name)
+			p = images_dir / name
+			if p.exists():
+				found[0] += 1
+				yield p
+
+	raw = hash_image_stream(paths(), method=method, workers=workers)
+	report, _ = _write_report(images_dir, raw, found[0], method, radius, report_json)
+	return _summary(report)
+
+
+def load_groups(report_json: Path) -> Dict[str, int]:
+	"""Read the filename -> group id mapping from a dedup report."""
+	with report_json.open("r", encoding="utf-8") as f:
+		return {k: int(v) for k, v in json.load(f).get("group_of", {}).items()}
+
+
+def main():
+	import argparse
+	parser = argparse.ArgumentParser(description="Find near-duplicate images with perceptual hashes.")
+	parser.add_argument("--images_dir", required=True, help="Directory containing images.")
+	parser.add_argument("--annotations_csv", default=None, help="Optional CSV; only its filenames are hashed.")
+	parser.add_argument("--report", default="data/raw/dedup_report.json", help="Output JSON report.")
+	parser.add_argument("--drop_csv", default=None, help="Write annotations filtered to one image per group.")
+	parser.add_argument("--method", choices=["dhash", "phash"], default="dhash")
+	parser.add_argument("--radius", type=int, default=4, help="Max Hamming distance (of 64 bits) to call two images duplicates.")
+	parser.add_argument("--workers", type=int, default=0, help="Hashing processes (0 = all CPUs).")
+	args = parser.parse_args()
+
+	stats = dedup_dataset(
+		Path(args.images_dir),
+		Path(args.report),
+		annotations_csv=Path(args.annotations_csv) if args.annotations_csv else None,
+		out_csv=Path(args.drop_csv) if args.drop_csv else None,
+		method=args.method,
+		radius=args.radius,
+		workers=args.workers,
+	)
+	print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+	main()
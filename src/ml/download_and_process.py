@@ -1,39 +1,24 @@
-import os
-import zipfile
-import requests
 from pathlib import Path
-import time
+from typing import Iterable, Optional
 
-def download_dataset(url: str, output_path: Path) -> Path:
-    """Download dataset from URL with progress."""
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    print(f"Downloading from {url}...")
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-    
-    total_size = int(response.headers.get('content-length', 0))
-    downloaded = 0
-    
-    with open(output_path, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            if chunk:
-                f.write(chunk)
-                downloaded += len(chunk)
-                if total_size > 0:
-                    percent = (downloaded / total_size) * 100
-                    print(f"\rProgress: {percent:.1f}%", end="", flush=True)
-    
-    print(f"\nDownloaded: {output_path}")
-    return output_path
+try:
+    from .downloader import download, extract_archive  # type: ignore
+    from .pipeline import build_dataset_pipeline, print_summary  # type: ignore
+except Exception:
+    try:
+        from src.ml.downloader import download, extract_archive  # type: ignore
+        from src.ml.pipeline import build_dataset_pipeline, print_summary  # type: ignore
+    except Exception:
+        from downloader import download, extract_archive  # type: ignore
+        from pipeline import build_dataset_pipeline, print_summary  # type: ignore
 
-def extract_zip(zip_path: Path, extract_to: Path) -> Path:
+def download_dataset(url: str, output_path: Path, sha256: Optional[str] = None, segments: int = 4) -> Path:
+    """Download dataset from URL with progress (resumable, parallel ranges, optional SHA-256 check)."""
+    return download(url, output_path, sha256=sha256, segments=segments)
+
+def extract_zip(zip_path: Path, extract_to: Path, extensions: Optional[Iterable[str]] = None, workers: int = 4) -> Path:
     """Extract ZIP file and return the extracted folder path."""
-    print(f"Extracting {zip_path}...")
-    extract_to.mkdir(parents=True, exist_ok=True)
-    
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(extract_to)
+    extract_archive(zip_path, extract_to, extensions=extensions, workers=workers)
     
     # Find the main extracted folder
     extracted_folders = [f for f in extract_to.iterdir() if f.is_dir()]
@@ -77,17 +62,18 @@ if __name__ == "__main__":
     # Process the dataset
     dataset_path = process_soybean_dataset()
     
-    # Generate annotations CSV
-    print("Generating annotations CSV...")
-    os.system(f'.venv\\Scripts\\python src\\ml\\make_fullbox_csv.py --root_dir "{dataset_path}" --images_out data\\raw\\images --out_csv data\\raw\\annotations.csv')
-    
-    # Clean annotations
-    print("Cleaning annotations...")
-    os.system('.venv\\Scripts\\python src\\ml\\clean.py --images_dir data\\raw\\images --annotations_csv data\\raw\\annotations.csv --out_csv data\\raw\\annotations_clean.csv')
-    
-    # Convert to YOLO format
-    print("Converting to YOLO format...")
-    os.system('.venv\\Scripts\\python src\\ml\\preprocess.py --images_dir data\\raw\\images --annotations_csv data\\raw\\annotations_clean.csv --out_dir data\\yolo_dataset --augment_copies 1 --aug_strength light')
+    # make_fullbox -> clean (+ dedup) -> convert, in-process; unchanged stages are skipped
+    print("Running data pipeline...")
+    pipeline = build_dataset_pipeline(
+        dataset_path,
+        raw_dir=Path("data/raw"),
+        out_dir=Path("data/yolo_dataset"),
+        augment_copies=1,
+        aug_strength="light",
+        write_shards=True,
+    )
+    reports = pipeline.run()
+    print_summary(reports, pipeline.total_s)
     
     print("Dataset processing complete!")
     print("Results:")
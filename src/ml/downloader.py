@@ -0,0 +1,442 @@
+"""
+Resumable, parallel, checksum-verified downloads and streaming extraction.
+
+download() fetches a URL into <out>.part using up to `segments` concurrent
+HTTP Range requests over one pooled requests.Session. Progress per segment is
+checkpointed to <out>.part.json, so an interrupted download (crash, Ctrl-C,
+dropped link) resumes where each segment stopped. Resuming requires the same
+ETag, or (for servers without ETags) the same Last-Modified and size; anything
+else, including a server that sends neither, restarts from zero, and If-Range
+guards against the file changing between requests. Servers without range
+support fall back to a single stream. The finished file is verified against an
+optional SHA-256 before it is moved into place.
+
+extract_archive() streams zip members to disk on a bounded thread pool,
+optionally keeping only some extensions, and refuses entries that would land
+outside the target directory (zip-slip).
+
+Example:
+  python src/ml/downloader.py --url https://host/soybean.zip --out data/raw/soybean.zip \\
+      --sha256 <hex> --segments 8 --extract_to data/raw --exts jpg,jpeg,png,csv
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+try:
+	import requests
+	from requests.adapters import HTTPAdapter
+	_HAS_REQUESTS = True
+except Exception:
+	_HAS_REQUESTS = False
+
+try:
+	from urllib3.util.retry import Retry  # type: ignore
+except Exception:
+	Retry = None  # type: ignore
+
+CHUNK_SIZE = 1024 * 1024
+MIN_SEGMENT_BYTES = 8 * 1024 * 1024
+CHECKPOINT_BYTES = 16 * 1024 * 1024
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _require_requests() -> None:
+	if not _HAS_REQUESTS:
+		raise RuntimeError("requests not installed. Install with: pip install requests")
+
+
+def make_session(pool_size: int = 8, retries: int = 5, backoff: float = 0.5) -> "requests.Session":
+	"""Session with a connection pool sized for the segment workers and transport-level retries."""
+	_require_requests()
+	session = requests.Session()
+	kwargs: Dict[str, Any] = {"pool_connections": pool_size, "pool_maxsize": pool_size}
+	if Retry is not None:
+		kwargs["max_retries"] = Retry(
+			total=retries,
+			backoff_factor=backoff,
+			status_forcelist=RETRY_STATUSES,
+			allowed_methods=frozenset({"GET", "HEAD"}),
+			raise_on_status=False,
+		)
+	adapter = HTTPAdapter(**kwargs)
+	session.mount("http://", adapter)
+	session.mount("https://", adapter)
+	return session
+
+
+def sha256_file(path: Path, chunk_size: int = CHUNK_SIZE) -> str:
+	h = hashlib.sha256()
+	with open(path, "rb") as f:
+		for chunk in iter(lambda: f.read(chunk_size), b""):
+			h.update(chunk)
+	return h.hexdigest()
+
+
+def _probe(session: "requests.Session", url: str, timeout: float) -> Dict[str, Any]:
+	"""Size, range support and validator of the remote file (HEAD, falling back to a 1-byte GET)."""
+	resp = session.head(url, allow_redirects=True, timeout=timeout)
+	if resp.status_code >= 400 or "content-length" not in resp.headers:
+		resp = session.get(url, headers={"Range": "bytes=0-0"}, stream=True, timeout=timeout)
+		resp.close()
+		resp.raise_for_status()
+		if resp.status_code == 206:
+			total = resp.headers.get("content-range", "").rsplit("/", 1)[-1]
+			return {
+				"size": int(total) if total.isdigit() else None,
+				"ranges": True,
+				"etag": resp.headers.get("etag"),
+				"last_modified": resp.headers.get("last-modified"),
+				"url": resp.url,
+			}
+	size = resp.headers.get("content-length")
+	return {
+		"size": int(size) if size and size.isdigit() else None,
+		"ranges": resp.headers.get("accept-ranges", "").lower() == "bytes",
+		"etag": resp.headers.get("etag"),
+		"last_modified": resp.headers.get("last-modified"),
+		"url": resp.url,
+	}
+
+
+def _same_remote(saved: Optional[Dict[str, Any]], meta: Dict[str, Any]) -> bool:
+	"""
+	True only if saved progress provably belongs to the same remote file: equal
+	ETags, or (without ETags) equal Last-Modified and size. Missing validators
+	never match, so the download starts over.
+	"""
+	if not saved or saved.get("size") != meta["size"]:
+		return False
+	if meta.get("etag") or saved.get("etag"):
+		return saved.get("etag") == meta.get("etag")
+	return bool(meta.get("last_modified")) and meta["size"] is not None and saved.get("last_modified") == meta["last_modified"]
+
+
+def _validator(meta: Dict[str, Any]) -> Optional[str]:
+	"""If-Range value: the server answers 200 with the whole file if it no longer matches."""
+	return meta.get("etag") or meta.get("last_modified")
+
+
+def _load_state(path: Path) -> Optional[Dict[str, Any]]:
+	try:
+		with path.open("r", encoding="utf-8") as f:
+			return json.load(f)
+	except Exception:
+		return None
+
+
+class _SegmentState:
+	"""Per-segment byte progress, checkpointed to a JSON sidecar."""
+
+	def __init__(self, path: Path, meta: Dict[str, Any], segments: List[List[int]], on_progress: Optional[Callable[[int], None]] = None):
+		self.path = path
+		self.meta = meta
+		self.segments = segments  # [start, end_inclusive, done]
+		self.on_progress = on_progress
+		self._lock = threading.Lock()
+		self._since_save = 0
+
+	@classmethod
+	def load_or_create(
+		cls,
+		path: Path,
+		meta: Dict[str, Any],
+		n_segments: int,
+		on_progress: Optional[Callable[[int], None]] = None,
+	) -> "_SegmentState":
+		"""Resume the saved segment layout if it describes the same remote file (see _same_remote)."""
+		saved = _load_state(path) if path.exists() else None
+		if _same_remote(saved, meta) and saved.get("segments"):
+			return cls(path, meta, saved["segments"], on_progress)
+		size = meta["size"]
+		step = -(-size // n_segments)
+		segs = [[s, min(size, s + step) - 1, 0] for s in range(0, size, step)]
+		return cls(path, meta, segs, on_progress)
+
+	@property
+	def done(self) -> int:
+		return sum(s[2] for s in self.segments)
+
+	def reset(self) -> None:
+		for s in self.segments:
+			s[2] = 0
+
+	def advance(self, i: int, n: int) -> None:
+		with self._lock:
+			self.segments[i][2] += n
+			self._since_save += n
+			if self._since_save >= CHECKPOINT_BYTES:
+				self._save_locked()
+		if self.on_progress is not None:
+			self.on_progress(n)
+
+	def save(self) -> None:
+		with self._lock:
+			self._save_locked()
+
+	def _save_locked(self) -> None:
+		self._since_save = 0
+		tmp = self.path.with_suffix(".tmp")
+		with tmp.open("w", encoding="utf-8") as f:
+			json.dump({**self.meta, "segments": self.segments}, f)
+		os.replace(tmp, self.path)
+
+
+def _fetch_segment(
+	session: "requests.Session",
+	url: str,
+	part_path: Path,
+	state: _SegmentState,
+	i: int,
+	retries: int,
+	timeout: float,
+) -> None:
+	attempt = 0
+	while True:
+		start, end, done = state.segments[i]
+		if start + done > end:
+			return
+		try:
+			headers = {"Range": f"bytes={start + done}-{end}"}
+			validator = _validator(state.meta)
+			if validator:
+				headers["If-Range"] = validator
+			with session.get(url, headers=headers, stream=True, timeout=timeout) as resp:
+				if resp.status_code != 206:
+					raise IOError(f"expected 206 for range request, got {resp.status_code} (remote file changed?)")
+				with open(part_path, "r+b") as f:
+					f.seek(start + done)
+					for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+						if chunk:
+							f.write(chunk)
+							state.advance(i, len(chunk))
+			if state.segments[i][2] == done:
+				raise IOError("range request returned no data")
+			attempt = 0
+		except Exception:
+			attempt += 1
+			if attempt > retries:
+				state.save()
+				raise
+			time.sleep(min(30.0, 0.5 * 2 ** attempt))
+
+
+def _fetch_single(
+	session: "requests.Session",
+	url: str,
+	part_path: Path,
+	resume: bool,
+	retries: int,
+	timeout: float,
+	progress: Callable[[int], None],
+	validator: Optional[str] = None,
+) -> None:
+	"""
+	One stream; continues an existing .part with a Range request when resume is
+	set. If-Range (validator) makes a changed file come back whole (200), which
+	restarts the .part from zero.
+	"""
+	attempt = 0
+	while True:
+		offset = part_path.stat().st_size if resume and part_path.exists() else 0
+		try:
+			headers = {"Range": f"bytes={offset}-"} if offset else {}
+			if offset and validator:
+				headers["If-Range"] = validator
+			with session.get(url, headers=headers, stream=True, timeout=timeout) as resp:
+				if resp.status_code == 416:
+					return  # already complete
+				resp.raise_for_status()
+				if offset and resp.status_code != 206:
+					offset = 0
+				with open(part_path, "ab" if offset else "wb") as f:
+					for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+						if chunk:
+							f.write(chunk)
+							progress(len(chunk))
+			return
+		except Exception:
+			attempt += 1
+			if attempt > retries:
+				raise
+			time.sleep(min(30.0, 0.5 * 2 ** attempt))
+
+
+def download(
+	url: str,
+	output_path: Path,
+	sha256: Optional[str] = None,
+	segments: int = 4,
+	session: Optional["requests.Session"] = None,
+	retries: int = 5,
+	timeout: float = 60.0,
+	show_progress: bool = True,
+) -> Path:
+	"""
+	Download url to output_path, resuming any earlier partial attempt.
+	Raises ValueError if the finished file does not match sha256.
+	"""
+	output_path = Path(output_path)
+	output_path.parent.mkdir(parents=True, exist_ok=True)
+	if output_path.exists() and (not sha256 or sha256_file(output_path) == sha256.lower()):
+		return output_path
+	session = session or make_session(pool_size=max(1, segments))
+	part_path = output_path.with_name(output_path.name + ".part")
+	state_path = output_path.with_name(output_path.name + ".part.json")
+
+	info = _probe(session, url, timeout)
+	url = info["url"] or url
+	size = info["size"]
+	lock = threading.Lock()
+	counter = {"done": 0}
+
+	def progress(n: int) -> None:
+		with lock:
+			counter["done"] += n
+			if show_progress and size:
+				print(f"\rProgress: {counter['done'] / size * 100:.1f}%", end="", flush=True)
+
+	print(f"Downloading from {url}...")
+	parallel = info["ranges"] and size and segments > 1 and size >= 2 * MIN_SEGMENT_BYTES
+	if info["ranges"] and size:
+		n = max(1, min(segments, size // MIN_SEGMENT_BYTES)) if parallel else 1
+		meta = {"url": url, "size": size, "etag": info["etag"], "last_modified": info["last_modified"]}
+		state = _SegmentState.load_or_create(state_path, meta, n, progress)
+		if not part_path.exists() or part_path.stat().st_size != size or state.done == 0:
+			state.reset()
+			with open(part_path, "wb") as f:
+				f.truncate(size)
+		elif state.done:
+			print(f"Resuming at {state.done / size * 100:.1f}%")
+		counter["done"] = state.done
+		state.save()
+		with ThreadPoolExecutor(max_workers=len(state.segments)) as pool:
+			futures = [
+				pool.submit(_fetch_segment, session, url, part_path, state, i, retries, timeout)
+				for i in range(len(state.segments))
+			]
+			try:
+				for fut in futures:
+					fut.result()
+			finally:
+				state.save()
+	else:
+		meta = {"url": url, "size": size, "etag": info["etag"], "last_modified": info["last_modified"]}
+		resume = bool(info["ranges"]) and _same_remote(_load_state(state_path), meta)
+		if not resume:
+			part_path.unlink(missing_ok=True)
+		with state_path.open("w", encoding="utf-8") as f:
+			json.dump(meta, f)
+		_fetch_single(session, url, part_path, resume, retries, timeout, progress, _validator(meta))
+	print()
+
+	if size is not None and part_path.stat().st_size != size:
+		raise IOError(f"incomplete download: {part_path.stat().st_size} of {size} bytes")
+	if sha256:
+		digest = sha256_file(part_path)
+		if digest != sha256.lower():
+			part_path.unlink(missing_ok=True)
+			state_path.unlink(missing_ok=True)
+			raise ValueError(f"SHA-256 mismatch for {url}: expected {sha256.lower()}, got {digest}")
+	os.replace(part_path, output_path)
+	state_path.unlink(missing_ok=True)
+	print(f"Downloaded: {output_path}")
+	return output_path
+
+
+def _safe_target(root: Path, name: str) -> Optional[Path]:
+	"""Destination for an archive member, or None if it would escape root."""
+	target = (root / name).resolve()
+	if target != root and root not in target.parents:
+		return None
+	return target
+
+
+def extract_archive(
+	zip_path: Path,
+	extract_to: Path,
+	extensions: Optional[Iterable[str]] = None,
+	workers: int = 4,
+) -> List[Path]:
+	"""
+	Stream zip members to extract_to on a bounded thread pool and return the
+	written paths. extensions (e.g. {"jpg", "png"}) keeps only matching files.
+	Members with absolute paths or '..' components that leave extract_to are skipped.
+	"""
+	extract_to = Path(extract_to)
+	extract_to.mkdir(parents=True, exist_ok=True)
+	root = extract_to.resolve()
+	exts = {e.lower().lstrip(".") for e in extensions} if extensions else None
+	local = threading.local()
+
+	def handle() -> zipfile.ZipFile:
+		zf = getattr(local, "zf", None)
+		if zf is None:
+			zf = local.zf = zipfile.ZipFile(zip_path, "r")
+			opened.append(zf)
+		return zf
+
+	def extract_one(info: zipfile.ZipInfo, target: Path) -> Path:
+		target.parent.mkdir(parents=True, exist_ok=True)
+		with handle().open(info, "r") as src, open(target, "wb") as dst:
+			shutil.copyfileobj(src, dst, CHUNK_SIZE)
+		return target
+
+	opened: List[zipfile.ZipFile] = []
+	written: List[Path] = []
+	skipped_unsafe = 0
+	print(f"Extracting {zip_path}...")
+	with zipfile.ZipFile(zip_path, "r") as zf, ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+		pending = set()
+		for info in zf.infolist():
+			if info.is_dir():
+				continue
+			if exts is not None and Path(info.filename).suffix.lower().lstrip(".") not in exts:
+				continue
+			target = _safe_target(root, info.filename)
+			if target is None:
+				skipped_unsafe += 1
+				continue
+			pending.add(pool.submit(extract_one, info, target))
+			# Bounded in-flight window keeps memory flat for archives with many members
+			if len(pending) >= 4 * max(1, workers):
+				done, pending = wait(pending, return_when=FIRST_COMPLETED)
+				written.extend(f.result() for f in done)
+		for f in pending:
+			written.append(f.result())
+	for zf in opened:
+		zf.close()
+	if skipped_unsafe:
+		print(f"Skipped {skipped_unsafe} unsafe archive entries")
+	return written
+
+
+def main():
+	import argparse
+	parser = argparse.ArgumentParser(description="Resumable parallel download with SHA-256 check and streaming zip extraction.")
+	parser.add_argument("--url", required=True)
+	parser.add_argument("--out", required=True, help="Output file path")
+	parser.add_argument("--sha256", default=None, help="Expected SHA-256 hex digest")
+	parser.add_argument("--segments", type=int, default=4, help="Parallel range requests")
+	parser.add_argument("--retries", type=int, default=5)
+	parser.add_argument("--extract_to", default=None, help="Extract the downloaded zip here")
+	parser.add_argument("--exts", default="", help="Comma-separated extensions to extract (default: all)")
+	parser.add_argument("--workers", type=int, default=4, help="Extraction threads")
+	args = parser.parse_args()
+
+	path = download(args.url, Path(args.out), sha256=args.sha256, segments=args.segments, retries=args.retries)
+	if args.extract_to:
+		exts = [e for e in args.exts.split(",") if e.strip()] or None
+		files = extract_archive(path, Path(args.extract_to), extensions=exts, workers=args.workers)
+		print(f"Extracted {len(files)} files to {args.extract_to}")
+
+
+if __name__ == "__main__":
+	main()
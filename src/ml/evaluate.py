@@ -0,0 +1,543 @@
+"""
+Offline detector evaluation on the YOLO test split.
+
+Runs one or more models over data/yolo_dataset/images/test (as written by
+convert_dataset_to_yolo_simple) and reports, per model and image size:
+- mAP@0.5 and mAP@0.5:0.95 (COCO 101-point interpolation), precision/recall
+  at the confidence that maximizes mean F1;
+- per-class AP, precision-recall curves and a confusion matrix;
+- per-image latency (mean / p50 / p95, after warmup), peak RSS and model size.
+
+Box matching is vectorized: one IoU matrix per image (broadcast NumPy), then
+greedy highest-IoU-first assignment at all ten IoU thresholds.
+
+Models are anything ultralytics.YOLO loads (.pt, .onnx, *_openvino_model/,
+.engine, .tflite; FP16/INT8 exports included), plus "synthetic" (random boxes
+from synthetic.py, a floor for sanity-checking the harness). Each
+(model, imgsz) run happens in a fresh process so peak RSS is per model.
+
+Example:
+  python src/ml/evaluate.py --models runs/train/yolov8n/weights/best.pt best_int8.onnx --imgsz 640 416 --min_map 0.5
+"""
+import csv
+import json
+import multiprocessing as mp
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+	import numpy as np
+	_HAS_NP = True
+except Exception:
+	np = None  # type: ignore
+	_HAS_NP = False
+
+try:
+	from PIL import Image
+	_HAS_PIL = True
+except Exception:
+	_HAS_PIL = False
+
+try:
+	from .utils import limit_threads, rss_mb  # type: ignore
+except Exception:
+	try:
+		from src.ml.utils import limit_threads, rss_mb  # type: ignore
+	except Exception:
+		from utils import limit_threads, rss_mb  # type: ignore
+
+IOU_THRESHOLDS = (0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95)
+# mAP needs (nearly) all candidate boxes; 0.25 is only used for the confusion matrix
+PREDICT_CONF = 0.001
+PREDICT_IOU = 0.7
+CONFUSION_CONF = 0.25
+CONFUSION_IOU = 0.45
+PR_POINTS = 101
+F1_POINTS = 1000
+
+SUMMARY_FIELDS = [
+	"run", "model", "imgsz", "ok", "images", "instances", "map50", "map50_95", "precision", "recall", "f1",
+	"conf_best_f1", "latency_ms_mean", "latency_ms_p50", "latency_ms_p95", "images_per_sec", "load_s",
+	"peak_rss_mb", "model_rss_mb", "model_mb", "unknown_label_boxes", "error",
+]
+
+
+def load_names(dataset_dir: Path) -> List[str]:
+	"""Class names in id order, from the data.yaml written by preprocess_simple.py."""
+	with (dataset_dir / "data.yaml").open("r", encoding="utf-8") as f:
+		for line in f:
+			if line.startswith("names:"):
+				names = json.loads(line[len("names:"):].strip())
+				return [names[k] for k in sorted(names, key=int)]
+	raise ValueError(f"no names in {dataset_dir / 'data.yaml'}")
+
+
+def load_split(dataset_dir: Path, split: str = "test") -> List[Tuple[Path, "np.ndarray", "np.ndarray"]]:
+	"""(image path, ground-truth boxes (G, 4) xyxy pixels, classes (G,)) per image of a split."""
+	if not _HAS_PIL:
+		raise RuntimeError("Pillow not installed. Install with: pip install pillow")
+	items = []
+	for img_path in sorted((dataset_dir / "images" / split).iterdir()):
+		if not img_path.is_file():
+			continue
+		with Image.open(img_path) as im:
+			w, h = im.size
+		label_path = dataset_dir / "labels" / split / f"{img_path.stem}.txt"
+		rows = np.zeros((0, 5), dtype=np.float64)
+		if label_path.exists():
+			with label_path.open("r", encoding="utf-8") as f:
+				lines = [ln.split() for ln in f if ln.strip()]
+			if lines:
+				rows = np.array(lines, dtype=np.float64).reshape(-1, 5)
+		cx, cy, bw, bh = rows[:, 1] * w, rows[:, 2] * h, rows[:, 3] * w, rows[:, 4] * h
+		boxes = np.stack([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2], axis=1)
+		items.append((img_path, boxes, rows[:, 0].astype(np.int64)))
+	return items
+
+
+def box_iou(a: "np.ndarray", b: "np.ndarray") -> "np.ndarray":
+	"""IoU of every box in a (N, 4) with every box in b (M, 4), xyxy -> (N, M)."""
+	lt = np.maximum(a[:, None, :2], b[None, :, :2])
+	rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+	inter = np.clip(rb - lt, 0, None).prod(axis=2)
+	area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+	area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+	return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def _greedy_pairs(iou: "np.ndarray", keep: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+	"""One-to-one (row, col) pairs among keep, highest IoU first."""
+	rows, cols = np.nonzero(keep)
+	if rows.size > 1:
+		order = np.argsort(-iou[rows, cols], kind="stable")
+		rows, cols = rows[order], cols[order]
+		_, first = np.unique(cols, return_index=True)
+		first.sort()
+		rows, cols = rows[first], cols[first]
+		_, first = np.unique(rows, return_index=True)
+		first.sort()
+		rows, cols = rows[first], cols[first]
+	return rows, cols
+
+
+def match_predictions(
+	pred_cls: "np.ndarray",
+	gt_cls: "np.ndarray",
+	iou: "np.ndarray",
+	thresholds: "np.ndarray",
+) -> "np.ndarray":
+	"""
+	True-positive flags (P, T) for P predictions at T IoU thresholds, given the
+	ground-truth x prediction IoU matrix (G, P). Only same-class pairs match.
+	"""
+	correct = np.zeros((pred_cls.shape[0], thresholds.shape[0]), dtype=bool)
+	if iou.size == 0:
+		return correct
+	iou = iou * (gt_cls[:, None] == pred_cls[None, :])
+	for i, t in enumerate(thresholds):
+		_, cols = _greedy_pairs(iou, iou >= t)
+		correct[cols, i] = True
+	return correct
+
+
+def _interpolated_ap(recall: "np.ndarray", precision: "np.ndarray") -> Tuple[float, "np.ndarray"]:
+	"""COCO 101-point AP and the interpolated precision at those recall points."""
+	envelope = np.flip(np.maximum.accumulate(np.flip(precision)))
+	idx = np.searchsorted(recall, np.linspace(0, 1, PR_POINTS), side="left")
+	# Recall levels never reached get precision 0
+	curve = np.zeros(PR_POINTS)
+	reached = idx < recall.size
+	curve[reached] = envelope[idx[reached]]
+	return float(curve.mean()), curve
+
+
+def ap_per_class(
+	tp: "np.ndarray",
+	conf: "np.ndarray",
+	pred_cls: "np.ndarray",
+	target_cls: "np.ndarray",
+	nc: int,
+) -> Dict[str, "np.ndarray"]:
+	"""
+	AP at every IoU threshold, P/R/F1 curves over confidence and the PR curve
+	at IoU 0.5 for each of nc classes, from pooled per-prediction results.
+	"""
+	order = np.argsort(-conf, kind="stable")
+	tp, conf, pred_cls = tp[order], conf[order], pred_cls[order]
+	n_thr = tp.shape[1]
+	x = np.linspace(0, 1, F1_POINTS)
+	ap = np.zeros((nc, n_thr))
+	p_curve = np.zeros((nc, F1_POINTS))
+	r_curve = np.zeros((nc, F1_POINTS))
+	pr = np.zeros((nc, PR_POINTS))
+	instances = np.bincount(target_cls, minlength=nc)[:nc]
+	for c in range(nc):
+		sel = pred_cls == c
+		n_gt = instances[c]
+		if n_gt == 0 or not sel.any():
+			continue
+		tpc = np.cumsum(tp[sel], axis=0)
+		fpc = np.cumsum(~tp[sel], axis=0)
+		recall = tpc / n_gt
+		precision = tpc / (tpc + fpc)
+		# Curves over confidence (conf is decreasing, np.interp needs increasing x)
+		r_curve[c] = np.interp(-x, -conf[sel], recall[:, 0], left=0)
+		p_curve[c] = np.interp(-x, -conf[sel], precision[:, 0], left=1)
+		for j in range(n_thr):
+			ap[c, j], curve = _interpolated_ap(recall[:, j], precision[:, j])
+			if j == 0:
+				pr[c] = curve
+	f1 = 2 * p_curve * r_curve / np.maximum(p_curve + r_curve, 1e-9)
+	return {"ap": ap, "p": p_curve, "r": r_curve, "f1": f1, "pr": pr, "instances": instances, "x": x}
+
+
+def update_confusion(
+	matrix: "np.ndarray",
+	pred_boxes: "np.ndarray",
+	pred_conf: "np.ndarray",
+	pred_cls: "np.ndarray",
+	gt_boxes: "np.ndarray",
+	gt_cls: "np.ndarray",
+	conf: float = CONFUSION_CONF,
+	iou_thr: float = CONFUSION_IOU,
+) -> None:
+	"""
+	Add one image to matrix[true, predicted] ((nc + 1) x (nc + 1); the last
+	row/column is background): class-agnostic greedy matching at iou_thr.
+	"""
+	bg = matrix.shape[0] - 1
+	keep = pred_conf >= conf
+	pred_boxes, pred_cls = pred_boxes[keep], pred_cls[keep]
+	iou = box_iou(gt_boxes, pred_boxes)
+	g, p = _greedy_pairs(iou, iou > iou_thr)
+	np.add.at(matrix, (gt_cls[g], pred_cls[p]), 1)
+	missed = np.ones(gt_cls.shape[0], dtype=bool)
+	missed[g] = False
+	np.add.at(matrix, (gt_cls[missed], bg), 1)
+	extra = np.ones(pred_cls.shape[0], dtype=bool)
+	extra[p] = False
+	np.add.at(matrix, (bg, pred_cls[extra]), 1)
+
+
+class Evaluator:
+	"""Accumulates per-image predictions and ground truth; summary() computes the metrics."""
+
+	def __init__(self, names: List[str]):
+		self.names = names
+		self.thresholds = np.array(IOU_THRESHOLDS)
+		self.confusion = np.zeros((len(names) + 1, len(names) + 1), dtype=np.int64)
+		self._tp: List["np.ndarray"] = []
+		self._conf: List["np.ndarray"] = []
+		self._pred_cls: List["np.ndarray"] = []
+		self._target_cls: List["np.ndarray"] = []
+		self.images = 0
+
+	def add(
+		self,
+		pred_boxes: "np.ndarray",
+		pred_conf: "np.ndarray",
+		pred_cls: "np.ndarray",
+		gt_boxes: "np.ndarray",
+		gt_cls: "np.ndarray",
+	) -> None:
+		iou = box_iou(gt_boxes, pred_boxes)
+		self._tp.append(match_predictions(pred_cls, gt_cls, iou, self.thresholds))
+		self._conf.append(pred_conf)
+		self._pred_cls.append(pred_cls)
+		self._target_cls.append(gt_cls)
+		update_confusion(self.confusion, pred_boxes, pred_conf, pred_cls, gt_boxes, gt_cls)
+		self.images += 1
+
+	def summary(self) -> Dict[str, Any]:
+		nc = len(self.names)
+		tp = np.concatenate(self._tp) if self._tp else np.zeros((0, len(IOU_THRESHOLDS)), dtype=bool)
+		conf = np.concatenate(self._conf) if self._conf else np.zeros(0)
+		pred_cls = np.concatenate(self._pred_cls).astype(np.int64) if self._pred_cls else np.zeros(0, dtype=np.int64)
+		target_cls = np.concatenate(self._target_cls).astype(np.int64) if self._target_cls else np.zeros(0, dtype=np.int64)
+		m = ap_per_class(tp, conf, pred_cls, target_cls, nc)
+		present = m["instances"] > 0
+		# Operating point: the highest confidence that maximizes F1 averaged over classes with instances
+		mean_f1 = m["f1"][present].mean(0) if present.any() else np.zeros(F1_POINTS)
+		best = F1_POINTS - 1 - int(mean_f1[::-1].argmax()) if mean_f1.max() > 0 else 0
+		per_class = []
+		for c, name in enumerate(self.names):
+			per_class.append({
+				"class": name,
+				"instances": int(m["instances"][c]),
+				"precision": round(float(m["p"][c, best]), 4),
+				"recall": round(float(m["r"][c, best]), 4),
+				"ap50": round(float(m["ap"][c, 0]), 4),
+				"ap50_95": round(float(m["ap"][c].mean()), 4),
+			})
+
+		def mean(a: "np.ndarray") -> float:
+			return round(float(a[present].mean()), 4) if present.any() else 0.0
+
+		return {
+			"images": self.images,
+			"instances": int(m["instances"].sum()),
+			"map50": mean(m["ap"][:, 0]),
+			"map50_95": mean(m["ap"].mean(1)),
+			"precision": mean(m["p"][:, best]),
+			"recall": mean(m["r"][:, best]),
+			"f1": mean(m["f1"][:, best]),
+			"conf_best_f1": round(float(m["x"][best]), 3),
+			"per_class": per_class,
+			"pr_curves": {name: [round(float(v), 4) for v in m["pr"][c]] for c, name in enumerate(self.names)},
+			"confusion": self.confusion.tolist(),
+		}
+
+
+def _load_predictor(
+	model: str,
+	imgsz: int,
+	names: List[str],
+	device: str,
+) -> Tuple[Callable[[str], Tuple["np.ndarray", "np.ndarray", "np.ndarray", int]], Dict[str, Any]]:
+	"""
+	Returns predict(path) -> (boxes (P, 4) xyxy, conf (P,), class ids (P,) in
+	dataset order, boxes with labels not in the dataset), plus model info.
+	"""
+	index = {n: i for i, n in enumerate(names)}
+
+	if model == "synthetic":
+		try:
+			from src.ml.synthetic import SyntheticBackend  # type: ignore
+		except Exception:
+			from synthetic import SyntheticBackend  # type: ignore
+		backend = SyntheticBackend(labels=tuple(names))
+
+		def predict_synthetic(path: str):
+			dets = backend.detect(path).get("detections", [])
+			boxes = np.array([d["bbox"] for d in dets], dtype=np.float64).reshape(-1, 4)
+			conf = np.array([d["confidence"] for d in dets], dtype=np.float64)
+			cls = np.array([index[d["label"]] for d in dets], dtype=np.int64)
+			return boxes, conf, cls, 0
+
+		return predict_synthetic, {"model_mb": 0.0}
+
+	try:
+		from src.ml.inference import load_model  # type: ignore
+	except Exception:
+		from inference import load_model  # type: ignore
+	net = load_model(model)
+	if net is None:
+		raise RuntimeError(f"cannot load {model} (missing file, or ultralytics not installed: pip install ultralytics)")
+	model_names = getattr(net, "names", None) or {}
+	lookup = np.array([index.get(model_names.get(i, ""), -1) for i in range(max(model_names, default=-1) + 1)], dtype=np.int64)
+	kwargs: Dict[str, Any] = {"imgsz": imgsz, "conf": PREDICT_CONF, "iou": PREDICT_IOU, "verbose": False}
+	if device:
+		kwargs["device"] = device
+
+	def predict_model(path: str):
+		res = net.predict(path, **kwargs)[0]  # type: ignore
+		b = res.boxes
+		boxes = b.xyxy.cpu().numpy().astype(np.float64)
+		conf = b.conf.cpu().numpy().astype(np.float64)
+		cls = lookup[b.cls.cpu().numpy().astype(np.int64)] if lookup.size else np.full(conf.shape, -1)
+		known = cls >= 0
+		return boxes[known], conf[known], cls[known], int((~known).sum())
+
+	p = Path(model)
+	size = sum(f.stat().st_size for f in p.rglob("*") if f.is_file()) if p.is_dir() else p.stat().st_size
+	return predict_model, {"model_mb": round(size / (1024 * 1024), 2)}
+
+
+def _run_eval(conn, kwargs: Dict[str, Any]) -> None:
+	"""Child process: evaluate one (model, imgsz) and send back the summary."""
+	try:
+		if kwargs["threads"]:
+			limit_threads(kwargs["threads"])
+		dataset_dir = Path(kwargs["dataset_dir"])
+		names = load_names(dataset_dir)
+		items = load_split(dataset_dir, kwargs["split"])
+		if kwargs["max_images"]:
+			items = items[:kwargs["max_images"]]
+		if not items:
+			raise ValueError(f"no images in {dataset_dir / 'images' / kwargs['split']}")
+
+		base_mb = rss_mb()["rss_main_mb"]
+		t0 = time.perf_counter()
+		predict, info = _load_predictor(kwargs["model"], kwargs["imgsz"], names, kwargs["device"])
+		for i in range(kwargs["warmup"]):
+			predict(str(items[i % len(items)][0]))
+		load_s = time.perf_counter() - t0
+
+		ev = Evaluator(names)
+		latencies = np.zeros(len(items))
+		unknown = 0
+		for i, (path, gt_boxes, gt_cls) in enumerate(items):
+			t = time.perf_counter()
+			boxes, conf, cls, n_unknown = predict(str(path))
+			latencies[i] = time.perf_counter() - t
+			unknown += n_unknown
+			ev.add(boxes, conf, cls, gt_boxes, gt_cls)
+
+		result = {"ok": True, **ev.summary(), **info}
+		peak_mb = rss_mb()["rss_main_mb"]
+		result.update({
+			"latency_ms_mean": round(float(latencies.mean()) * 1000.0, 2),
+			"latency_ms_p50": round(float(np.percentile(latencies, 50)) * 1000.0, 2),
+			"latency_ms_p95": round(float(np.percentile(latencies, 95)) * 1000.0, 2),
+			"images_per_sec": round(len(items) / float(latencies.sum()), 2) if latencies.sum() > 0 else None,
+			"load_s": round(load_s, 2),
+			"peak_rss_mb": peak_mb,
+			"model_rss_mb": round(peak_mb - base_mb, 1) if peak_mb is not None and base_mb is not None else None,
+			"unknown_label_boxes": unknown,
+		})
+		conn.send(result)
+	except Exception as e:
+		conn.send({"ok": False, "error": f"{type(e).__name__}: {e}"})
+	finally:
+		conn.close()
+
+
+def run_name(model: str, imgsz: int) -> str:
+	return "synthetic" if model == "synthetic" else f"{Path(model.rstrip('/')).stem}_{imgsz}"
+
+
+def evaluate_models(
+	dataset_dir: Path,
+	models: List[str],
+	imgsz: List[int],
+	split: str = "test",
+	device: str = "",
+	threads: int = 0,
+	warmup: int = 3,
+	max_images: int = 0,
+	run_timeout_s: float = 3600.0,
+) -> List[Dict[str, Any]]:
+	"""Evaluate every model at every image size (synthetic once), each in a fresh process."""
+	if not _HAS_NP:
+		raise RuntimeError("numpy not installed. Install with: pip install numpy")
+	ctx = mp.get_context("spawn")
+	runs = []
+	for model in models:
+		for size in ([imgsz[0]] if model == "synthetic" else imgsz):
+			runs.append((model, size))
+
+	results: List[Dict[str, Any]] = []
+	for model, size in runs:
+		kwargs = dict(
+			dataset_dir=str(dataset_dir), model=model, imgsz=size, split=split, device=device,
+			threads=threads, warmup=warmup, max_images=max_images,
+		)
+		parent_conn, child_conn = ctx.Pipe(duplex=False)
+		proc = ctx.Process(target=_run_eval, args=(child_conn, kwargs))
+		proc.start()
+		child_conn.close()
+		try:
+			if parent_conn.poll(run_timeout_s):
+				result = parent_conn.recv()
+			else:
+				result = {"ok": False, "error": "timeout"}
+		except EOFError:
+			result = {"ok": False, "error": f"evaluation process exited with code {proc.exitcode}"}
+		finally:
+			if proc.is_alive():
+				proc.terminate()
+			proc.join()
+		row = {"run": run_name(model, size), "model": model, "imgsz": size, **result}
+		results.append(row)
+		print(
+			f"eval {row['run']}: mAP50={row.get('map50')} mAP50-95={row.get('map50_95')} "
+			f"latency={row.get('latency_ms_mean')} ms peak_rss={row.get('peak_rss_mb')} MB"
+			f"{'' if row['ok'] else ' FAILED: ' + str(row.get('error'))}"
+		)
+	return results
+
+
+def pick_fastest(results: List[Dict[str, Any]], metric: str = "map50_95", min_value: float = 0.0) -> Optional[Dict[str, Any]]:
+	"""Lowest mean latency among runs whose metric meets min_value."""
+	ok = [r for r in results if r.get("ok") and (r.get(metric) or 0.0) >= min_value]
+	return min(ok, key=lambda r: r["latency_ms_mean"]) if ok else None
+
+
+def write_report(results: List[Dict[str, Any]], out_dir: Path, names: List[str], choice: Optional[Dict[str, Any]] = None) -> None:
+	"""
+	out_dir/summary.csv (one row per run, side by side), summary.json, and per run:
+	<run>/per_class.csv, <run>/pr_curve.csv (precision at 101 recall points, IoU 0.5),
+	<run>/confusion_matrix.csv (rows = true class, columns = predicted; last = background).
+	"""
+	out_dir.mkdir(parents=True, exist_ok=True)
+	with (out_dir / "summary.csv").open("w", newline="", encoding="utf-8") as f:
+		writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, extrasaction="ignore")
+		writer.writeheader()
+		writer.writerows(results)
+	with (out_dir / "summary.json").open("w", encoding="utf-8") as f:
+		json.dump({
+			"choice": choice["run"] if choice else None,
+			"runs": [{k: v for k, v in r.items() if k not in ("pr_curves", "confusion")} for r in results],
+		}, f, indent=2)
+
+	recall_points = np.linspace(0, 1, PR_POINTS)
+	for r in results:
+		if not r.get("ok"):
+			continue
+		run_dir = out_dir / r["run"]
+		run_dir.mkdir(parents=True, exist_ok=True)
+		with (run_dir / "per_class.csv").open("w", newline="", encoding="utf-8") as f:
+			writer = csv.DictWriter(f, fieldnames=["class", "instances", "precision", "recall", "ap50", "ap50_95"])
+			writer.writeheader()
+			writer.writerows(r["per_class"])
+		with (run_dir / "pr_curve.csv").open("w", newline="", encoding="utf-8") as f:
+			writer = csv.writer(f)
+			writer.writerow(["recall"] + names)
+			for i, rec in enumerate(recall_points):
+				writer.writerow([round(float(rec), 2)] + [r["pr_curves"][n][i] for n in names])
+		with (run_dir / "confusion_matrix.csv").open("w", newline="", encoding="utf-8") as f:
+			writer = csv.writer(f)
+			labels = names + ["background"]
+			writer.writerow(["true\\pred"] + labels)
+			for label, row in zip(labels, r["confusion"]):
+				writer.writerow([label] + row)
+
+
+def _print_table(results: List[Dict[str, Any]]) -> None:
+	cols = ["run", "map50", "map50_95", "precision", "recall", "latency_ms_mean", "latency_ms_p95", "peak_rss_mb", "model_mb"]
+	print("  ".join(f"{c:>16}" for c in cols))
+	for r in results:
+		print("  ".join(f"{str(r.get(c, '')):>16}" for c in cols))
+
+
+def main():
+	import argparse
+	parser = argparse.ArgumentParser(description="Evaluate detectors on the YOLO test split: mAP, PR, confusion, latency, memory.")
+	parser.add_argument("--dataset_dir", type=str, default="data/yolo_dataset")
+	parser.add_argument("--split", type=str, default="test")
+	parser.add_argument("--models", nargs="+", default=[os.getenv("MODEL_PATH", "models/model.onnx")],
+		help="Model files/dirs loadable by ultralytics, or 'synthetic'")
+	parser.add_argument("--imgsz", type=int, nargs="+", default=[640], help="Inference sizes; every model is run at each")
+	parser.add_argument("--device", type=str, default="", help="e.g. cpu, 0 (default: ultralytics' choice)")
+	parser.add_argument("--threads", type=int, default=0, help="Intra-op threads per run (0 = library default)")
+	parser.add_argument("--warmup", type=int, default=3, help="Untimed predictions before measuring")
+	parser.add_argument("--max_images", type=int, default=0, help="Evaluate only the first N images (0 = all)")
+	parser.add_argument("--metric", choices=["map50", "map50_95"], default="map50_95")
+	parser.add_argument("--min_map", type=float, default=0.0, help="Accuracy bar for picking the fastest model")
+	parser.add_argument("--out", type=str, default="runs/eval")
+	args = parser.parse_args()
+
+	dataset_dir = Path(args.dataset_dir)
+	results = evaluate_models(
+		dataset_dir,
+		args.models,
+		args.imgsz,
+		split=args.split,
+		device=args.device,
+		threads=args.threads,
+		warmup=args.warmup,
+		max_images=args.max_images,
+	)
+	choice = pick_fastest(results, args.metric, args.min_map)
+	write_report(results, Path(args.out), load_names(dataset_dir), choice)
+	_print_table(results)
+	if choice:
+		print(f"fastest with {args.metric} >= {args.min_map}: {choice['run']} ({choice['latency_ms_mean']} ms/image)")
+	else:
+		print(f"no run reaches {args.metric} >= {args.min_map}")
+
+
+if __name__ == "__main__":
+	main()
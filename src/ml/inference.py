@@ -1,5 +1,11 @@
+import logging
 import os
-from typing import Any, Dict, List, Optional, Tuple
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 try:
 	from PIL import Image, ImageDraw
@@ -16,6 +22,42 @@ except Exception:
 	_ULTRA_AVAILABLE = False
 
 
+log = logging.getLogger(__name__)
+
+# Phase markers: a profiler installs a list here (see src/server/profiling.py);
+# when it is None, phase() only costs a ContextVar lookup
+_PHASES: "ContextVar[Optional[List[Dict[str, Any]]]]" = ContextVar("agrivision_phases", default=None)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+	"""Time a named step (and its net traced allocation) when phases are being collected."""
+	phases = _PHASES.get()
+	if phases is None:
+		yield
+		return
+	mem0 = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+	t0 = time.perf_counter()
+	try:
+		yield
+	finally:
+		entry: Dict[str, Any] = {"name": name, "t0": t0, "ms": round((time.perf_counter() - t0) * 1000.0, 3)}
+		if mem0 is not None:
+			entry["alloc_kb"] = round((tracemalloc.get_traced_memory()[0] - mem0) / 1024.0, 1)
+		phases.append(entry)
+
+
+@contextmanager
+def collect_phases() -> Iterator[List[Dict[str, Any]]]:
+	"""Collect phase() entries recorded in this context (thread / task) into a list."""
+	phases: List[Dict[str, Any]] = []
+	token = _PHASES.set(phases)
+	try:
+		yield phases
+	finally:
+		_PHASES.reset(token)
+
+
 def _draw_overlay(
 	image_path: str,
 	overlay_output_path: Optional[str],
@@ -32,7 +74,7 @@ def _draw_overlay(
 			w, h = im.size
 		return w, h
 
-	with Image.open(image_path).convert("RGBA") as im:
+	with phase("overlay"), Image.open(image_path).convert("RGBA") as im:
 		w, h = im.size
 		if overlay_output_path:
 			draw = ImageDraw.Draw(im, "RGBA")
@@ -111,49 +153,214 @@ def mock_detect(image_path: str, overlay_output_path: Optional[str] = None) -> D
 	}
 
 
-def detect_image(image_path: str, overlay_output_path: Optional[str] = None) -> Dict[str, Any]:
+# ultralytics predictors keep per-call state, so models are cached per thread
+_MODEL_CACHE = threading.local()
+
+
+def load_model(model_path: str) -> Any:
+	"""
+	Load (once per thread) and return an ultralytics model for model_path.
+	Returns None if ultralytics is unavailable or the file does not exist.
+	"""
+	if not _ULTRA_AVAILABLE or not model_path or not os.path.exists(model_path):
+		return None
+	models = getattr(_MODEL_CACHE, "models", None)
+	if models is None:
+		models = _MODEL_CACHE.models = {}
+	if model_path not in models:
+		models[model_path] = YOLO(model_path)  # type: ignore
+	return models[model_path]
+
+
+def detect_batch(images: List[Any], model_path: Optional[str] = None, mock: bool = False) -> List[Dict[str, Any]]:
+	"""
+	Batched detection on decoded frames (HxWx3 uint8 numpy arrays, BGR as read
+	by OpenCV). One model call per batch; the fixed mock box is only used when
+	mock=True. Raises RuntimeError if the model cannot be loaded. If the batch
+	prediction fails, every frame gets an empty result with an "error" field.
+	Returns one API-contract dict per input, without overlays.
 	"""
-	Non-async detection entrypoint.
-	- If ultralytics is available and a model is loadable (MODEL_PATH env), run real inference.
-	- Otherwise, fall back to mock_detect.
+	if not images:
+		return []
+	if mock:
+		out: List[Dict[str, Any]] = []
+		for img in images:
+			h, w = int(img.shape[0]), int(img.shape[1])
+			box = [int(0.1 * w), int(0.1 * h), int(0.9 * w), int(0.9 * h)]
+			out.append({
+				"detections": [{"label": "healthy_crop", "confidence": 0.97, "bbox": box}],
+				"width": w,
+				"height": h,
+			})
+		return out
+
+	model_path = model_path or os.getenv("MODEL_PATH")
+	model = load_model(model_path) if model_path else None
+	if model is None:
+		raise RuntimeError(f"Cannot load model {model_path!r} (missing file or ultralytics not installed)")
+	try:
+		results = model.predict(list(images), verbose=False)  # type: ignore
+	except Exception as e:
+		error = f"{type(e).__name__}: {e}"
+		return [
+			{"detections": [], "width": int(img.shape[1]), "height": int(img.shape[0]), "error": error}
+			for img in images
+		]
+	names = getattr(model, "names", None)
+	return [
+		_parse_model_output(res, (int(img.shape[1]), int(img.shape[0])), names)
+		for res, img in zip(results, images)
+	]
+
+
+def predict_image(model: Any, image_path: str, overlay_output_path: Optional[str] = None) -> Dict[str, Any]:
+	"""
+	Run a loaded ultralytics model on one image file and return the API contract
+	dict, drawing the overlay if a path is given. Errors propagate to the caller.
+	"""
+	with phase("predict"):
+		results = model.predict(image_path, verbose=False)  # type: ignore
+
+	# Build list of boxes for overlay
+	boxes_for_overlay: List[Tuple[int, int, int, int]] = []
+	try:
+		res0 = results[0]
+		xyxy = res0.boxes.xyxy if hasattr(res0, "boxes") else None
+		if xyxy is not None:
+			for i in range(len(xyxy)):
+				coords = [int(v) for v in list(xyxy[i].tolist())]
+				boxes_for_overlay.append(tuple(coords))
+	except Exception:
+		pass
+
+	# Determine image size and draw overlay if requested
+	with phase("decode"):
+		with Image.open(image_path) as im:  # type: ignore
+			w, h = im.size
+
+	if overlay_output_path:
+		_draw_overlay(image_path, overlay_output_path, boxes_for_overlay)
+
+	return _parse_model_output(results, (w, h), getattr(model, "names", None))
+
+
+def detect_image(
+	image_path: str,
+	overlay_output_path: Optional[str] = None,
+	model_path: Optional[str] = None,
+) -> Dict[str, Any]:
+	"""
+	Non-async detection entrypoint: runs the ultralytics model at model_path
+	(or MODEL_PATH env). Raises RuntimeError if the model cannot be loaded;
+	prediction errors propagate. Use mock_detect to get mock output.
 	- If overlay_output_path is provided, save an overlay PNG with rectangles.
 	Returns dict matching the API JSON contract.
 	"""
-	model_path = os.getenv("MODEL_PATH")
+	model_path = model_path or os.getenv("MODEL_PATH")
+	with phase("load_model"):
+		model = load_model(model_path) if model_path else None
+	if model is None:
+		raise RuntimeError(f"Cannot load model {model_path!r} (missing file or ultralytics not installed)")
+	return predict_image(model, image_path, overlay_output_path)
+
+
+def predict_class(model: Any, image_path: str, imgsz: int = 224) -> Tuple[str, float]:
+	"""
+	Run a loaded whole-image classifier (ultralytics -cls model) at low
+	resolution and return (top1 label, confidence). Errors propagate.
+	"""
+	with phase("classify"):
+		res = model.predict(image_path, imgsz=imgsz, verbose=False)[0]  # type: ignore
+	probs = res.probs
+	top1 = int(probs.top1)
+	names = getattr(res, "names", None) or getattr(model, "names", {}) or {}
+	return names.get(top1, f"cls_{top1}"), float(probs.top1conf)
+
+
+def classify_image(image_path: str, classifier_path: str, imgsz: int = 224) -> Tuple[str, float]:
+	"""
+	Load the classifier at classifier_path and classify one image.
+	Raises RuntimeError if the classifier cannot be loaded; prediction errors propagate.
+	"""
+	with phase("load_model"):
+		model = load_model(classifier_path)
+	if model is None:
+		raise RuntimeError(f"Cannot load classifier {classifier_path!r} (missing file or ultralytics not installed)")
+	return predict_class(model, image_path, imgsz)
+
+
+# Images per cascade outcome since start (see cascade_stats)
+_CASCADE_LOCK = threading.Lock()
+_CASCADE_COUNTS: Dict[str, int] = {}
+
+
+def _count_cascade(outcome: str) -> None:
+	with _CASCADE_LOCK:
+		_CASCADE_COUNTS[outcome] = _CASCADE_COUNTS.get(outcome, 0) + 1
+
+
+def cascade_stats() -> Dict[str, int]:
+	"""
+	Cascade outcomes counted since start: "classifier" (accepted without the
+	detector), "detector" (classifier ran, not accepted) and "bypass_<reason>"
+	(the classifier did not decide: no_classifier or classifier_error).
+	"""
+	with _CASCADE_LOCK:
+		return dict(_CASCADE_COUNTS)
 
-	# Try real inference with ultralytics YOLO
-	if _ULTRA_AVAILABLE and model_path and os.path.exists(model_path):
+
+def cascade_detect(
+	image_path: str,
+	overlay_output_path: Optional[str] = None,
+	classifier_path: Optional[str] = None,
+	model_path: Optional[str] = None,
+	accept_labels: Tuple[str, ...] = ("Healthy",),
+	accept_threshold: float = 0.9,
+	classifier_imgsz: int = 224,
+) -> Dict[str, Any]:
+	"""
+	Two-stage cascade: a cheap classifier decides confidently-accepted images
+	(e.g. Healthy) on its own; the full detector only runs when the classifier is
+	uncertain or predicts another label. Raises RuntimeError if the classifier
+	cannot be loaded. The result adds "stage" ("classifier" or "detector") and
+	"cascade": {"label", "confidence"} when the classifier ran, or
+	{"bypass": reason[, "error"]} when it did not (no_classifier: none
+	configured; classifier_error: its prediction failed, logged).
+	Outcomes are counted in cascade_stats().
+	"""
+	classifier_path = classifier_path or os.getenv("CLASSIFIER_PATH")
+	cascade: Dict[str, Any]
+	if not classifier_path:
+		cascade = {"bypass": "no_classifier"}
+	else:
+		with phase("load_model"):
+			model = load_model(classifier_path)
+		if model is None:
+			raise RuntimeError(f"Cannot load classifier {classifier_path!r} (missing file or ultralytics not installed)")
 		try:
-			model = YOLO(model_path)  # type: ignore
-			results = model.predict(image_path, verbose=False)  # type: ignore
-
-			# Build list of boxes for overlay
-			boxes_for_overlay: List[Tuple[int, int, int, int]] = []
-			try:
-				res0 = results[0]
-				xyxy = res0.boxes.xyxy if hasattr(res0, "boxes") else None
-				if xyxy is not None:
-					for i in range(len(xyxy)):
-						coords = [int(v) for v in list(xyxy[i].tolist())]
-						boxes_for_overlay.append(tuple(coords))
-			except Exception:
-				pass
-
-			# Determine image size and draw overlay if requested
-			if Image is not None:
+			label, conf = predict_class(model, image_path, classifier_imgsz)
+		except Exception as e:
+			log.warning("cascade classifier failed on %s, using the detector", image_path, exc_info=True)
+			cascade = {"bypass": "classifier_error", "error": f"{type(e).__name__}: {e}"}
+		else:
+			cascade = {"label": label, "confidence": round(conf, 4)}
+			if label in accept_labels and conf >= accept_threshold:
+				# Whole-image box, matching the full-box quality annotations
 				with Image.open(image_path) as im:
 					w, h = im.size
-			else:
-				with Image.open(image_path) as im:  # type: ignore
-					w, h = im.size
-
-			if overlay_output_path:
-				_draw_overlay(image_path, overlay_output_path, boxes_for_overlay)
-
-			return _parse_model_output(results, (w, h), getattr(model, "names", None))
-		except Exception:
-			# Fall through to mock on any failure
-			pass
+				box = [0, 0, max(0, w - 1), max(0, h - 1)]
+				_draw_overlay(image_path, overlay_output_path, [tuple(box)])
+				_count_cascade("classifier")
+				return {
+					"detections": [{"label": label, "confidence": round(conf, 4), "bbox": box}],
+					"width": w,
+					"height": h,
+					"stage": "classifier",
+					"cascade": cascade,
+				}
 
-	# Fallback mock
-	return mock_detect(image_path, overlay_output_path)
+	result = detect_image(image_path, overlay_output_path, model_path=model_path)
+	result["stage"] = "detector"
+	result["cascade"] = cascade
+	_count_cascade(f"bypass_{cascade['bypass']}" if "bypass" in cascade else "detector")
+	return result
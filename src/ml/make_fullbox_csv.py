@@ -1,7 +1,7 @@
 import csv
 import os
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterator, List
 
 try:
 	from PIL import Image
@@ -21,47 +21,61 @@ Images are expected to be copied/moved under data/raw/images; this script writes
 relative filenames for that directory.
 """
 
-def make_fullbox_csv(root_dir: Path, images_out_dir: Path, out_csv: Path) -> int:
+FIELDS = ["filename", "xmin", "ymin", "xmax", "ymax", "label"]
+
+
+def iter_fullbox_records(root_dir: Path, images_out_dir: Path) -> Iterator[Dict]:
+	"""
+	Copy images into images_out_dir and yield one full-image box record per image,
+	as soon as it is copied. Records also carry "width"/"height" so downstream
+	stages need not reopen the image.
+	"""
 	root_dir = root_dir.resolve()
 	images_out_dir.mkdir(parents=True, exist_ok=True)
+	for class_dir in sorted([p for p in root_dir.iterdir() if p.is_dir()]):
+		label = class_dir.name
+		for img_path in class_dir.rglob("*.*"):
+			if not img_path.is_file():
+				continue
+			try:
+				# Copy/flatten into images_out_dir keeping unique names by prefixing label
+				# If name collision, prefix with label and an index
+				filename = f"{label}_{img_path.name}"
+				dst_path = images_out_dir / filename
+				if dst_path.exists():
+					base = img_path.stem
+					i = 1
+					while True:
+						candidate = images_out_dir / f"{label}_{base}_{i}{img_path.suffix}"
+						if not candidate.exists():
+							dst_path = candidate
+							filename = candidate.name
+							break
+						i += 1
+				# Copy file
+				dst_path.write_bytes(img_path.read_bytes())
+				# Determine image size
+				if _HAS_PIL:
+					with Image.open(dst_path) as im:
+						w, h = im.size
+				else:
+					# Default size if PIL missing (not ideal)
+					w = h = 640
+				# Full-image bbox
+				xmin, ymin, xmax, ymax = 0, 0, max(1, w - 1), max(1, h - 1)
+				yield {"filename": filename, "xmin": xmin, "ymin": ymin, "xmax": xmax, "ymax": ymax, "label": label, "width": w, "height": h}
+			except Exception:
+				continue
+
+
+def make_fullbox_csv(root_dir: Path, images_out_dir: Path, out_csv: Path) -> int:
 	count = 0
 	with out_csv.open("w", newline="", encoding="utf-8") as f:
-		writer = csv.writer(f)
-		writer.writerow(["filename", "xmin", "ymin", "xmax", "ymax", "label"])
-		for class_dir in sorted([p for p in root_dir.iterdir() if p.is_dir()]):
-			label = class_dir.name
-			for img_path in class_dir.rglob("*.*"):
-				if not img_path.is_file():
-					continue
-				try:
-					# Copy/flatten into images_out_dir keeping unique names by prefixing label
-					# If name collision, prefix with label and an index
-					filename = f"{label}_{img_path.name}"
-					dst_path = images_out_dir / filename
-					if dst_path.exists():
-						base = img_path.stem
-						i = 1
-						while True:
-							candidate = images_out_dir / f"{label}_{base}_{i}{img_path.suffix}"
-							if not candidate.exists():
-								dst_path = candidate
-								break
-							i += 1
-					# Copy file
-					dst_path.write_bytes(img_path.read_bytes())
-					# Determine image size
-					if _HAS_PIL:
-						with Image.open(dst_path) as im:
-							w, h = im.size
-					else:
-						# Default size if PIL missing (not ideal)
-						w = h = 640
-					# Full-image bbox
-					xmin, ymin, xmax, ymax = 0, 0, max(1, w - 1), max(1, h - 1)
-					writer.writerow([filename, xmin, ymin, xmax, ymax, label])
-					count += 1
-				except Exception:
-					continue
+		writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction="ignore")
+		writer.writeheader()
+		for rec in iter_fullbox_records(root_dir, images_out_dir):
+			writer.writerow(rec)
+			count += 1
 	return count
 
 if __name__ == "__main__":
@@ -0,0 +1,527 @@
+"""
+In-process data pipeline with streamed, cached and concurrent stages.
+
+Each stage runs in its own thread as soon as its dependencies allow:
+- a streaming stage (one with an `artifact` CSV) returns a generator of records;
+  every record is written to the artifact and handed to each consumer through a
+  bounded queue, so e.g. clean validates rows while make_fullbox is still copying
+  images, and dedup hashes those images at the same time;
+- a value stage returns a JSON-serializable result (stats dict) and consumers
+  wait for it.
+A stage's fingerprint covers its parameters, the source of its code, the
+(size, mtime) of its source paths and the fingerprints of its dependencies. When
+the fingerprint matches the manifest in the cache directory and the outputs still
+exist, the stage is skipped; a cached streaming stage replays its artifact to any
+consumer that does need to run. The manifest also lists the files a run created
+or modified under its outputs; only those are deleted before the stage reruns.
+
+Default dataset graph (build_dataset_pipeline):
+  fullbox --stream--> clean --stream--> convert
+     \\----stream--> dedup ----value----/
+Example:
+  python src/ml/pipeline.py --root_dir data/raw/soybean-seeds --augment_copies 1
+"""
+import csv
+import hashlib
+import inspect
+import json
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+	from .make_fullbox_csv import FIELDS, iter_fullbox_records  # type: ignore
+	from .clean import iter_clean_records  # type: ignore
+	from .dedup import dedup_records, load_groups  # type: ignore
+	from .preprocess import preprocess_dataset  # type: ignore
+	from .preprocess_simple import convert_dataset_to_yolo_simple  # type: ignore
+	from .augment import augment_shard  # type: ignore
+except Exception:
+	try:
+		from src.ml.make_fullbox_csv import FIELDS, iter_fullbox_records  # type: ignore
+		from src.ml.clean import iter_clean_records  # type: ignore
+		from src.ml.dedup import dedup_records, load_groups  # type: ignore
+		from src.ml.preprocess import preprocess_dataset  # type: ignore
+		from src.ml.preprocess_simple import convert_dataset_to_yolo_simple  # type: ignore
+		from src.ml.augment import augment_shard  # type: ignore
+	except Exception:
+		from make_fullbox_csv import FIELDS, iter_fullbox_records  # type: ignore
+		from clean import iter_clean_records  # type: ignore
+		from dedup import dedup_records, load_groups  # type: ignore
+		from preprocess import preprocess_dataset  # type: ignore
+		from preprocess_simple import convert_dataset_to_yolo_simple  # type: ignore
+		from augment import augment_shard  # type: ignore
+
+STREAM_BUFFER = 1024
+_DONE = object()
+
+
+class _Failed:
+	def __init__(self, stage: str):
+		self.stage = stage
+
+
+class StageFailed(RuntimeError):
+	pass
+
+
+def path_fingerprint(path: Path) -> str:
+	"""Cheap content proxy: (relative path, size, mtime_ns) of every file under path."""
+	path = Path(path)
+	if not path.exists():
+		return "missing"
+	if path.is_file():
+		st = path.stat()
+		return f"{st.st_size}:{st.st_mtime_ns}"
+	h = hashlib.sha256()
+	for p in sorted(path.rglob("*")):
+		if p.is_file():
+			st = p.stat()
+			h.update(f"{p.relative_to(path).as_posix()}:{st.st_size}:{st.st_mtime_ns}\n".encode("utf-8"))
+	return h.hexdigest()
+
+
+def _snapshot(paths: Sequence[Path]) -> Dict[str, Tuple[int, int]]:
+	"""(size, mtime_ns) of every file under paths."""
+	out: Dict[str, Tuple[int, int]] = {}
+	for path in paths:
+		path = Path(path)
+		files = [path] if path.is_file() else (path.rglob("*") if path.is_dir() else [])
+		for p in files:
+			if p.is_file():
+				st = p.stat()
+				out[str(p)] = (st.st_size, st.st_mtime_ns)
+	return out
+
+
+def _is_within(path: Path, root: Path) -> bool:
+	try:
+		path.relative_to(root)
+		return True
+	except ValueError:
+		return False
+
+
+def _code_fingerprint(fns: Sequence[Callable]) -> str:
+	h = hashlib.sha256()
+	for fn in fns:
+		try:
+			h.update(Path(inspect.getsourcefile(fn) or "").read_bytes())
+		except Exception:
+			h.update(getattr(fn, "__qualname__", repr(fn)).encode("utf-8"))
+	return h.hexdigest()
+
+
+class Stage:
+	def __init__(
+		self,
+		name: str,
+		fn: Callable[..., Any],
+		deps: Sequence[str] = (),
+		params: Optional[Dict[str, Any]] = None,
+		sources: Sequence[Path] = (),
+		outputs: Sequence[Path] = (),
+		artifact: Optional[Path] = None,
+		fields: Sequence[str] = FIELDS,
+		code: Sequence[Callable] = (),
+	):
+		self.name = name
+		self.fn = fn
+		self.deps = list(deps)
+		self.params = dict(params or {})
+		self.sources = [Path(p) for p in sources]
+		self.outputs = [Path(p) for p in outputs]
+		self.artifact = Path(artifact) if artifact else None
+		self.fields = list(fields)
+		self.code = [fn] + list(code)
+
+	@property
+	def streaming(self) -> bool:
+		return self.artifact is not None
+
+
+class Pipeline:
+	def __init__(self, cache_dir: Path, force: bool = False):
+		self.cache_dir = Path(cache_dir)
+		self.force = force
+		self.stages: Dict[str, Stage] = {}
+		self._abort = threading.Event()
+
+	def add(self, stage: Stage) -> Stage:
+		for d in stage.deps:
+			if d not in self.stages:
+				raise ValueError(f"stage {stage.name!r} depends on unknown stage {d!r}")
+		self.stages[stage.name] = stage
+		return stage
+
+	def fingerprints(self) -> Dict[str, str]:
+		fps: Dict[str, str] = {}
+		for name, st in self.stages.items():  # insertion order is topological
+			blob = json.dumps({
+				"name": name,
+				"params": {k: str(v) for k, v in st.params.items()},
+				"code": _code_fingerprint(st.code),
+				"sources": [path_fingerprint(p) for p in st.sources],
+				"deps": [fps[d] for d in st.deps],
+			}, sort_keys=True)
+			fps[name] = hashlib.sha256(blob.encode("utf-8")).hexdigest()
+		return fps
+
+	def _manifest_path(self, name: str) -> Path:
+		return self.cache_dir / f"{name}.json"
+
+	def _load_manifest(self, name: str) -> Optional[Dict[str, Any]]:
+		path = self._manifest_path(name)
+		if not path.exists():
+			return None
+		try:
+			with path.open("r", encoding="utf-8") as f:
+				return json.load(f)
+		except Exception:
+			return None
+
+	def _is_cached(self, st: Stage, fp: str) -> bool:
+		if self.force:
+			return False
+		manifest = self._load_manifest(st.name)
+		if not manifest or manifest.get("fingerprint") != fp:
+			return False
+		paths = st.outputs + ([st.artifact] if st.artifact else [])
+		return all(p.exists() for p in paths)
+
+	def _clear_previous_outputs(self, st: Stage) -> None:
+		"""
+		Remove the files an earlier run of this stage recorded as written, so stale
+		files do not mix in. Directories are never removed, and nothing under a
+		stage's source paths is touched, even if it also appears among the outputs.
+		"""
+		manifest = self._load_manifest(st.name)
+		self._manifest_path(st.name).unlink(missing_ok=True)
+		if not manifest:
+			return
+		protected = [p.resolve() for stage in self.stages.values() for p in stage.sources]
+		for p in map(Path, manifest.get("written", [])):
+			if any(_is_within(p.resolve(), root) for root in protected):
+				continue
+			if p.is_file() or p.is_symlink():
+				p.unlink(missing_ok=True)
+
+	def _put(self, q: "queue.Queue", item: Any) -> None:
+		while not self._abort.is_set():
+			try:
+				q.put(item, timeout=0.2)
+				return
+			except queue.Full:
+				continue
+
+	def _consume(self, q: "queue.Queue") -> Iterator[Any]:
+		while True:
+			try:
+				item = q.get(timeout=0.2)
+			except queue.Empty:
+				if self._abort.is_set():
+					raise StageFailed("pipeline aborted")
+				continue
+			if item is _DONE:
+				return
+			if isinstance(item, _Failed):
+				raise StageFailed(f"upstream stage {item.stage!r} failed")
+			yield item
+
+	def run(self) -> Dict[str, Dict[str, Any]]:
+		"""Run all stages; returns per-stage reports and raises StageFailed if any stage failed."""
+		self.cache_dir.mkdir(parents=True, exist_ok=True)
+		self._abort.clear()
+		fps = self.fingerprints()
+		cached = {name: self._is_cached(st, fps[name]) for name, st in self.stages.items()}
+
+		# One queue per (streaming producer, consumer that will actually run). A consumer
+		# that also waits on value stages reads its streams late, so its queues are unbounded.
+		subscribers: Dict[str, List["queue.Queue"]] = {name: [] for name in self.stages}
+		inbox: Dict[str, Dict[str, "queue.Queue"]] = {name: {} for name in self.stages}
+		for name, st in self.stages.items():
+			if cached[name]:
+				continue
+			waits_on_values = any(not self.stages[d].streaming for d in st.deps)
+			for d in st.deps:
+				if self.stages[d].streaming:
+					q: "queue.Queue" = queue.Queue(maxsize=0 if waits_on_values else STREAM_BUFFER)
+					subscribers[d].append(q)
+					inbox[name][d] = q
+
+		done = {name: threading.Event() for name in self.stages}
+		reports: Dict[str, Dict[str, Any]] = {name: {"status": "pending"} for name in self.stages}
+		t0 = time.perf_counter()
+
+		def execute(st: Stage) -> None:
+			report = reports[st.name]
+			subs = subscribers[st.name]
+			try:
+				if cached[st.name]:
+					report.update(status="cached", result=(self._load_manifest(st.name) or {}).get("result"))
+					if subs:
+						# A consumer needs the records again: replay the artifact
+						report["start_s"] = time.perf_counter() - t0
+						report["records"] = self._drive(st, self._read_artifact(st), subs, write=False)[0]
+					return
+				# Value dependencies must finish first; streamed ones are consumed live
+				for d in st.deps:
+					if d not in inbox[st.name]:
+						done[d].wait()
+						if reports[d]["status"] not in ("ran", "cached"):
+							raise StageFailed(f"dependency {d!r} did not complete")
+				report["start_s"] = time.perf_counter() - t0
+				self._clear_previous_outputs(st)
+				before = _snapshot(st.outputs)
+				inputs = {
+					d: self._consume(inbox[st.name][d]) if d in inbox[st.name] else reports[d].get("result")
+					for d in st.deps
+				}
+				if st.streaming:
+					report["records"], report["result"] = self._drive(st, st.fn(inputs, **st.params), subs, write=True)
+				else:
+					report["result"] = st.fn(inputs, **st.params)
+				report["status"] = "ran"
+				after = _snapshot(st.outputs)
+				written = sorted(p for p, sig in after.items() if before.get(p) != sig)
+				if st.artifact is not None:
+					written.append(str(st.artifact))
+				self._write_manifest(st, fps[st.name], report, written)
+			except StageFailed as e:
+				report.update(status="skipped", error=str(e))
+				self._fail_subscribers(st, subs)
+			except BaseException as e:
+				report.update(status="failed", error=f"{type(e).__name__}: {e}")
+				self._abort.set()
+				self._fail_subscribers(st, subs)
+			finally:
+				if "start_s" in report:
+					report["seconds"] = round(time.perf_counter() - t0 - report["start_s"], 3)
+					report["start_s"] = round(report["start_s"], 3)
+				done[st.name].set()
+
+		threads = [threading.Thread(target=execute, args=(st,), name=f"stage-{name}", daemon=True) for name, st in self.stages.items()]
+		for t in threads:
+			t.start()
+		for t in threads:
+			t.join()
+		self.total_s = round(time.perf_counter() - t0, 3)
+		failed = [n for n, r in reports.items() if r["status"] == "failed"]
+		if failed:
+			raise StageFailed(f"stage {failed[0]!r} failed: {reports[failed[0]].get('error')}")
+		return reports
+
+	def _fail_subscribers(self, st: Stage, subs: List["queue.Queue"]) -> None:
+		for q in subs:
+			try:
+				q.put_nowait(_Failed(st.name))
+			except queue.Full:
+				pass  # consumer sees the abort flag once it has drained the queue
+
+	def _read_artifact(self, st: Stage) -> Iterator[Dict]:
+		with st.artifact.open("r", newline="", encoding="utf-8") as f:
+			yield from csv.DictReader(f)
+
+	def _drive(self, st: Stage, gen: Iterator[Dict], subs: List["queue.Queue"], write: bool) -> Any:
+		"""Pull records from gen, tee them to the artifact and every subscriber. Returns (count, gen's return value)."""
+		count = 0
+		result = None
+		fh = None
+		try:
+			if write:
+				st.artifact.parent.mkdir(parents=True, exist_ok=True)
+				fh = st.artifact.with_suffix(st.artifact.suffix + ".tmp").open("w", newline="", encoding="utf-8")
+				writer = csv.DictWriter(fh, fieldnames=st.fields, extrasaction="ignore")
+				writer.writeheader()
+			while True:
+				try:
+					rec = next(gen)
+				except StopIteration as stop:
+					result = stop.value
+					break
+				if fh is not None:
+					writer.writerow(rec)
+				for q in subs:
+					self._put(q, rec)
+				count += 1
+				if self._abort.is_set():
+					raise StageFailed("pipeline aborted")
+		finally:
+			if fh is not None:
+				fh.close()
+		if fh is not None:
+			fh_path = st.artifact.with_suffix(st.artifact.suffix + ".tmp")
+			fh_path.replace(st.artifact)
+		for q in subs:
+			self._put(q, _DONE)
+		return count, result
+
+	def _write_manifest(self, st: Stage, fp: str, report: Dict[str, Any], written: List[str]) -> None:
+		manifest = {
+			"fingerprint": fp,
+			"result": report.get("result"),
+			"records": report.get("records"),
+			"outputs": [str(p) for p in st.outputs + ([st.artifact] if st.artifact else [])],
+			"written": written,
+			"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		}
+		tmp = self._manifest_path(st.name).with_suffix(".tmp")
+		with tmp.open("w", encoding="utf-8") as f:
+			json.dump(manifest, f, indent=2, default=str)
+		tmp.replace(self._manifest_path(st.name))
+
+
+def print_summary(reports: Dict[str, Dict[str, Any]], total_s: float, out=sys.stdout) -> None:
+	"""Per-stage timing table; overlapping start/end columns show which stages ran concurrently."""
+	print(f"{'stage':<10} {'status':<8} {'start_s':>8} {'end_s':>8} {'seconds':>8} {'records':>8}", file=out)
+	for name, r in reports.items():
+		start = r.get("start_s")
+		secs = r.get("seconds")
+		end = round(start + secs, 3) if start is not None and secs is not None else None
+		cells = ["-" if v is None else v for v in (start, end, secs, r.get("records"))]
+		print(f"{name:<10} {r['status']:<8} {cells[0]:>8} {cells[1]:>8} {cells[2]:>8} {cells[3]:>8}", file=out)
+	print(f"total {total_s:.3f}s", file=out)
+
+
+def _fullbox_stage(inputs: Dict[str, Any], root_dir: str, images_dir: str) -> Iterator[Dict]:
+	return iter_fullbox_records(Path(root_dir), Path(images_dir))
+
+
+def _clean_stage(inputs: Dict[str, Any], images_dir: str) -> Iterator[Dict]:
+	stats: Dict[str, int] = {}
+	yield from iter_clean_records(Path(images_dir), inputs["fullbox"], stats)
+	return stats
+
+
+def _dedup_stage(inputs: Dict[str, Any], images_dir: str, report_json: str, method: str, radius: int, workers: int) -> Dict:
+	return dedup_records(Path(images_dir), inputs["fullbox"], Path(report_json), method=method, radius=radius, workers=workers)
+
+
+def _convert_stage(
+	inputs: Dict[str, Any],
+	images_dir: str,
+	annotations_csv: str,
+	out_dir: str,
+	img_size: int,
+	seed: int,
+	augment_copies: int,
+	aug_strength: str,
+	write_shards: bool,
+	report_json: str,
+) -> Dict:
+	groups = load_groups(Path(report_json)) if "dedup" in inputs else None
+	return preprocess_dataset(
+		images_dir=Path(images_dir),
+		annotations_csv=Path(annotations_csv),
+		out_dir=Path(out_dir),
+		img_size=img_size,
+		seed=seed,
+		augment_copies=augment_copies,
+		aug_strength=aug_strength,
+		write_shards=write_shards,
+		groups=groups,
+		records=inputs["clean"],
+	)
+
+
+def build_dataset_pipeline(
+	root_dir: Path,
+	raw_dir: Path = Path("data/raw"),
+	out_dir: Path = Path("data/yolo_dataset"),
+	img_size: int = 640,
+	seed: int = 42,
+	augment_copies: int = 0,
+	aug_strength: str = "light",
+	write_shards: bool = False,
+	dedup: bool = True,
+	dedup_method: str = "dhash",
+	dedup_radius: int = 4,
+	workers: int = 0,
+	force: bool = False,
+) -> Pipeline:
+	"""
+	make_fullbox -> clean -> convert (+ augmentation), with dedup hashing the
+	fullbox stream alongside clean. Intermediate CSVs are still written to
+	raw_dir (annotations.csv, annotations_clean.csv) as the stage caches.
+	"""
+	images_dir = raw_dir / "images"
+	report_json = raw_dir / "dedup_report.json"
+	pipe = Pipeline(raw_dir / ".pipeline", force=force)
+	pipe.add(Stage(
+		"fullbox", _fullbox_stage,
+		params={"root_dir": root_dir, "images_dir": images_dir},
+		sources=[root_dir], outputs=[images_dir], artifact=raw_dir / "annotations.csv",
+		code=[iter_fullbox_records],
+	))
+	pipe.add(Stage(
+		"clean", _clean_stage, deps=["fullbox"],
+		params={"images_dir": images_dir},
+		artifact=raw_dir / "annotations_clean.csv",
+		code=[iter_clean_records],
+	))
+	convert_deps = ["clean"]
+	if dedup:
+		pipe.add(Stage(
+			"dedup", _dedup_stage, deps=["fullbox"],
+			params={"images_dir": images_dir, "report_json": report_json, "method": dedup_method, "radius": dedup_radius, "workers": workers},
+			outputs=[report_json],
+			code=[dedup_records],
+		))
+		convert_deps.append("dedup")
+	pipe.add(Stage(
+		"convert", _convert_stage, deps=convert_deps,
+		params={
+			"images_dir": images_dir,
+			"annotations_csv": raw_dir / "annotations_clean.csv",
+			"out_dir": out_dir,
+			"img_size": img_size,
+			"seed": seed,
+			"augment_copies": augment_copies,
+			"aug_strength": aug_strength,
+			"write_shards": write_shards or augment_copies > 0,
+			"report_json": report_json,
+		},
+		outputs=[out_dir],
+		code=[preprocess_dataset, convert_dataset_to_yolo_simple, augment_shard],
+	))
+	return pipe
+
+
+def main():
+	import argparse
+	parser = argparse.ArgumentParser(description="Run make_fullbox -> clean (+dedup) -> convert in-process with stage caching.")
+	parser.add_argument("--root_dir", required=True, help="Classification dataset root with class subfolders")
+	parser.add_argument("--raw_dir", default="data/raw", help="Where images, intermediate CSVs and the stage cache go")
+	parser.add_argument("--out_dir", default="data/yolo_dataset")
+	parser.add_argument("--img_size", type=int, default=640)
+	parser.add_argument("--seed", type=int, default=42)
+	parser.add_argument("--shards", action="store_true", help="Also write pre-decoded shards for train.py --shards")
+	parser.add_argument("--augment_copies", type=int, default=0, help="Augmented train copies, stored as shards (implies --shards)")
+	parser.add_argument("--aug_strength", type=str, default="light", choices=["light", "medium", "heavy"])
+	parser.add_argument("--no_dedup", action="store_true", help="Skip near-duplicate grouping")
+	parser.add_argument("--workers", type=int, default=0, help="Dedup hashing processes (0 = all CPUs)")
+	parser.add_argument("--force", action="store_true", help="Ignore the stage cache")
+	args = parser.parse_args()
+
+	pipe = build_dataset_pipeline(
+		Path(args.root_dir),
+		raw_dir=Path(args.raw_dir),
+		out_dir=Path(args.out_dir),
+		img_size=args.img_size,
+		seed=args.seed,
+		augment_copies=args.augment_copies,
+		aug_strength=args.aug_strength,
+		write_shards=args.shards,
+		dedup=not args.no_dedup,
+		workers=args.workers,
+		force=args.force,
+	)
+	reports = pipe.run()
+	print_summary(reports, pipe.total_s)
+
+
+if __name__ == "__main__":
+	main()
@@ -1,7 +1,97 @@
-from typing import Any
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+try:
+	from .preprocess_simple import convert_dataset_to_yolo_simple  # type: ignore
+	from .augment import augment_shard  # type: ignore
+except Exception:
+	try:
+		from src.ml.preprocess_simple import convert_dataset_to_yolo_simple  # type: ignore
+		from src.ml.augment import augment_shard  # type: ignore
+	except Exception:
+		from preprocess_simple import convert_dataset_to_yolo_simple  # type: ignore
+		from augment import augment_shard  # type: ignore
 
 def preprocess(raw_input: Any) -> Any:
 	"""
 	Stub: preprocess raw data into model input format.
 	"""
 	return raw_input
+
+
+def preprocess_dataset(
+	images_dir: Path,
+	annotations_csv: Path,
+	out_dir: Path,
+	splits: Tuple[float, float, float] = (0.8, 0.1, 0.1),
+	img_size: int = 640,
+	seed: int = 42,
+	augment_copies: int = 0,
+	aug_strength: str = "light",
+	write_shards: bool = False,
+	groups: Optional[Dict[str, int]] = None,
+	records: Optional[Iterable[Dict]] = None,
+) -> Dict:
+	"""
+	Convert to YOLO format, then (if augment_copies > 0) write augmented copies
+	of the train split into out_dir/shards as split "train_aug". No augmented
+	JPEGs are materialized; the copies live next to the decoded train shard and
+	are only used when training with train.py --shards. Augmentation therefore
+	requires write_shards=True.
+	"""
+	if augment_copies > 0 and not write_shards:
+		raise ValueError("augment_copies requires write_shards=True (augmented copies are stored as shards)")
+	stats = convert_dataset_to_yolo_simple(
+		images_dir=images_dir,
+		annotations_csv=annotations_csv,
+		out_dir=out_dir,
+		splits=splits,
+		img_size=img_size,
+		seed=seed,
+		write_shards=write_shards,
+		groups=groups,
+		records=records,
+	)
+	if augment_copies > 0:
+		stats["augmented"] = augment_shard(
+			out_dir / "shards",
+			"train",
+			copies=augment_copies,
+			strength=aug_strength,
+			size=img_size,
+			seed=seed,
+		)
+	return stats
+
+
+def main():
+	import argparse
+	parser = argparse.ArgumentParser(description="Convert CSV-annotated dataset to YOLO format with optional batch augmentation.")
+	parser.add_argument("--images_dir", type=str, required=True, help="Directory containing images.")
+	parser.add_argument("--annotations_csv", type=str, required=True, help="CSV file with filename,xmin,ymin,xmax,ymax,label.")
+	parser.add_argument("--out_dir", type=str, default="data/yolo_dataset", help="Output directory for YOLO dataset.")
+	parser.add_argument("--splits", type=float, nargs=3, default=(0.8, 0.1, 0.1), help="Train/val/test split fractions.")
+	parser.add_argument("--img_size", type=int, default=640, help="Target size for longest side.")
+	parser.add_argument("--seed", type=int, default=42)
+	parser.add_argument("--shards", action="store_true", help="Also write pre-decoded memory-mapped shards to <out_dir>/shards.")
+	parser.add_argument("--augment_copies", type=int, default=0, help="Augmented copies per train image, written to shards split 'train_aug' (requires --shards).")
+	parser.add_argument("--aug_strength", type=str, default="light", choices=["light", "medium", "heavy"])
+	args = parser.parse_args()
+
+	stats = preprocess_dataset(
+		images_dir=Path(args.images_dir),
+		annotations_csv=Path(args.annotations_csv),
+		out_dir=Path(args.out_dir),
+		splits=tuple(args.splits),
+		img_size=args.img_size,
+		seed=args.seed,
+		augment_copies=args.augment_copies,
+		aug_strength=args.aug_strength,
+		write_shards=args.shards,
+	)
+	print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+	main()
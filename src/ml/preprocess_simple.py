@@ -4,7 +4,7 @@ import json
 import random
 import shutil
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 try:
 	import cv2
@@ -18,22 +18,42 @@ try:
 except Exception:
 	_HAS_PIL = False
 
+try:
+	from .shards import ShardWriter  # type: ignore
+except Exception:
+	try:
+		from src.ml.shards import ShardWriter  # type: ignore
+	except Exception:
+		from shards import ShardWriter  # type: ignore
+
+try:
+	from .dedup import load_groups  # type: ignore
+except Exception:
+	try:
+		from src.ml.dedup import load_groups  # type: ignore
+	except Exception:
+		from dedup import load_groups  # type: ignore
+
+
+def normalize_records(rows: Iterable[Dict]) -> List[Dict]:
+	"""Coerce annotation rows (CSV strings or in-process records) to typed records."""
+	records: List[Dict] = []
+	for row in rows:
+		records.append({
+			"filename": row["filename"],
+			"xmin": int(float(row["xmin"])),
+			"ymin": int(float(row["ymin"])),
+			"xmax": int(float(row["xmax"])),
+			"ymax": int(float(row["ymax"])),
+			"label": str(row["label"]),
+		})
+	return records
+
 
 def read_annotations_csv(csv_path: Path) -> List[Dict]:
 	"""Expected CSV header: filename,xmin,ymin,xmax,ymax,label"""
-	records: List[Dict] = []
 	with csv_path.open("r", newline="", encoding="utf-8") as f:
-		reader = csv.DictReader(f)
-		for row in reader:
-			records.append({
-				"filename": row["filename"],
-				"xmin": int(float(row["xmin"])),
-				"ymin": int(float(row["ymin"])),
-				"xmax": int(float(row["xmax"])),
-				"ymax": int(float(row["ymax"])),
-				"label": str(row["label"]),
-			})
-	return records
+		return normalize_records(csv.DictReader(f))
 
 
 def build_index(records: List[Dict]) -> Dict[str, List[Dict]]:
@@ -84,6 +104,31 @@ def resize_image_simple(img_path: Path, target_size: int) -> Tuple[int, int]:
 	return 640, 480
 
 
+def _split_by_group(
+	shuffled_images: List[str],
+	groups: Dict[str, int],
+	n_train: int,
+	n_val: int,
+) -> Tuple[List[str], List[str], List[str]]:
+	"""Fill train, then val, then test with whole groups in shuffled order."""
+	members: Dict[object, List[str]] = {}
+	for fname in shuffled_images:
+		# Images missing from the report form their own group
+		key = groups.get(fname, ("single", fname))
+		members.setdefault(key, []).append(fname)
+	train_files: List[str] = []
+	val_files: List[str] = []
+	test_files: List[str] = []
+	for group in members.values():
+		if len(train_files) < n_train:
+			train_files.extend(group)
+		elif len(val_files) < n_val:
+			val_files.extend(group)
+		else:
+			test_files.extend(group)
+	return train_files, val_files, test_files
+
+
 def convert_dataset_to_yolo_simple(
 	images_dir: Path,
 	annotations_csv: Path,
@@ -91,10 +136,21 @@ def convert_dataset_to_yolo_simple(
 	splits: Tuple[float, float, float] = (0.8, 0.1, 0.1),
 	img_size: int = 640,
 	seed: int = 42,
+	write_shards: bool = False,
+	groups: Optional[Dict[str, int]] = None,
+	records: Optional[Iterable[Dict]] = None,
 ) -> Dict:
-	"""Convert to YOLO format without heavy dependencies."""
+	"""
+	Convert to YOLO format without heavy dependencies.
+	With write_shards=True, resized images are also decoded once into
+	memory-mapped shards under out_dir/shards (see shards.py) for train.py --shards.
+	groups maps filename -> near-duplicate group id (see dedup.py); all images of
+	a group are kept in the same split so duplicates cannot leak across splits.
+	records, if given, is used instead of reading annotations_csv (e.g. the
+	record stream of the clean stage in pipeline.py).
+	"""
 	out_dir.mkdir(parents=True, exist_ok=True)
-	records = read_annotations_csv(annotations_csv)
+	records = normalize_records(records) if records is not None else read_annotations_csv(annotations_csv)
 	idx = build_index(records)
 	class_map = compute_class_map(records)
 	random.seed(seed)
@@ -105,15 +161,22 @@ def convert_dataset_to_yolo_simple(
 	n = len(all_images)
 	n_train = int(n * splits[0])
 	n_val = int(n * splits[1])
-	train_files = all_images[:n_train]
-	val_files = all_images[n_train:n_train + n_val]
-	test_files = all_images[n_train + n_val:]
+	if groups:
+		train_files, val_files, test_files = _split_by_group(all_images, groups, n_train, n_val)
+	else:
+		train_files = all_images[:n_train]
+		val_files = all_images[n_train:n_train + n_val]
+		test_files = all_images[n_train + n_val:]
 
 	# Create dirs
 	for split in ("train", "val", "test"):
 		(out_dir / f"images/{split}").mkdir(parents=True, exist_ok=True)
 		(out_dir / f"labels/{split}").mkdir(parents=True, exist_ok=True)
 
+	writers: Dict[str, ShardWriter] = {}
+	if write_shards:
+		writers = {split: ShardWriter(out_dir / "shards", split) for split in ("train", "val", "test")}
+
 	def process_file(fname: str, split: str):
 		src_path = images_dir / fname
 		if not src_path.exists():
@@ -127,6 +190,7 @@ def convert_dataset_to_yolo_simple(
 		# Write labels
 		recs = idx.get(fname, [])
 		label_path = out_dir / f"labels/{split}" / f"{Path(fname).stem}.txt"
+		rows: List[List[float]] = []
 		with label_path.open("w", encoding="utf-8") as lf:
 			for r in recs:
 				xmin = max(0, min(int(r["xmin"]), w - 1))
@@ -135,7 +199,12 @@ def convert_dataset_to_yolo_simple(
 				ymax = max(0, min(int(r["ymax"]), h - 1))
 				if xmax > xmin and ymax > ymin:
 					cls_id = class_map[r["label"]]
-					lf.write(to_yolo_line(xmin, ymin, xmax, ymax, cls_id, w, h) + "\n")
+					line = to_yolo_line(xmin, ymin, xmax, ymax, cls_id, w, h)
+					lf.write(line + "\n")
+					rows.append([float(v) for v in line.split()])
+
+		if split in writers:
+			writers[split].add_file(dst_img, rows)
 
 	# Process splits
 	for fname in train_files:
@@ -144,6 +213,8 @@ def convert_dataset_to_yolo_simple(
 		process_file(fname, "val")
 	for fname in test_files:
 		process_file(fname, "test")
+	for writer in writers.values():
+		writer.close()
 
 	# Write data.yaml
 	data_yaml = {
@@ -164,6 +235,8 @@ def convert_dataset_to_yolo_simple(
 		"classes": {k: v for k, v in class_map.items()},
 		"out_dir": str(out_dir),
 	}
+	if write_shards:
+		stats["shard_dir"] = str(out_dir / "shards")
 	return stats
 
 
@@ -176,6 +249,8 @@ def main():
 	parser.add_argument("--splits", type=float, nargs=3, default=(0.8, 0.1, 0.1), help="Train/val/test split fractions.")
 	parser.add_argument("--img_size", type=int, default=640, help="Target size for longest side.")
 	parser.add_argument("--seed", type=int, default=42)
+	parser.add_argument("--shards", action="store_true", help="Also write pre-decoded memory-mapped shards to <out_dir>/shards.")
+	parser.add_argument("--groups_json", type=str, default=None, help="dedup.py report; keeps near-duplicate groups within one split.")
 	args = parser.parse_args()
 
 	stats = convert_dataset_to_yolo_simple(
@@ -185,6 +260,8 @@ def main():
 		splits=tuple(args.splits),
 		img_size=args.img_size,
 		seed=args.seed,
+		write_shards=args.shards,
+		groups=load_groups(Path(args.groups_json)) if args.groups_json else None,
 	)
 	print(json.dumps(stats, indent=2))
 
@@ -19,6 +19,16 @@ except Exception:
 	_HAS_PIL = False
 
 
+# Default mapping for soybean quality
+DEFAULT_QUALITY_MAPPING = {
+	"Intact soybeans": "Healthy",
+	"Broken soybeans": "Defective",
+	"Immature soybeans": "Defective",
+	"Skin-damaged soybeans": "Defective",
+	"Spotted soybeans": "Defective"
+}
+
+
 def create_quality_annotations_from_classification(
 	classification_root: Path,
 	output_csv: Path,
@@ -33,14 +43,7 @@ def create_quality_annotations_from_classification(
 		quality_mapping: Maps folder names to quality classes
 	"""
 	if quality_mapping is None:
-		# Default mapping for soybean quality
-		quality_mapping = {
-			"Intact soybeans": "Healthy",
-			"Broken soybeans": "Defective", 
-			"Immature soybeans": "Defective",
-			"Skin-damaged soybeans": "Defective",
-			"Spotted soybeans": "Defective"
-		}
+		quality_mapping = DEFAULT_QUALITY_MAPPING
 	
 	annotations = []
 	images_dir = classification_root
@@ -103,17 +106,62 @@ def create_quality_annotations_from_classification(
 		print(f"  {cls}: {count}")
 
 
+def build_quality_classification_dataset(
+	classification_root: Path,
+	out_dir: Path,
+	quality_mapping: Dict[str, str] = None,
+	splits: Tuple[float, float, float] = (0.8, 0.1, 0.1),
+	seed: int = 42,
+) -> Dict[str, Dict[str, int]]:
+	"""
+	Lay out the same classification folders as an ultralytics classification
+	dataset (out_dir/{train,val,test}/{Healthy,Defective}/*.jpg) for training the
+	cascade's gating classifier, e.g.:
+	  python src/ml/train.py --data data/quality_cls --model yolov8n-cls.pt --img 224
+	"""
+	if quality_mapping is None:
+		quality_mapping = DEFAULT_QUALITY_MAPPING
+	random.seed(seed)
+	counts: Dict[str, Dict[str, int]] = {"train": {}, "val": {}, "test": {}}
+
+	for class_folder in sorted(f for f in classification_root.iterdir() if f.is_dir()):
+		quality_class = quality_mapping.get(class_folder.name)
+		if quality_class is None:
+			print(f"Skipping unmapped folder {class_folder.name}")
+			continue
+		images = sorted(
+			p for p in class_folder.rglob("*.*")
+			if p.is_file() and p.suffix.lower() in ['.jpg', '.jpeg', '.png']
+		)
+		random.shuffle(images)
+		n_train = int(len(images) * splits[0])
+		n_val = int(len(images) * splits[1])
+		for i, img_path in enumerate(images):
+			split = "train" if i < n_train else "val" if i < n_train + n_val else "test"
+			dst_dir = out_dir / split / quality_class
+			dst_dir.mkdir(parents=True, exist_ok=True)
+			# Prefix with the source folder so names from different folders cannot collide
+			shutil.copy2(img_path, dst_dir / f"{class_folder.name.replace(' ', '_')}_{img_path.name}")
+			counts[split][quality_class] = counts[split].get(quality_class, 0) + 1
+
+	print(f"Classification dataset written to {out_dir}: {json.dumps(counts)}")
+	return counts
+
+
 def main():
 	import argparse
 	parser = argparse.ArgumentParser(description="Create quality-based annotations from classification dataset.")
 	parser.add_argument("--input_dir", required=True, help="Classification dataset root")
 	parser.add_argument("--output_csv", default="data/raw/quality_annotations.csv", help="Output CSV path")
+	parser.add_argument("--cls_out", default=None, help="Also write a Healthy/Defective classification dataset here (cascade classifier)")
 	args = parser.parse_args()
 	
 	create_quality_annotations_from_classification(
 		Path(args.input_dir),
 		Path(args.output_csv)
 	)
+	if args.cls_out:
+		build_quality_classification_dataset(Path(args.input_dir), Path(args.cls_out))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,278 @@
+"""
+Pre-decoded, memory-mapped image shards for training.
+
+Layout for one split (e.g. data/yolo_dataset/shards/train.*):
+  train.bin          raw uint8 pixels (H x W x 3, RGB), images back to back
+  train.index.npy    structured array, one row per image:
+                     offset, height, width, channels, label_start, label_count
+  train.labels.npy   float32 (K, 5) YOLO rows: cls cx cy w h (normalized)
+  train.names.json   image file names, same order as the index
+
+Reading is zero-copy: ShardReader returns numpy views into the memory map, so
+no JPEG is decoded during training.
+"""
+import json
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+	import numpy as np
+	_HAS_NP = True
+except Exception:
+	np = None  # type: ignore
+	_HAS_NP = False
+
+try:
+	from PIL import Image
+	_HAS_PIL = True
+except Exception:
+	_HAS_PIL = False
+
+INDEX_DTYPE = [
+	("offset", "<i8"),
+	("height", "<i4"),
+	("width", "<i4"),
+	("channels", "<i4"),
+	("label_start", "<i8"),
+	("label_count", "<i4"),
+]
+
+
+def _require_numpy() -> None:
+	if not _HAS_NP:
+		raise RuntimeError("numpy not installed. Install with: pip install numpy")
+
+
+def shard_paths(shard_dir: Path, split: str) -> Dict[str, Path]:
+	return {
+		"bin": shard_dir / f"{split}.bin",
+		"index": shard_dir / f"{split}.index.npy",
+		"labels": shard_dir / f"{split}.labels.npy",
+		"names": shard_dir / f"{split}.names.json",
+	}
+
+
+def has_shard(shard_dir: Path, split: str) -> bool:
+	return all(p.exists() for p in shard_paths(Path(shard_dir), split).values())
+
+
+def decode_rgb(img_path: Path) -> "np.ndarray":
+	"""Decode an image file to an HxWx3 uint8 RGB array."""
+	_require_numpy()
+	if not _HAS_PIL:
+		raise RuntimeError("Pillow not installed. Install with: pip install Pillow")
+	with Image.open(img_path) as im:
+		return np.asarray(im.convert("RGB"), dtype=np.uint8)
+
+
+class ShardWriter:
+	"""
+	Appends decoded images and their YOLO labels to a split's shard files.
+	Use as a context manager; the index is written on close().
+	"""
+
+	def __init__(self, shard_dir: Path, split: str):
+		_require_numpy()
+		self.shard_dir = Path(shard_dir)
+		self.shard_dir.mkdir(parents=True, exist_ok=True)
+		self.split = split
+		self._paths = shard_paths(self.shard_dir, split)
+		self._fh = self._paths["bin"].open("wb")
+		self._offset = 0
+		self._rows: List[Tuple[int, int, int, int, int, int]] = []
+		self._labels: List["np.ndarray"] = []
+		self._label_count = 0
+		self._names: List[str] = []
+
+	def add(self, name: str, image: "np.ndarray", labels: Optional["np.ndarray"] = None) -> None:
+		image = np.ascontiguousarray(image, dtype=np.uint8)
+		if image.ndim == 2:
+			image = image[:, :, None]
+		h, w, c = image.shape
+		lab = np.zeros((0, 5), dtype=np.float32) if labels is None else np.asarray(labels, dtype=np.float32).reshape(-1, 5)
+		self._fh.write(image.tobytes())
+		self._rows.append((self._offset, h, w, c, self._label_count, len(lab)))
+		self._offset += image.nbytes
+		self._labels.append(lab)
+		self._label_count += len(lab)
+		self._names.append(name)
+
+	def add_file(self, img_path: Path, labels: Optional["np.ndarray"] = None) -> None:
+		self.add(Path(img_path).name, decode_rgb(img_path), labels)
+
+	def close(self) -> None:
+		if self._fh is None:
+			return
+		self._fh.close()
+		self._fh = None
+		index = np.array(self._rows, dtype=INDEX_DTYPE)
+		labels = np.concatenate(self._labels) if self._labels else np.zeros((0, 5), dtype=np.float32)
+		np.save(self._paths["index"], index)
+		np.save(self._paths["labels"], labels.astype(np.float32))
+		with self._paths["names"].open("w", encoding="utf-8") as f:
+			json.dump(self._names, f)
+
+	def __enter__(self) -> "ShardWriter":
+		return self
+
+	def __exit__(self, *exc) -> None:
+		self.close()
+
+
+class ShardReader:
+	"""
+	Zero-copy reader for one split. reader[i] -> (image HxWxC uint8 view, labels (k,5) float32).
+	The memory map is opened lazily and dropped on pickling, so readers can be
+	handed to DataLoader worker processes without copying the pixel data.
+	"""
+
+	def __init__(self, shard_dir: Path, split: str):
+		_require_numpy()
+		self.shard_dir = Path(shard_dir)
+		self.split = split
+		paths = shard_paths(self.shard_dir, split)
+		self._bin_path = paths["bin"]
+		self.index = np.load(paths["index"], mmap_mode="r")
+		self.labels = np.load(paths["labels"], mmap_mode="r")
+		with paths["names"].open("r", encoding="utf-8") as f:
+			self.names: List[str] = json.load(f)
+		self._lookup = {n: i for i, n in enumerate(self.names)}
+		self._data: Optional["np.ndarray"] = None
+
+	def _mmap(self) -> "np.ndarray":
+		if self._data is None:
+			if self._bin_path.stat().st_size == 0:
+				self._data = np.zeros((0,), dtype=np.uint8)
+			else:
+				self._data = np.memmap(self._bin_path, dtype=np.uint8, mode="r")
+		return self._data
+
+	def __len__(self) -> int:
+		return len(self.names)
+
+	def __getitem__(self, i: int) -> Tuple["np.ndarray", "np.ndarray"]:
+		return self.image(i), self.label(i)
+
+	def __iter__(self) -> Iterator[Tuple["np.ndarray", "np.ndarray"]]:
+		for i in range(len(self)):
+			yield self[i]
+
+	def image(self, i: int) -> "np.ndarray":
+		row = self.index[i]
+		h, w, c = int(row["height"]), int(row["width"]), int(row["channels"])
+		start = int(row["offset"])
+		return self._mmap()[start:start + h * w * c].reshape(h, w, c)
+
+	def label(self, i: int) -> "np.ndarray":
+		row = self.index[i]
+		start = int(row["label_start"])
+		return self.labels[start:start + int(row["label_count"])]
+
+	def index_of(self, name: str) -> Optional[int]:
+		return self._lookup.get(name)
+
+	def __getstate__(self) -> dict:
+		state = self.__dict__.copy()
+		state["_data"] = None
+		state["index"] = None
+		state["labels"] = None
+		return state
+
+	def __setstate__(self, state: dict) -> None:
+		self.__dict__.update(state)
+		paths = shard_paths(self.shard_dir, self.split)
+		self.index = np.load(paths["index"], mmap_mode="r")
+		self.labels = np.load(paths["labels"], mmap_mode="r")
+
+
+class _ShardImageLoader:
+	"""Replacement for YOLODataset.load_image; a class (not a closure) so it pickles to workers."""
+
+	def __init__(self, dataset, *readers: ShardReader):
+		self.dataset = dataset
+		self.readers = list(readers)
+
+	def _find(self, name: str) -> Optional[Tuple[ShardReader, int]]:
+		for reader in self.readers:
+			j = reader.index_of(name)
+			if j is not None:
+				return reader, j
+		return None
+
+	def __call__(self, i: int, rect_mode: bool = True):
+		ds = self.dataset
+		# Already in RAM (cache="ram" or still in the mosaic buffer)
+		if ds.ims[i] is not None:
+			return ds.ims[i], ds.im_hw0[i], ds.im_hw[i]
+		found = self._find(Path(ds.im_files[i]).name)
+		if found is None:
+			return type(ds).load_image(ds, i, rect_mode)
+		reader, j = found
+		# ultralytics pipelines expect BGR; the channel flip is the only copy made
+		im = np.ascontiguousarray(reader.image(j)[:, :, ::-1])
+		h0, w0 = im.shape[:2]
+		size = None
+		if rect_mode:
+			r = ds.imgsz / max(h0, w0)
+			if r != 1:
+				size = (min(int(round(w0 * r)), ds.imgsz), min(int(round(h0 * r)), ds.imgsz))
+		elif not (h0 == w0 == ds.imgsz):
+			size = (ds.imgsz, ds.imgsz)
+		if size is not None:
+			import cv2  # ultralytics dependency
+			im = cv2.resize(im, size, interpolation=cv2.INTER_LINEAR)
+		# Same bookkeeping as BaseDataset.load_image: mosaic/mixup sample from ds.buffer
+		if ds.augment:
+			ds.ims[i], ds.im_hw0[i], ds.im_hw[i] = im, (h0, w0), im.shape[:2]
+			ds.buffer.append(i)
+			if 1 < len(ds.buffer) >= ds.max_buffer_length:
+				k = ds.buffer.pop(0)
+				if getattr(ds, "cache", None) != "ram":
+					ds.ims[k], ds.im_hw0[k], ds.im_hw[k] = None, None, None
+		return im, (h0, w0), im.shape[:2]
+
+
+def attach_shard_to_yolo_dataset(dataset, reader: ShardReader) -> None:
+	"""
+	Make an ultralytics YOLODataset read pixels from a shard instead of decoding
+	JPEGs. Images missing from the shard fall back to the dataset's own loader.
+	"""
+	loader = getattr(dataset, "load_image", None)
+	if isinstance(loader, _ShardImageLoader):
+		loader.readers.append(reader)
+		return
+	dataset.shard_reader = reader
+	dataset.load_image = _ShardImageLoader(dataset, reader)
+
+
+def extend_yolo_dataset_with_shard(dataset, reader: ShardReader) -> int:
+	"""
+	Append every image of a shard split (e.g. "train_aug" from augment.py) to an
+	ultralytics YOLODataset as extra training samples, labels included, and
+	attach the shard so their pixels are read from it. Returns the number of
+	samples added. Must run before the dataset is iterated.
+	"""
+	single_cls = bool(getattr(dataset, "single_cls", False))
+	for j, name in enumerate(reader.names):
+		lab = np.array(reader.label(j), dtype=np.float32).reshape(-1, 5)
+		row = reader.index[j]
+		dataset.im_files.append(str(reader.shard_dir / reader.split / name))
+		dataset.labels.append({
+			"im_file": dataset.im_files[-1],
+			"shape": (int(row["height"]), int(row["width"])),
+			"cls": np.zeros_like(lab[:, 0:1]) if single_cls else lab[:, 0:1],
+			"bboxes": lab[:, 1:],
+			"segments": [],
+			"keypoints": None,
+			"normalized": True,
+			"bbox_format": "xywh",
+		})
+	added = len(reader)
+	dataset.ni = len(dataset.labels)
+	dataset.ims.extend([None] * added)
+	dataset.im_hw0.extend([None] * added)
+	dataset.im_hw.extend([None] * added)
+	if hasattr(dataset, "npy_files"):
+		dataset.npy_files.extend(Path(f).with_suffix(".npy") for f in dataset.im_files[-added:])
+	attach_shard_to_yolo_dataset(dataset, reader)
+	return added
@@ -0,0 +1,169 @@
+"""
+Synthetic inference backend for capacity planning.
+
+Behaves like a model of configurable cost instead of returning instantly:
+- latency drawn from a distribution ("fixed", "uniform", "normal", "lognormal",
+  "exponential") around latency_ms, with relative spread `jitter`;
+- cpu_fraction of that latency is spent burning real CPU time (hashing, which
+  releases the GIL like a native model would); the rest is spent sleeping,
+  standing in for accelerator / I/O waits. Under CPU contention the CPU part
+  stretches, so saturation shows up the same way it would with a real model;
+- a Poisson number of boxes (mean `boxes`) and memory_mb of touched working
+  memory held for the duration of the call.
+Detections are derived from seed + the image bytes, so the same image always
+gets the same boxes. Latencies come from one RNG per backend seeded with seed:
+every request gets its own draw (so a load test cycling a few sample images
+still sees the whole distribution), and a run replays the same sequence.
+
+Selected with INFERENCE_BACKEND=synthetic (see src/server/config.py).
+"""
+import hashlib
+import math
+import random
+import threading
+import time
+import zlib
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+	from PIL import Image, ImageDraw
+except Exception:
+	Image = None
+	ImageDraw = None
+
+try:
+	from .inference import _draw_overlay, phase  # type: ignore
+except Exception:
+	try:
+		from src.ml.inference import _draw_overlay, phase  # type: ignore
+	except Exception:
+		from inference import _draw_overlay, phase  # type: ignore
+
+DEFAULT_LABELS = ("healthy_crop", "weed", "pest_damage")
+DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+_BURN_BLOCK = b"\0" * 65536
+_PAGE = 4096
+
+
+class SyntheticBackend:
+	def __init__(
+		self,
+		latency_ms: float = 80.0,
+		distribution: str = "lognormal",
+		jitter: float = 0.3,
+		cpu_fraction: float = 0.5,
+		boxes: float = 3.0,
+		memory_mb: int = 0,
+		seed: int = 0,
+		labels: Tuple[str, ...] = DEFAULT_LABELS,
+	):
+		if distribution not in DISTRIBUTIONS:
+			raise ValueError(f"unknown latency distribution: {distribution}")
+		self.latency_ms = max(0.0, latency_ms)
+		self.distribution = distribution
+		self.jitter = max(0.0, jitter)
+		self.cpu_fraction = min(1.0, max(0.0, cpu_fraction))
+		self.boxes = max(0.0, boxes)
+		self.memory_mb = max(0, memory_mb)
+		self.seed = seed
+		self.labels = tuple(labels) or DEFAULT_LABELS
+		self._lock = threading.Lock()
+		self._latency_rng = random.Random(seed)
+		self.calls = 0
+
+	def sample_latency_s(self, rng: random.Random) -> float:
+		mean = self.latency_ms / 1000.0
+		if mean <= 0 or self.distribution == "fixed":
+			return mean
+		if self.distribution == "uniform":
+			return mean * rng.uniform(1 - self.jitter, 1 + self.jitter)
+		if self.distribution == "normal":
+			return max(0.0, rng.gauss(mean, mean * self.jitter))
+		if self.distribution == "lognormal":
+			sigma = self.jitter
+			return rng.lognormvariate(math.log(mean) - sigma * sigma / 2, sigma)
+		return rng.expovariate(1.0 / mean)
+
+	def _poisson(self, rng: random.Random) -> int:
+		limit, k, p = math.exp(-self.boxes), 0, rng.random()
+		while p > limit:
+			k += 1
+			p *= rng.random()
+		return k
+
+	@staticmethod
+	def _burn_cpu(seconds: float) -> None:
+		"""Spend `seconds` of this thread's CPU time."""
+		if seconds <= 0:
+			return
+		h = hashlib.sha256()
+		end = time.thread_time() + seconds
+		while time.thread_time() < end:
+			h.update(_BURN_BLOCK)
+
+	def _allocate(self) -> Optional[bytearray]:
+		if not self.memory_mb:
+			return None
+		buf = bytearray(self.memory_mb * 1024 * 1024)
+		# Touch every page so the memory is actually resident
+		buf[::_PAGE] = b"\1" * len(range(0, len(buf), _PAGE))
+		return buf
+
+	def _image_size(self, image_path: str) -> Tuple[int, int]:
+		if Image is not None:
+			try:
+				with Image.open(image_path) as im:
+					return im.size
+			except Exception:
+				pass
+		return 640, 640
+
+	def detect(self, image_path: str, overlay_output_path: Optional[str] = None) -> Dict[str, Any]:
+		"""Same contract as inference.detect_image."""
+		with open(image_path, "rb") as f:
+			digest = zlib.crc32(f.read())
+		rng = random.Random((self.seed << 32) ^ digest)
+		with self._lock:
+			latency = self.sample_latency_s(self._latency_rng)
+		w, h = self._image_size(image_path)
+
+		detections: List[Dict[str, Any]] = []
+		boxes_xyxy = []
+		for _ in range(self._poisson(rng)):
+			bw, bh = rng.uniform(0.05, 0.4) * w, rng.uniform(0.05, 0.4) * h
+			x1, y1 = rng.uniform(0, w - bw), rng.uniform(0, h - bh)
+			box = [int(x1), int(y1), int(x1 + bw), int(y1 + bh)]
+			boxes_xyxy.append(tuple(box))
+			detections.append({
+				"label": rng.choice(self.labels),
+				"confidence": round(rng.uniform(0.25, 0.99), 4),
+				"bbox": box,
+			})
+
+		with phase("predict"):
+			held = self._allocate()
+			self._burn_cpu(latency * self.cpu_fraction)
+			time.sleep(latency * (1.0 - self.cpu_fraction))
+			del held
+
+		if overlay_output_path and ImageDraw is not None:
+			_draw_overlay(image_path, overlay_output_path, boxes_xyxy)
+		with self._lock:
+			self.calls += 1
+		return {"detections": detections, "width": w, "height": h}
+
+
+@lru_cache(maxsize=8)
+def get_backend(
+	latency_ms: float = 80.0,
+	distribution: str = "lognormal",
+	jitter: float = 0.3,
+	cpu_fraction: float = 0.5,
+	boxes: float = 3.0,
+	memory_mb: int = 0,
+	seed: int = 0,
+) -> SyntheticBackend:
+	"""Shared backend instance per parameter set."""
+	return SyntheticBackend(latency_ms, distribution, jitter, cpu_fraction, boxes, memory_mb, seed)
@@ -1,6 +1,7 @@
 import argparse
 import os
 from pathlib import Path
+from typing import Any, Callable, Dict, Optional
 
 # ultralytics is optional in runtime; required for training
 try:
@@ -9,23 +10,91 @@ try:
 except Exception:
 	YOLO = None  # type: ignore
 	_HAS_ULTRA = False
+
+try:
+	from .shards import ShardReader, attach_shard_to_yolo_dataset, extend_yolo_dataset_with_shard, has_shard  # type: ignore
+except Exception:
+	try:
+		from src.ml.shards import ShardReader, attach_shard_to_yolo_dataset, extend_yolo_dataset_with_shard, has_shard  # type: ignore
+	except Exception:
+		from shards import ShardReader, attach_shard_to_yolo_dataset, extend_yolo_dataset_with_shard, has_shard  # type: ignore
 #train the model
 
-def train(data_yaml: str, model: str = "yolov8n.pt", epochs: int = 20, imgsz: int = 640, device: str = "") -> None:
+
+def _shard_trainer(shard_dir: str):
+	"""
+	Build a DetectionTrainer subclass whose datasets read pixels from
+	pre-decoded shards (written by preprocess_simple.py --shards) instead of JPEGs.
+	In train mode, an "<split>_aug" shard (preprocess.py --augment_copies) is
+	appended to the training set as extra samples.
+	"""
+	from ultralytics.models.yolo.detect import DetectionTrainer  # type: ignore
+
+	class ShardDetectionTrainer(DetectionTrainer):
+		def build_dataset(self, img_path, mode="train", batch=None):
+			dataset = super().build_dataset(img_path, mode, batch)
+			# img_path is .../images/<split>
+			split = Path(str(img_path)).name
+			if has_shard(Path(shard_dir), split):
+				attach_shard_to_yolo_dataset(dataset, ShardReader(Path(shard_dir), split))
+			if mode == "train" and not dataset.rect and has_shard(Path(shard_dir), f"{split}_aug"):
+				added = extend_yolo_dataset_with_shard(dataset, ShardReader(Path(shard_dir), f"{split}_aug"))
+				print(f"shards: added {added} augmented samples from {split}_aug")
+			return dataset
+
+	return ShardDetectionTrainer
+
+
+def train(
+	data_yaml: str,
+	model: str = "yolov8n.pt",
+	epochs: int = 20,
+	imgsz: int = 640,
+	device: str = "",
+	shard_dir: str = "",
+	batch: int = 16,
+	workers: int = 8,
+	cache: str = "false",
+	threads: int = 0,
+	name: str = "",
+	project: str = "runs/train",
+	callbacks: Optional[Dict[str, Callable]] = None,
+	**overrides: Any,
+) -> Path:
+	"""
+	Train and return the run directory (e.g. runs/train/yolov8n).
+	cache: "false", "ram" or "disk" (ultralytics image cache).
+	threads: torch intra-op threads for CPU training (0 = torch default).
+	Extra keyword arguments are passed through to ultralytics (e.g. fraction, val).
+	"""
 	if not _HAS_ULTRA:
 		raise RuntimeError("ultralytics not installed. Install with: pip install ultralytics")
 	if not os.path.exists(data_yaml):
 		raise FileNotFoundError(f"data.yaml not found: {data_yaml}")
+	if shard_dir and not os.path.isdir(shard_dir):
+		raise FileNotFoundError(f"shard directory not found: {shard_dir}")
+
+	if threads > 0:
+		import torch  # type: ignore
+		torch.set_num_threads(threads)
 
 	yolo = YOLO(model)  # type: ignore
+	for event, fn in (callbacks or {}).items():
+		yolo.add_callback(event, fn)
 	yolo.train(
 		data=data_yaml,
 		epochs=epochs,
 		imgsz=imgsz,
 		device=device,  # "" auto, "cpu", "0" for first GPU
-		project="runs/train",
-		name=Path(model).stem,
+		batch=batch,
+		workers=workers,
+		cache=False if str(cache).lower() in ("", "false", "0", "none") else str(cache).lower(),
+		project=project,
+		name=name or Path(model).stem,
+		**({"trainer": _shard_trainer(shard_dir)} if shard_dir else {}),
+		**overrides,
 	)
+	return Path(yolo.trainer.save_dir)  # type: ignore
 
 
 def main():
@@ -35,9 +104,50 @@ def main():
 	parser.add_argument("--epochs", type=int, default=20, help="Number of epochs")
 	parser.add_argument("--img", type=int, default=640, help="Image size")
 	parser.add_argument("--device", type=str, default="", help='Device: "" auto, "cpu", "0" for GPU 0')
+	parser.add_argument("--shards", type=str, default="", help="Shard directory from preprocess_simple.py --shards (skips JPEG decoding)")
+	parser.add_argument("--batch", type=int, default=16, help="Batch size")
+	parser.add_argument("--workers", type=int, default=8, help="Dataloader worker processes")
+	parser.add_argument("--cache", type=str, default="false", choices=["false", "ram", "disk"], help="Image cache mode")
+	parser.add_argument("--threads", type=int, default=0, help="Torch CPU threads (0 = default)")
+	parser.add_argument("--profile", action="store_true", help="Run short trials to pick batch/workers/cache/threads, then train with the fastest")
+	parser.add_argument("--profile_only", action="store_true", help="With --profile: only write the profile, do not train")
+	parser.add_argument("--profile_batches", type=str, default="8,16,32", help="Batch sizes to try")
+	parser.add_argument("--profile_workers", type=str, default="0,2,4,8", help="Worker counts to try")
+	parser.add_argument("--profile_cache", type=str, default="false,ram,disk", help="Cache modes to try")
+	parser.add_argument("--profile_threads", type=str, default="0", help="Torch thread counts to try")
+	parser.add_argument("--profile_fraction", type=float, default=0.25, help="Fraction of the train split used per trial epoch")
+	parser.add_argument("--max_rss_mb", type=int, default=0, help="Memory budget for the chosen config (0 = 80%% of RAM)")
 	args = parser.parse_args()
 
-	train(args.data, args.model, args.epochs, args.img, args.device)
+	config = {"batch": args.batch, "workers": args.workers, "cache": args.cache, "threads": args.threads}
+	profile = None
+	if args.profile:
+		try:
+			from .train_profile import profile_training  # type: ignore
+		except Exception:
+			try:
+				from src.ml.train_profile import profile_training  # type: ignore
+			except Exception:
+				from train_profile import profile_training  # type: ignore
+		profile = profile_training(
+			args.data, args.model, args.img, args.device, args.shards,
+			base_config=config,
+			batches=[int(v) for v in args.profile_batches.split(",") if v.strip()],
+			workers=[int(v) for v in args.profile_workers.split(",") if v.strip()],
+			caches=[v.strip() for v in args.profile_cache.split(",") if v.strip()],
+			threads=[int(v) for v in args.profile_threads.split(",") if v.strip()],
+			fraction=args.profile_fraction,
+			max_rss_mb=args.max_rss_mb,
+		)
+		if profile.best:
+			config = dict(profile.best)
+		print(f"profile: best config {config}")
+		if args.profile_only:
+			return
+
+	save_dir = train(args.data, args.model, args.epochs, args.img, args.device, args.shards, **config)
+	if profile is not None:
+		profile.write(save_dir)
 
 
 if __name__ == "__main__":
@@ -57,4 +167,17 @@ Quick start:
 
 4) CPU example:
    python src/ml/train.py --data data/data.yaml --epochs 10 --img 640 --device cpu
+
+5) Auto-tune batch/workers/cache/threads with short trial epochs, then train
+   (writes profile.csv/profile.json next to results.csv):
+   python src/ml/train.py --data data/data.yaml --device cpu --profile
+
+6) CPU training from pre-decoded shards (no per-epoch JPEG decoding):
+   python src/ml/preprocess_simple.py --images_dir data/raw/images --annotations_csv data/raw/annotations_clean.csv --shards
+   python src/ml/train.py --data data/yolo_dataset/data.yaml --shards data/yolo_dataset/shards --device cpu
+
+7) Same, with 2 offline-augmented copies of the train split (shard "train_aug",
+   added to the training set by --shards):
+   python src/ml/preprocess.py --images_dir data/raw/images --annotations_csv data/raw/annotations_clean.csv --shards --augment_copies 2
+   python src/ml/train.py --data data/yolo_dataset/data.yaml --shards data/yolo_dataset/shards --device cpu
 """
\ No newline at end of file
@@ -0,0 +1,308 @@
+"""
+Training throughput profiler used by `train.py --profile`.
+
+Each trial runs one short epoch (a fraction of the train split, no validation)
+in a fresh process so peak RSS is measured per configuration. While the trial
+trains, a thread samples the live RSS of the trial process and all of its
+dataloader workers (psutil, else /proc), and peak_rss_mb is the largest total
+seen at one time. Dataloader stall
+is the time between the end of one batch and the start of the next (the loop is
+waiting for data) over the total step time. Knobs are tuned one at a time
+(batch -> workers -> cache -> threads), keeping the best value of each, which
+needs far fewer trials than the full grid.
+"""
+import csv
+import json
+import multiprocessing as mp
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+	from .utils import rss_mb  # type: ignore
+except Exception:
+	try:
+		from src.ml.utils import rss_mb  # type: ignore
+	except Exception:
+		from utils import rss_mb  # type: ignore
+
+PROFILE_FIELDS = [
+	"trial", "batch", "workers", "cache", "threads", "ok", "images_per_sec",
+	"stall_fraction", "batches", "wall_s", "rss_main_mb", "rss_worker_mb",
+	"peak_rss_mb", "fits_memory", "error",
+]
+
+
+def _proc_rss_mb(pid: int) -> Optional[float]:
+	try:
+		with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+			for line in f:
+				if line.startswith("VmRSS:"):
+					return int(line.split()[1]) / 1024.0
+	except (OSError, ValueError, IndexError):
+		pass
+	return None
+
+
+def _tree_rss_mb(pid: int) -> Optional[Dict[int, float]]:
+	"""Current RSS in MB of pid and all of its live descendants, keyed by pid (None if unsupported)."""
+	try:
+		import psutil  # type: ignore
+	except Exception:
+		psutil = None
+	if psutil is not None:
+		try:
+			root = psutil.Process(pid)
+			procs = [root] + root.children(recursive=True)
+		except psutil.Error:
+			return None
+		out: Dict[int, float] = {}
+		for proc in procs:
+			try:
+				out[proc.pid] = proc.memory_info().rss / (1024 * 1024)
+			except psutil.Error:
+				pass
+		return out
+	if not os.path.isdir("/proc"):
+		return None
+	children: Dict[int, List[int]] = {}
+	for entry in os.listdir("/proc"):
+		if not entry.isdigit():
+			continue
+		try:
+			with open(f"/proc/{entry}/stat", "r", encoding="utf-8") as f:
+				# comm may contain spaces and parentheses; ppid follows the state after the last ")"
+				ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+		except (OSError, ValueError, IndexError):
+			continue
+		children.setdefault(ppid, []).append(int(entry))
+	out = {}
+	stack = [pid]
+	while stack:
+		p = stack.pop()
+		rss = _proc_rss_mb(p)
+		if rss is not None:
+			out[p] = rss
+		stack.extend(children.get(p, []))
+	return out
+
+
+class _RssSampler:
+	"""Background thread tracking the peak live RSS of this process and its descendants."""
+
+	def __init__(self, interval_s: float = 0.2):
+		self.interval_s = interval_s
+		self.peak_main = 0.0
+		self.peak_worker = 0.0
+		self.peak_total = 0.0
+		self.supported = True
+		self._stop = threading.Event()
+		self._thread = threading.Thread(target=self._loop, name="rss-sampler", daemon=True)
+
+	def _sample(self) -> None:
+		pid = os.getpid()
+		tree = _tree_rss_mb(pid)
+		if not tree:
+			self.supported = False
+			return
+		main = tree.pop(pid, 0.0)
+		self.peak_main = max(self.peak_main, main)
+		self.peak_worker = max(self.peak_worker, max(tree.values(), default=0.0))
+		self.peak_total = max(self.peak_total, main + sum(tree.values()))
+
+	def _loop(self) -> None:
+		while self.supported and not self._stop.wait(self.interval_s):
+			self._sample()
+
+	def start(self) -> "_RssSampler":
+		self._sample()
+		self._thread.start()
+		return self
+
+	def stop(self) -> Dict[str, Optional[float]]:
+		"""Stop sampling; rss_main_mb / rss_worker_mb are per-process peaks, peak_rss_mb the peak sum."""
+		self._stop.set()
+		self._thread.join()
+		# ru_maxrss catches main-process spikes shorter than the sampling interval
+		main_max = rss_mb()["rss_main_mb"] or 0.0
+		if not self.supported:
+			return {"rss_main_mb": round(main_max, 1), "rss_worker_mb": None, "peak_rss_mb": round(main_max, 1)}
+		return {
+			"rss_main_mb": round(max(self.peak_main, main_max), 1),
+			"rss_worker_mb": round(self.peak_worker, 1),
+			"peak_rss_mb": round(max(self.peak_total, main_max), 1),
+		}
+
+
+def memory_budget_mb(max_rss_mb: int = 0) -> float:
+	"""Explicit budget, else 80% of physical RAM (0 = unknown, no limit)."""
+	if max_rss_mb > 0:
+		return float(max_rss_mb)
+	try:
+		total = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+		return 0.8 * total / (1024 * 1024)
+	except Exception:
+		return 0.0
+
+
+def _run_trial(conn, kwargs: Dict[str, Any]) -> None:
+	"""Child process: train one short epoch and report throughput and memory."""
+	try:
+		try:
+			from src.ml.train import train  # type: ignore
+		except Exception:
+			from train import train  # type: ignore
+
+		state = {"last_end": None, "start": 0.0}
+		stats = {"wait": 0.0, "compute": 0.0, "batches": 0, "images": 0}
+
+		def on_train_epoch_start(trainer):
+			state["last_end"] = time.perf_counter()
+
+		def on_train_batch_start(trainer):
+			now = time.perf_counter()
+			# First batch includes worker start-up; keep it out of steady-state numbers
+			if stats["batches"] > 0 and state["last_end"] is not None:
+				stats["wait"] += now - state["last_end"]
+			state["start"] = now
+
+		def on_train_batch_end(trainer):
+			now = time.perf_counter()
+			if stats["batches"] > 0:
+				stats["compute"] += now - state["start"]
+				stats["images"] += int(getattr(trainer, "batch_size", 0) or 0)
+			stats["batches"] += 1
+			state["last_end"] = now
+
+		sampler = _RssSampler().start()
+		t0 = time.perf_counter()
+		try:
+			train(
+				callbacks={
+					"on_train_epoch_start": on_train_epoch_start,
+					"on_train_batch_start": on_train_batch_start,
+					"on_train_batch_end": on_train_batch_end,
+				},
+				**kwargs,
+			)
+		finally:
+			memory = sampler.stop()
+		wall = time.perf_counter() - t0
+		busy = stats["wait"] + stats["compute"]
+		result = {
+			"ok": True,
+			"wall_s": round(wall, 2),
+			"batches": stats["batches"],
+			"images_per_sec": round(stats["images"] / busy, 2) if busy > 0 else 0.0,
+			"stall_fraction": round(stats["wait"] / busy, 4) if busy > 0 else None,
+		}
+		result.update(memory)
+		conn.send(result)
+	except Exception as e:
+		conn.send({"ok": False, "error": f"{type(e).__name__}: {e}"})
+	finally:
+		conn.close()
+
+
+class ProfileResult:
+	def __init__(self, trials: List[Dict[str, Any]], best: Optional[Dict[str, Any]], budget_mb: float):
+		self.trials = trials
+		self.best = best
+		self.budget_mb = budget_mb
+
+	def write(self, out_dir: Path) -> None:
+		"""Write profile.csv (one row per trial) and profile.json (choice + budget)."""
+		out_dir = Path(out_dir)
+		out_dir.mkdir(parents=True, exist_ok=True)
+		with (out_dir / "profile.csv").open("w", newline="", encoding="utf-8") as f:
+			writer = csv.DictWriter(f, fieldnames=PROFILE_FIELDS, extrasaction="ignore")
+			writer.writeheader()
+			writer.writerows(self.trials)
+		with (out_dir / "profile.json").open("w", encoding="utf-8") as f:
+			json.dump({"best": self.best, "memory_budget_mb": round(self.budget_mb, 1), "trials": self.trials}, f, indent=2)
+
+
+def profile_training(
+	data_yaml: str,
+	model: str,
+	imgsz: int,
+	device: str,
+	shard_dir: str,
+	base_config: Dict[str, Any],
+	batches: List[int],
+	workers: List[int],
+	caches: List[str],
+	threads: List[int],
+	fraction: float = 0.25,
+	max_rss_mb: int = 0,
+	trial_timeout_s: float = 3600.0,
+) -> ProfileResult:
+	"""
+	Tune batch, workers, cache and threads with short trial epochs and return the
+	fastest configuration whose peak RSS fits the memory budget. Results are also
+	written to runs/profile/<model>/.
+	"""
+	budget = memory_budget_mb(max_rss_mb)
+	ctx = mp.get_context("spawn")
+	stem = Path(model).stem
+	trials: List[Dict[str, Any]] = []
+	seen: Dict[tuple, Dict[str, Any]] = {}
+
+	def run(config: Dict[str, Any]) -> Dict[str, Any]:
+		key = (config["batch"], config["workers"], str(config["cache"]), config["threads"])
+		if key in seen:
+			return seen[key]
+		kwargs = dict(
+			data_yaml=data_yaml, model=model, epochs=1, imgsz=imgsz, device=device, shard_dir=shard_dir,
+			project=f"runs/profile/{stem}", name=f"trial{len(trials)}", exist_ok=True,
+			fraction=fraction, val=False, plots=False, save=False, **config,
+		)
+		parent_conn, child_conn = ctx.Pipe(duplex=False)
+		proc = ctx.Process(target=_run_trial, args=(child_conn, kwargs))
+		proc.start()
+		child_conn.close()
+		try:
+			if parent_conn.poll(trial_timeout_s):
+				result = parent_conn.recv()
+			else:
+				result = {"ok": False, "error": "timeout"}
+		except EOFError:
+			# Child died without reporting, typically the OOM killer
+			result = {"ok": False, "error": f"trial process exited with code {proc.exitcode}"}
+		finally:
+			if proc.is_alive():
+				proc.terminate()
+			proc.join()
+
+		row: Dict[str, Any] = {"trial": len(trials), **config, **result}
+		if row.get("ok"):
+			row["fits_memory"] = budget <= 0 or (row.get("peak_rss_mb") or 0.0) <= budget
+		else:
+			row["fits_memory"] = False
+		trials.append(row)
+		seen[key] = row
+		print(
+			f"profile trial {row['trial']}: batch={config['batch']} workers={config['workers']} "
+			f"cache={config['cache']} threads={config['threads']} -> "
+			f"{row.get('images_per_sec', 0)} img/s, stall={row.get('stall_fraction')}, "
+			f"peak_rss={row.get('peak_rss_mb')} MB{'' if row['ok'] else ' FAILED: ' + str(row.get('error'))}"
+		)
+		return row
+
+	best_config = dict(base_config)
+	best_row: Optional[Dict[str, Any]] = None
+	for knob, values in (("batch", batches), ("workers", workers), ("cache", caches), ("threads", threads)):
+		for value in values or [best_config[knob]]:
+			config = dict(best_config, **{knob: value})
+			row = run(config)
+			if row.get("ok") and row["fits_memory"]:
+				if best_row is None or row["images_per_sec"] > best_row["images_per_sec"]:
+					best_row = row
+		if best_row is not None:
+			best_config = {k: best_row[k] for k in ("batch", "workers", "cache", "threads")}
+
+	result = ProfileResult(trials, best_config if best_row is not None else None, budget)
+	result.write(Path("runs/profile") / stem)
+	return result
@@ -0,0 +1,39 @@
+"""
+Process-level helpers shared by the training, bulk scoring and evaluation tools.
+"""
+import os
+import sys
+from typing import Dict, Optional
+
+
+def rss_mb() -> Dict[str, Optional[float]]:
+	"""Peak RSS of this process and of its largest (finished) child, in MB."""
+	try:
+		import resource
+		scale = 1.0 / (1024 * 1024) if sys.platform == "darwin" else 1.0 / 1024
+		main = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+		child = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+		return {"rss_main_mb": round(main, 1), "rss_worker_mb": round(child, 1)}
+	except Exception:
+		pass
+	try:
+		import psutil  # type: ignore
+		return {"rss_main_mb": round(psutil.Process().memory_info().rss / (1024 * 1024), 1), "rss_worker_mb": None}
+	except Exception:
+		return {"rss_main_mb": None, "rss_worker_mb": None}
+
+
+def limit_threads(threads: int) -> None:
+	"""Cap intra-op threads (BLAS, torch, OpenCV) so parallel processes do not oversubscribe the CPU."""
+	for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+		os.environ[var] = str(threads)
+	try:
+		import torch  # type: ignore
+		torch.set_num_threads(threads)
+	except Exception:
+		pass
+	try:
+		import cv2  # type: ignore
+		cv2.setNumThreads(threads)
+	except Exception:
+		pass
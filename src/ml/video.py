@@ -0,0 +1,299 @@
+"""
+Video / camera-stream ingestion with motion-gated frame sampling.
+
+A background thread decodes frames into a bounded queue. Each frame is reduced
+to a tiny grayscale thumbnail and compared with the thumbnail of the last frame
+that was sent to the model (mean absolute difference, 0-255). Only frames that
+changed by more than --threshold (or every --max_skip frames, as a refresh) are
+batched into the detector; the others reuse the detections of the frame they
+resemble. One event per decoded frame is emitted, in order.
+
+Example:
+  python src/ml/video.py --source belt.mp4 --model models/best.pt --out belt.jsonl
+  python src/ml/video.py --source 0 --threshold 4          # first camera
+"""
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+try:
+	import numpy as np
+	_HAS_NP = True
+except Exception:
+	np = None  # type: ignore
+	_HAS_NP = False
+
+try:
+	import cv2
+	_HAS_CV2 = True
+except Exception:
+	_HAS_CV2 = False
+
+try:
+	from .inference import detect_batch, load_model  # type: ignore
+except Exception:
+	try:
+		from src.ml.inference import detect_batch, load_model  # type: ignore
+	except Exception:
+		from inference import detect_batch, load_model  # type: ignore
+
+_END = object()
+
+FrameSource = Union[str, int, Iterable[Any]]
+
+
+class FrameReader:
+	"""
+	Decodes frames in a background thread. Iterating yields (index, timestamp_s, frame).
+	File sources apply backpressure; live sources (camera index, rtsp/http URL)
+	drop the oldest queued frame instead, so decoding never falls behind real time.
+	"""
+
+	def __init__(self, source: FrameSource, queue_size: int = 64, live: Optional[bool] = None):
+		self.source = source
+		if live is None:
+			live = isinstance(source, int) or (isinstance(source, str) and source.split(":", 1)[0].lower() in ("rtsp", "rtmp", "http", "https"))
+		self.live = live
+		self.dropped = 0
+		self.error: Optional[BaseException] = None
+		self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+		self._stop = threading.Event()
+		self._thread = threading.Thread(target=self._run, name="frame-reader", daemon=True)
+
+	def _frames(self) -> Iterator[Tuple[float, Any]]:
+		if isinstance(self.source, (str, int)):
+			if not _HAS_CV2:
+				raise RuntimeError("opencv-python not installed. Install with: pip install opencv-python")
+			cap = cv2.VideoCapture(self.source)
+			if not cap.isOpened():
+				raise RuntimeError(f"cannot open video source: {self.source}")
+			fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+			i = 0
+			try:
+				while not self._stop.is_set():
+					ok, frame = cap.read()
+					if not ok:
+						break
+					pos_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+					ts = pos_ms / 1000.0 if pos_ms else (i / fps if fps else time.time())
+					yield ts, frame
+					i += 1
+			finally:
+				cap.release()
+		else:
+			t0 = time.monotonic()
+			for frame in self.source:
+				if self._stop.is_set():
+					break
+				yield time.monotonic() - t0, frame
+
+	def _put(self, item: Any) -> None:
+		while not self._stop.is_set():
+			try:
+				self._queue.put(item, timeout=0.1)
+				return
+			except queue.Full:
+				if self.live and item is not _END:
+					try:
+						self._queue.get_nowait()
+						self.dropped += 1
+					except queue.Empty:
+						pass
+
+	def _run(self) -> None:
+		try:
+			for index, (ts, frame) in enumerate(self._frames()):
+				self._put((index, ts, frame))
+		except BaseException as e:
+			self.error = e
+		finally:
+			self._put(_END)
+
+	def start(self) -> "FrameReader":
+		self._thread.start()
+		return self
+
+	def stop(self) -> None:
+		self._stop.set()
+
+	def get(self, timeout: Optional[float] = None) -> Any:
+		"""Next (index, ts, frame), _END at the end; raises queue.Empty on timeout."""
+		return self._queue.get(timeout=timeout)
+
+
+class MotionGate:
+	"""Decides whether a frame differs enough from the last inferred frame."""
+
+	def __init__(self, threshold: float = 6.0, max_skip: int = 30, size: Tuple[int, int] = (64, 36)):
+		self.threshold = threshold
+		self.max_skip = max_skip
+		self.size = size
+		self._ref: Optional["np.ndarray"] = None
+		self._since = 0
+
+	def _signature(self, frame: "np.ndarray") -> "np.ndarray":
+		if _HAS_CV2:
+			gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+			return cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA).astype(np.int16)
+		gray = frame.mean(axis=2) if frame.ndim == 3 else frame
+		h, w = gray.shape[:2]
+		ys = np.linspace(0, h - 1, self.size[1]).astype(np.intp)
+		xs = np.linspace(0, w - 1, self.size[0]).astype(np.intp)
+		return gray[ys[:, None], xs[None, :]].astype(np.int16)
+
+	def update(self, frame: "np.ndarray") -> Tuple[bool, float]:
+		"""Returns (send_to_model, motion score). Accepted frames become the new reference."""
+		sig = self._signature(frame)
+		if self._ref is None or sig.shape != self._ref.shape:
+			self._ref, self._since = sig, 0
+			return True, 255.0
+		score = float(np.abs(sig - self._ref).mean())
+		self._since += 1
+		if score > self.threshold or (self.max_skip and self._since >= self.max_skip):
+			self._ref, self._since = sig, 0
+			return True, score
+		return False, score
+
+
+def process_stream(
+	source: FrameSource,
+	model_path: Optional[str] = None,
+	batch_size: int = 8,
+	threshold: float = 6.0,
+	max_skip: int = 30,
+	max_batch_wait_s: float = 0.1,
+	queue_size: int = 64,
+	stats: Optional[Dict[str, Any]] = None,
+	mock: bool = False,
+) -> Iterator[Dict[str, Any]]:
+	"""
+	Yield one event per frame:
+	{"frame_index", "timestamp", "inferred", "source_frame", "motion",
+	 "detections", "width", "height"}
+	"source_frame" is the inferred frame whose detections are reported. If its
+	batch failed, the event carries "error" and empty detections instead.
+	Raises RuntimeError up front if the model cannot be loaded (unless mock=True,
+	which reports the fixed mock box for every inferred frame).
+	Pending frames are flushed when batch_size changed frames are queued or no
+	new frame arrived within max_batch_wait_s (keeps latency low on live feeds).
+	"""
+	if not _HAS_NP:
+		raise RuntimeError("numpy not installed. Install with: pip install numpy")
+	model_path = model_path or os.getenv("MODEL_PATH")
+	if not mock and (not model_path or load_model(model_path) is None):
+		raise RuntimeError(f"Cannot load model {model_path!r} (missing file or ultralytics not installed); pass mock=True for mock output")
+	stats = stats if stats is not None else {}
+	stats.update(frames=0, inferred=0, batches=0, failed=0, dropped=0)
+	reader = FrameReader(source, queue_size=queue_size).start()
+	gate = MotionGate(threshold=threshold, max_skip=max_skip)
+	pending: List[Dict[str, Any]] = []
+	frames: List[Any] = []
+	last: Dict[str, Any] = {"source_frame": None, "result": {"detections": [], "width": None, "height": None}}
+	t0 = time.perf_counter()
+
+	def flush() -> Iterator[Dict[str, Any]]:
+		results = detect_batch(frames, model_path, mock=mock) if frames else []
+		if frames:
+			stats["batches"] += 1
+			stats["inferred"] += len(frames)
+			if results and "error" in results[0]:
+				stats["failed"] += len(frames)
+				print(f"batch of {len(frames)} frames failed: {results[0]['error']}", file=sys.stderr)
+		k = 0
+		for ev in pending:
+			if ev["inferred"]:
+				last["source_frame"] = ev["frame_index"]
+				last["result"] = results[k]
+				k += 1
+			res = last["result"]
+			ev.update(
+				source_frame=last["source_frame"],
+				detections=res.get("detections", []),
+				width=res.get("width"),
+				height=res.get("height"),
+			)
+			if "error" in res:
+				ev["error"] = res["error"]
+			yield ev
+		pending.clear()
+		frames.clear()
+
+	try:
+		while True:
+			try:
+				item = reader.get(timeout=max_batch_wait_s if frames else None)
+			except queue.Empty:
+				yield from flush()
+				continue
+			if item is _END:
+				yield from flush()
+				break
+			index, ts, frame = item
+			stats["frames"] += 1
+			send, score = gate.update(frame)
+			pending.append({
+				"frame_index": index,
+				"timestamp": round(float(ts), 3),
+				"inferred": send,
+				"motion": round(score, 2),
+			})
+			if send:
+				frames.append(frame)
+				if len(frames) >= batch_size:
+					yield from flush()
+			elif not frames:
+				# Nothing awaiting inference: the reused detections are already known
+				yield from flush()
+		if reader.error is not None:
+			raise reader.error
+	finally:
+		reader.stop()
+		stats["dropped"] = reader.dropped
+		elapsed = time.perf_counter() - t0
+		stats["elapsed_s"] = round(elapsed, 2)
+		stats["fps"] = round(stats["frames"] / elapsed, 2) if elapsed > 0 else 0.0
+		stats["skip_rate"] = round(1 - stats["inferred"] / stats["frames"], 4) if stats["frames"] else 0.0
+
+
+def main():
+	import argparse
+	parser = argparse.ArgumentParser(description="Run motion-gated batched detection on a video file or camera stream.")
+	parser.add_argument("--source", required=True, help="Video file, stream URL, or camera index (e.g. 0)")
+	parser.add_argument("--model", default=None, help="Model path (default: MODEL_PATH env)")
+	parser.add_argument("--mock", action="store_true", help="Report the fixed mock box instead of running a model")
+	parser.add_argument("--out", default="-", help="Output JSONL path ('-' for stdout)")
+	parser.add_argument("--batch", type=int, default=8, help="Changed frames per model call")
+	parser.add_argument("--threshold", type=float, default=6.0, help="Mean abs thumbnail difference (0-255) that counts as change")
+	parser.add_argument("--max_skip", type=int, default=30, help="Force inference after this many skipped frames (0 = never)")
+	parser.add_argument("--max_wait", type=float, default=0.1, help="Seconds to wait for a fuller batch before flushing")
+	args = parser.parse_args()
+
+	source: FrameSource = int(args.source) if args.source.isdigit() else args.source
+	stats: Dict[str, Any] = {}
+	out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+	try:
+		for event in process_stream(
+			source,
+			model_path=args.model,
+			batch_size=args.batch,
+			threshold=args.threshold,
+			max_skip=args.max_skip,
+			max_batch_wait_s=args.max_wait,
+			stats=stats,
+			mock=args.mock,
+		):
+			out.write(json.dumps(event, separators=(",", ":")) + "\n")
+	except KeyboardInterrupt:
+		pass
+	finally:
+		if out is not sys.stdout:
+			out.close()
+		print(json.dumps(stats, indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,150 @@
+"""
+Admission control and load shedding for /analyze.
+
+At most max_concurrent inferences run at once; up to max_queue requests wait
+for a slot. A request is turned away early (before its upload is read) when:
+- its client's token bucket is empty                      -> 429 rate_limited
+- the wait queue is full                                  -> 503 queue_full
+- the estimated queue wait exceeds the latency budget     -> 503 overloaded
+The wait estimate is (queued + 1) / max_concurrent * EWMA(service time).
+A request that was admitted but still cannot get a slot within the budget
+gets 503 queue_timeout. Every decision is counted in stats().
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+EWMA_ALPHA = 0.2
+
+
+class Rejected(Exception):
+	def __init__(self, status: int, reason: str, retry_after: int):
+		super().__init__(reason)
+		self.status = status
+		self.reason = reason
+		self.retry_after = max(1, int(retry_after))
+
+
+class TokenBucket:
+	def __init__(self, rate_per_s: float, burst: int):
+		self.rate = rate_per_s
+		self.capacity = float(max(1, burst))
+		self.tokens = self.capacity
+		self.updated = time.monotonic()
+
+	def take(self) -> float:
+		"""Consume one token; returns 0 on success, else seconds until one is available."""
+		now = time.monotonic()
+		self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+		self.updated = now
+		if self.tokens >= 1.0:
+			self.tokens -= 1.0
+			return 0.0
+		return (1.0 - self.tokens) / self.rate
+
+
+class AdmissionController:
+	def __init__(
+		self,
+		max_concurrent: int,
+		max_queue: int,
+		latency_budget_s: float,
+		rate_per_min: int = 0,
+		burst: int = 0,
+		max_clients: int = 10000,
+	):
+		self.max_concurrent = max(1, max_concurrent)
+		self.max_queue = max(0, max_queue)
+		self.latency_budget_s = latency_budget_s
+		self.rate_per_s = rate_per_min / 60.0
+		self.burst = burst or max(1, rate_per_min // 6)
+		self.max_clients = max_clients
+		self._cond = threading.Condition()
+		self._active = 0
+		self._waiting = 0
+		self._ewma_s: Optional[float] = None
+		self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+		self._counters: Dict[str, int] = {
+			"admitted": 0,
+			"completed": 0,
+			"rejected_rate_limited": 0,
+			"rejected_queue_full": 0,
+			"rejected_overloaded": 0,
+			"rejected_queue_timeout": 0,
+		}
+
+	def _reject(self, status: int, reason: str, retry_after: float) -> Rejected:
+		self._counters[f"rejected_{reason}"] += 1
+		return Rejected(status, reason, math.ceil(retry_after))
+
+	def _estimated_wait_s(self) -> float:
+		if self._ewma_s is None:
+			return 0.0
+		return (self._waiting + 1) / self.max_concurrent * self._ewma_s
+
+	def check(self, client_key: Optional[str] = None) -> None:
+		"""
+		Cheap early decision, made before the upload is read. Raises Rejected.
+		Consumes a token from the client's bucket when rate limiting is enabled.
+		"""
+		with self._cond:
+			if self.rate_per_s > 0 and client_key:
+				bucket = self._buckets.get(client_key)
+				if bucket is None:
+					bucket = self._buckets[client_key] = TokenBucket(self.rate_per_s, self.burst)
+					if len(self._buckets) > self.max_clients:
+						self._buckets.popitem(last=False)
+				else:
+					self._buckets.move_to_end(client_key)
+				wait = bucket.take()
+				if wait > 0:
+					raise self._reject(429, "rate_limited", wait)
+			if self._active < self.max_concurrent:
+				return
+			if self._waiting >= self.max_queue:
+				raise self._reject(503, "queue_full", self._ewma_s or 1.0)
+			est = self._estimated_wait_s()
+			if est > self.latency_budget_s:
+				raise self._reject(503, "overloaded", est)
+
+	def acquire(self) -> float:
+		"""Block until an inference slot is free; returns the start time. Raises Rejected."""
+		with self._cond:
+			if self._active >= self.max_concurrent:
+				if self._waiting >= self.max_queue:
+					raise self._reject(503, "queue_full", self._ewma_s or 1.0)
+				self._waiting += 1
+				deadline = time.monotonic() + self.latency_budget_s
+				try:
+					while self._active >= self.max_concurrent:
+						remaining = deadline - time.monotonic()
+						if remaining <= 0:
+							raise self._reject(503, "queue_timeout", self._estimated_wait_s() or 1.0)
+						self._cond.wait(remaining)
+				finally:
+					self._waiting -= 1
+			self._active += 1
+			self._counters["admitted"] += 1
+			return time.monotonic()
+
+	def release(self, started: float) -> None:
+		with self._cond:
+			self._active -= 1
+			self._counters["completed"] += 1
+			service = time.monotonic() - started
+			self._ewma_s = service if self._ewma_s is None else (1 - EWMA_ALPHA) * self._ewma_s + EWMA_ALPHA * service
+			self._cond.notify()
+
+	def stats(self) -> Dict[str, object]:
+		with self._cond:
+			return {
+				**self._counters,
+				"active": self._active,
+				"waiting": self._waiting,
+				"max_concurrent": self.max_concurrent,
+				"max_queue": self.max_queue,
+				"ewma_service_ms": round(self._ewma_s * 1000.0, 1) if self._ewma_s is not None else None,
+				"estimated_wait_ms": round(self._estimated_wait_s() * 1000.0, 1),
+			}
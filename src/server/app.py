@@ -1,7 +1,8 @@
+import atexit
 import os
 import uuid
 from pathlib import Path
-from typing import Tuple
+from typing import Optional, Tuple
 
 from flask import Flask, request, jsonify, url_for, send_file, Response
 from flask_cors import CORS
@@ -10,29 +11,41 @@ from werkzeug.utils import secure_filename
 # Robust imports: try package-relative first, then absolute fallbacks
 try:
 	from .config import AppConfig  # type: ignore
+	from . import overlays  # type: ignore
+	from .encoding import encode_response  # type: ignore
+	from .admission import AdmissionController, Rejected  # type: ignore
+	from .profiling import PROFILE_ID_HEADER, ProfileStore, RequestProfiler, admin_authorized  # type: ignore
+	from .history import HistoryStore, parse_filters, parse_group_by, parse_location  # type: ignore
 except Exception:
 	try:
 		from src.server.config import AppConfig  # type: ignore
+		from src.server import overlays  # type: ignore
+		from src.server.encoding import encode_response  # type: ignore
+		from src.server.admission import AdmissionController, Rejected  # type: ignore
+		from src.server.profiling import PROFILE_ID_HEADER, ProfileStore, RequestProfiler, admin_authorized  # type: ignore
+		from src.server.history import HistoryStore, parse_filters, parse_group_by, parse_location  # type: ignore
 	except Exception:
 		from config import AppConfig  # type: ignore
+		import overlays  # type: ignore
+		from encoding import encode_response  # type: ignore
+		from admission import AdmissionController, Rejected  # type: ignore
+		from profiling import PROFILE_ID_HEADER, ProfileStore, RequestProfiler, admin_authorized  # type: ignore
+		from history import HistoryStore, parse_filters, parse_group_by, parse_location  # type: ignore
 
 # Inference import: prefer absolute from src.ml, fallback to relative
 try:
-	from src.ml.inference import detect_image  # type: ignore
+	from src.ml.inference import cascade_detect, cascade_stats, detect_image, mock_detect, phase  # type: ignore
+	from src.ml import synthetic  # type: ignore
 except Exception:
 	try:
-		from ..ml.inference import detect_image  # type: ignore
+		from ..ml.inference import cascade_detect, cascade_stats, detect_image, mock_detect, phase  # type: ignore
+		from ..ml import synthetic  # type: ignore
 	except Exception:
 		# Last resort: modify sys.path to include project root
 		import sys
 		sys.path.append(str(Path(__file__).resolve().parents[2]))
-		from src.ml.inference import detect_image  # type: ignore
-
-try:
-	from PIL import Image, ImageDraw
-except Exception:
-	Image = None
-	ImageDraw = None
+		from src.ml.inference import cascade_detect, cascade_stats, detect_image, mock_detect, phase  # type: ignore
+		from src.ml import synthetic  # type: ignore
 
 # Simple in-memory cache for demo purposes
 ANALYSIS_CACHE = {}
@@ -52,6 +65,8 @@ def _format_text_report(analysis_entry: dict) -> str:
 	lines.append("===========================")
 	lines.append(f"Image size: {w}x{h}")
 	lines.append(f"Detections: {len(dets)}")
+	if res.get("stage"):
+		lines.append(f"Decided by: {res['stage']}")
 	lines.append("")
 	for i, d in enumerate(dets, start=1):
 		label = d.get("label", "?")
@@ -61,7 +76,98 @@ def _format_text_report(analysis_entry: dict) -> str:
 	return "\n".join(lines) + "\n"
 
 
-def create_app() -> Flask:
+def _negotiated_response(payload: dict, config: AppConfig, status: int = 200, packed: bool = False) -> Tuple[Response, int]:
+	"""
+	JSON by default; MessagePack/compression when the client asks for them, and
+	the packed binary layout only for detection payloads (packed=True).
+	"""
+	body, headers = encode_response(
+		payload,
+		request.headers.get("Accept"),
+		request.headers.get("Accept-Encoding"),
+		config.COMPRESS_MIN_BYTES,
+		packed=packed,
+	)
+	return Response(body, status=status, headers=headers), status
+
+
+def _run_model(config: AppConfig, image_path: str, overlay_path: str) -> dict:
+	"""Real inference: the classifier/detector cascade when enabled, else the detector."""
+	if getattr(config, "CASCADE_MODE", False):
+		return cascade_detect(
+			image_path,
+			overlay_path,
+			classifier_path=config.CLASSIFIER_PATH,
+			accept_labels=config.CASCADE_ACCEPT_LABELS,
+			accept_threshold=config.CASCADE_ACCEPT_THRESHOLD,
+			model_path=config.MODEL_PATH,
+			classifier_imgsz=config.CASCADE_IMGSZ,
+		)
+	return detect_image(image_path, overlay_path, model_path=config.MODEL_PATH)
+
+
+def _run_detection(config: AppConfig, image_path: str, overlay_path: str) -> dict:
+	"""Dispatch to the configured INFERENCE_BACKEND (model, mock or synthetic)."""
+	backend = getattr(config, "INFERENCE_BACKEND", "model")
+	if backend == "synthetic":
+		return synthetic.get_backend(
+			latency_ms=config.SYNTHETIC_LATENCY_MS,
+			distribution=config.SYNTHETIC_DISTRIBUTION,
+			jitter=config.SYNTHETIC_JITTER,
+			cpu_fraction=config.SYNTHETIC_CPU_FRACTION,
+			boxes=config.SYNTHETIC_BOXES,
+			memory_mb=config.SYNTHETIC_MEMORY_MB,
+			seed=config.SYNTHETIC_SEED,
+		).detect(str(image_path), str(overlay_path))
+	if backend == "mock":
+		return mock_detect(str(image_path), str(overlay_path))
+	return _run_model(config, str(image_path), str(overlay_path))
+
+
+def _open_history(config: AppConfig) -> Optional[HistoryStore]:
+	if not config.HISTORY_ENABLED:
+		return None
+	store = HistoryStore(
+		Path(config.HISTORY_DB),
+		batch_size=config.HISTORY_BATCH_SIZE,
+		flush_interval_s=config.HISTORY_FLUSH_MS / 1000.0,
+		queue_max=config.HISTORY_QUEUE_MAX,
+		page_max=config.HISTORY_PAGE_MAX,
+	)
+	# Commit whatever is still queued when the process exits
+	atexit.register(store.close)
+	return store
+
+
+def _open_admission(config: AppConfig) -> Optional[AdmissionController]:
+	if not config.ADMISSION_ENABLED:
+		return None
+	return AdmissionController(
+		max_concurrent=config.ADMISSION_MAX_CONCURRENT,
+		max_queue=config.ADMISSION_MAX_QUEUE,
+		latency_budget_s=config.ADMISSION_LATENCY_BUDGET_MS / 1000.0,
+		rate_per_min=config.RATE_LIMIT_PER_MIN,
+		burst=config.RATE_LIMIT_BURST,
+	)
+
+
+def _server_stats(config: AppConfig, admission: Optional[AdmissionController], history: Optional[HistoryStore]) -> dict:
+	"""Body of GET /stats, shared with the ASGI app."""
+	return {
+		"admission": admission.stats() if admission else None,
+		"history": history.stats() if history else None,
+		"cascade": cascade_stats() if config.CASCADE_MODE else None,
+	}
+
+
+def _rejection_response(rej: "Rejected") -> Tuple[Response, int]:
+	response = jsonify({"ok": False, "error": rej.reason})
+	response.headers["Retry-After"] = str(rej.retry_after)
+	return response, rej.status
+
+
+def create_app(overlays_dir: Optional[Path] = None) -> Flask:
+	"""overlays_dir defaults to static/overlays; tests point it at a scratch directory."""
 	config = AppConfig()
 
 	app = Flask(
@@ -72,25 +178,66 @@ def create_app() -> Flask:
 	CORS(app)
 
 	# Directories
-	overlays_dir = Path(app.static_folder) / "overlays"
+	overlays_dir = Path(overlays_dir) if overlays_dir else Path(app.static_folder) / "overlays"
 	overlays_dir.mkdir(parents=True, exist_ok=True)
 	tmp_dir = Path(getattr(config, "UPLOAD_DIR", "tmp"))
 	tmp_dir.mkdir(parents=True, exist_ok=True)
 
+	admission = _open_admission(config)
+	history = _open_history(config)
+
+	profiler = None
+	if config.ADMIN_TOKEN or config.PROFILE_SAMPLE_RATE > 0:
+		profiler = RequestProfiler(
+			ProfileStore(Path(config.PROFILE_DIR), config.PROFILE_MAX_FILES),
+			sample_rate=config.PROFILE_SAMPLE_RATE,
+			admin_token=config.ADMIN_TOKEN,
+			trace_memory=config.PROFILE_TRACE_MEMORY,
+			top_allocations=config.PROFILE_TOP_ALLOCATIONS,
+		)
+
 	@app.get("/health")
 	def health() -> Tuple[str, int]:
 		return jsonify({"status": "ok"}), 200
 
+	@app.get("/stats")
+	def stats() -> Tuple[str, int]:
+		return jsonify(_server_stats(config, admission, history)), 200
+
 	@app.post("/analyze")
-	def analyze() -> Tuple[str, int]:
+	def analyze() -> Response:
+		request_id = uuid.uuid4().hex
+		if profiler is None:
+			return app.make_response(_analyze(request_id))
+		with profiler.track():
+			reason = profiler.wants(request.headers)
+			if reason is None:
+				return app.make_response(_analyze(request_id))
+			with profiler.session(request_id, reason) as prof:
+				response = app.make_response(_analyze(request_id))
+		if prof.get("name"):
+			response.headers[PROFILE_ID_HEADER] = prof["name"]
+		return response
+
+	def _analyze(request_id: str) -> Tuple[Response, int]:
 		# Size pre-check using Content-Length if provided
 		content_length = request.content_length or 0
 		if content_length and content_length > config.MAX_IMAGE_SIZE:
 			return jsonify({"error": "uploaded file too large"}), 413
 
-		if "image" not in request.files:
+		# Shed load before reading the upload
+		if admission is not None:
+			try:
+				admission.check(request.headers.get("X-API-Key") or request.remote_addr)
+			except Rejected as rej:
+				return _rejection_response(rej)
+
+		# Flask reads and parses the multipart body on first access to request.files
+		with phase("upload"):
+			files = request.files
+		if "image" not in files:
 			return jsonify({"error": "missing multipart field 'image'"}), 400
-		file = request.files["image"]
+		file = files["image"]
 		if not file or file.filename == "":
 			return jsonify({"error": "empty filename"}), 400
 
@@ -98,9 +245,15 @@ def create_app() -> Flask:
 		if not _allowed_file(filename, set(config.ALLOWED_EXTENSIONS)):
 			return jsonify({"error": "unsupported file type"}), 415
 
+		try:
+			region, lat, lon = parse_location(request.form)
+		except ValueError as e:
+			return jsonify({"error": str(e)}), 400
+
 		# Save to temporary path
 		tmp_path = tmp_dir / f"upload_{uuid.uuid4().hex}_{filename}"
-		file.save(tmp_path)
+		with phase("save_upload"):
+			file.save(tmp_path)
 
 		# Post-save size enforcement for clients not setting Content-Length
 		try:
@@ -113,53 +266,126 @@ def create_app() -> Flask:
 		except Exception:
 			pass
 
-		# Prepare overlay path
-		overlay_name = f"{uuid.uuid4().hex}.png"
-		overlay_path = overlays_dir / overlay_name
-		request_id = uuid.uuid4().hex
+		# Overlay is written to a temp name, then renamed to its content hash
+		overlay_path = overlays.temp_overlay_path(overlays_dir)
+
+		# Inference slot is only taken once the upload is on disk
+		started = None
+		if admission is not None:
+			try:
+				started = admission.acquire()
+			except Rejected as rej:
+				tmp_path.unlink(missing_ok=True)
+				return _rejection_response(rej)
 
 		try:
-			if getattr(config, "MOCK_MODE", False):
-				if Image is None:
-					return jsonify({"error": "Pillow not installed for mock overlay"}), 500
-				# Deterministic mock response and overlay
-				im = Image.open(tmp_path).convert("RGBA")
-				draw = ImageDraw.Draw(im, "RGBA")
-				w, h = im.size
-				box = [int(0.1 * w), int(0.1 * h), int(0.9 * w), int(0.9 * h)]
-				draw.rectangle(box, outline=(0, 200, 0, 255), width=4)
-				draw.rectangle(box, fill=(0, 200, 0, 40))
-				im.save(overlay_path, format="PNG")
-
-				result = {
-					"detections": [
-						{"label": "healthy_crop", "confidence": 0.97, "bbox": box}
-					],
-					"width": w,
-					"height": h,
-				}
-			else:
-				result = detect_image(str(tmp_path), str(overlay_path))
+			with phase("inference"):
+				result = _run_detection(config, str(tmp_path), str(overlay_path))
 
 			# Build URL for overlay
-			overlay_url = url_for("static", filename=f"overlays/{overlay_name}", _external=False)
-			result["overlay_url"] = overlay_url
+			with phase("finalize_overlay"):
+				overlay_name = overlays.finalize_overlay(overlay_path, overlays_dir)
+			if overlay_name:
+				overlay_path = overlays_dir / overlay_name
+				result["overlay_url"] = url_for("overlay_file", name=overlay_name, _external=False)
+			else:
+				result["overlay_url"] = None
 
 			# Cache for report generation
 			ANALYSIS_CACHE[request_id] = {
 				"result": result,
 				"overlay_path": str(overlay_path),
 			}
+			if history is not None:
+				history.record(request_id, result, region=region, lat=lat, lon=lon, backend=config.INFERENCE_BACKEND)
 
-			return jsonify({"ok": True, "request_id": request_id, "result": result}), 200
+			with phase("encode"):
+				return _negotiated_response({"ok": True, "request_id": request_id, "result": result}, config, packed=True)
 		except Exception as e:
+			if overlay_path.name.startswith(".tmp_"):
+				overlay_path.unlink(missing_ok=True)
 			return jsonify({"ok": False, "error": str(e)}), 500
 		finally:
+			if started is not None:
+				admission.release(started)
 			try:
 				tmp_path.unlink(missing_ok=True)
 			except Exception:
 				pass
 
+	@app.get("/overlays/<name>")
+	def overlay_file(name: str) -> Response:
+		path = overlays_dir / name
+		if not overlays.is_overlay_name(name) or not path.is_file():
+			return Response("not found\n", status=404, mimetype="text/plain; charset=utf-8")
+		headers = overlays.cache_headers(name, config.OVERLAY_MAX_AGE)
+		if overlays.etag_matches(request.headers.get("If-None-Match"), overlays.overlay_etag(name)):
+			return Response(status=304, headers=headers)
+		offload = overlays.offload_headers(config.OVERLAY_SENDFILE, name, path, config.OVERLAY_ACCEL_PREFIX)
+		if offload:
+			# Front proxy streams the file; Python only returns headers
+			return Response(status=200, mimetype="image/png", headers={**headers, **offload})
+		response = send_file(path, mimetype="image/png", conditional=True, etag=False, max_age=config.OVERLAY_MAX_AGE)
+		response.headers.update(headers)
+		return response
+
+	def _admin_denied() -> Optional[Tuple[Response, int]]:
+		if not config.ADMIN_TOKEN:
+			return jsonify({"error": "not found"}), 404
+		if not admin_authorized(request.headers, config.ADMIN_TOKEN):
+			return jsonify({"error": "forbidden"}), 403
+		return None
+
+	@app.get("/admin/profiles")
+	def list_profiles() -> Tuple[Response, int]:
+		denied = _admin_denied()
+		if denied:
+			return denied
+		return jsonify({"profiles": profiler.store.list() if profiler else []}), 200
+
+	@app.get("/admin/profiles/<name>")
+	def get_profile(name: str) -> Response:
+		denied = _admin_denied()
+		if denied:
+			return denied
+		path = profiler.store.path(name) if profiler else None
+		if path is None:
+			return jsonify({"error": "not found"}), 404
+		mimetype = "application/json" if name.endswith(".json") else "application/octet-stream"
+		return send_file(path, mimetype=mimetype, as_attachment=name.endswith(".prof"), download_name=name)
+
+	def _history_page(query) -> Tuple[Response, int]:
+		if history is None:
+			return jsonify({"error": "history disabled"}), 404
+		try:
+			filters = parse_filters(request.args)
+		except ValueError as e:
+			return jsonify({"error": str(e)}), 400
+		return _negotiated_response(query(filters), config)
+
+	@app.get("/history/detections")
+	def history_detections() -> Tuple[Response, int]:
+		return _history_page(history.query_detections if history else None)
+
+	@app.get("/history/analyses")
+	def history_analyses() -> Tuple[Response, int]:
+		return _history_page(history.query_analyses if history else None)
+
+	@app.get("/history/stats.csv")
+	def history_stats() -> Response:
+		if history is None:
+			return jsonify({"error": "history disabled"}), 404
+		try:
+			filters = parse_filters(request.args)
+			group_by = parse_group_by(request.args.get("group_by"))
+		except ValueError as e:
+			return jsonify({"error": str(e)}), 400
+		return Response(
+			history.iter_label_stats_csv(filters, group_by),
+			mimetype="text/csv",
+			headers={"Content-Disposition": 'attachment; filename="label_stats.csv"'},
+		)
+
 	@app.get("/report_text")
 	def report_text() -> Response:
 		request_id = request.args.get("request_id")
@@ -0,0 +1,612 @@
+"""
+Asyncio (ASGI) variant of the AgriVision API.
+
+Exposes the same contract as the Flask app in app.py (/health, /stats, /analyze
+with the same admission control, /report_text, /history/* and content-hashed
+overlay files under /overlays/), but:
+- multipart uploads are parsed incrementally as body chunks arrive, and
+  MAX_IMAGE_SIZE is enforced mid-stream instead of after the whole body is buffered;
+- CPU-bound inference runs on a bounded thread pool (INFERENCE_WORKERS), so
+  slow clients only hold a cheap coroutine, never an inference slot.
+
+Run with any ASGI server, e.g.:
+  uvicorn src.server.asgi:create_asgi_app --factory --host 0.0.0.0 --port 5000
+or directly:
+  python src/server/asgi.py
+"""
+import asyncio
+import email.message
+import email.utils
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from werkzeug.utils import secure_filename
+
+# Robust imports: try package-relative first, then absolute fallbacks
+try:
+	from .config import AppConfig  # type: ignore
+	from . import overlays  # type: ignore
+	from .encoding import encode_response  # type: ignore
+	from .app import ANALYSIS_CACHE, _allowed_file, _format_text_report, _open_admission, _open_history, _run_detection, _server_stats  # type: ignore
+	from .history import parse_filters, parse_group_by, parse_location  # type: ignore
+	from .admission import Rejected  # type: ignore
+except Exception:
+	try:
+		from src.server.config import AppConfig  # type: ignore
+		from src.server import overlays  # type: ignore
+		from src.server.encoding import encode_response  # type: ignore
+		from src.server.app import ANALYSIS_CACHE, _allowed_file, _format_text_report, _open_admission, _open_history, _run_detection, _server_stats  # type: ignore
+		from src.server.history import parse_filters, parse_group_by, parse_location  # type: ignore
+		from src.server.admission import Rejected  # type: ignore
+	except Exception:
+		import sys
+		sys.path.append(str(Path(__file__).resolve().parents[2]))
+		from src.server.config import AppConfig  # type: ignore
+		from src.server import overlays  # type: ignore
+		from src.server.encoding import encode_response  # type: ignore
+		from src.server.app import ANALYSIS_CACHE, _allowed_file, _format_text_report, _open_admission, _open_history, _run_detection, _server_stats  # type: ignore
+		from src.server.history import parse_filters, parse_group_by, parse_location  # type: ignore
+		from src.server.admission import Rejected  # type: ignore
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# Non-file form fields are tiny; anything beyond this is rejected
+MAX_FIELD_SIZE = 64 * 1024
+MAX_PART_HEADERS_SIZE = 16 * 1024
+# Allowance on top of MAX_IMAGE_SIZE for boundaries, part headers and small fields
+MAX_BODY_OVERHEAD = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+	pass
+
+
+class MultipartError(Exception):
+	pass
+
+
+class MultipartStreamParser:
+	"""
+	Incremental multipart/form-data parser.
+
+	Feed raw body chunks with feed(); callbacks are invoked as parts are found:
+	- on_part_begin(headers: dict) -> None
+	- on_part_data(data: bytes) -> None
+	- on_part_end() -> None
+	Only a small tail of the stream (boundary length) is kept in memory.
+	"""
+
+	_PREAMBLE, _AFTER_BOUNDARY, _HEADERS, _BODY, _DONE = range(5)
+
+	def __init__(
+		self,
+		boundary: bytes,
+		on_part_begin: Callable[[Dict[str, str]], None],
+		on_part_data: Callable[[bytes], None],
+		on_part_end: Callable[[], None],
+	):
+		if not boundary or len(boundary) > 200:
+			raise MultipartError("invalid multipart boundary")
+		# The first boundary may appear without a leading CRLF; prefixing the
+		# buffer with one lets a single delimiter pattern match every boundary.
+		self._buf = bytearray(b"\r\n")
+		self._delim = b"\r\n--" + boundary
+		self._state = self._PREAMBLE
+		self._on_begin = on_part_begin
+		self._on_data = on_part_data
+		self._on_end = on_part_end
+
+	@property
+	def done(self) -> bool:
+		return self._state == self._DONE
+
+	def feed(self, data: bytes) -> None:
+		if self._state == self._DONE:
+			return
+		self._buf += data
+		while True:
+			if self._state == self._PREAMBLE:
+				idx = self._buf.find(self._delim)
+				if idx < 0:
+					# Discard preamble but keep a possible partial delimiter
+					keep = len(self._delim) - 1
+					if len(self._buf) > keep:
+						del self._buf[:-keep]
+					return
+				del self._buf[:idx + len(self._delim)]
+				self._state = self._AFTER_BOUNDARY
+			elif self._state == self._AFTER_BOUNDARY:
+				if len(self._buf) < 2:
+					return
+				if self._buf[:2] == b"--":
+					self._state = self._DONE
+					self._buf.clear()
+					return
+				eol = self._buf.find(b"\r\n")
+				if eol < 0:
+					if len(self._buf) > 256:
+						raise MultipartError("malformed boundary line")
+					return
+				# Allow transport padding (linear whitespace) after the boundary
+				if self._buf[:eol].strip(b" \t"):
+					raise MultipartError("malformed boundary line")
+				del self._buf[:eol + 2]
+				self._state = self._HEADERS
+			elif self._state == self._HEADERS:
+				end = self._buf.find(b"\r\n\r\n")
+				if end < 0:
+					if len(self._buf) > MAX_PART_HEADERS_SIZE:
+						raise MultipartError("part headers too large")
+					return
+				raw = bytes(self._buf[:end]).decode("latin-1")
+				del self._buf[:end + 4]
+				headers: Dict[str, str] = {}
+				for line in raw.split("\r\n"):
+					if ":" in line:
+						k, v = line.split(":", 1)
+						headers[k.strip().lower()] = v.strip()
+				self._on_begin(headers)
+				self._state = self._BODY
+			elif self._state == self._BODY:
+				idx = self._buf.find(self._delim)
+				if idx < 0:
+					keep = len(self._delim) - 1
+					if len(self._buf) > keep:
+						self._on_data(bytes(self._buf[:-keep]))
+						del self._buf[:-keep]
+					return
+				if idx:
+					self._on_data(bytes(self._buf[:idx]))
+				del self._buf[:idx + len(self._delim)]
+				self._on_end()
+				self._state = self._AFTER_BOUNDARY
+			else:
+				return
+
+	def close(self) -> None:
+		if self._state != self._DONE:
+			raise MultipartError("unexpected end of multipart body")
+
+
+def _header_params(value: str, header: str) -> Tuple[str, Dict[str, str]]:
+	"""Parse e.g. 'multipart/form-data; boundary=xyz' into (value, params)."""
+	msg = email.message.Message()
+	msg[header] = value
+	params = msg.get_params(header=header) or []
+	main = params[0][0].lower() if params else ""
+	return main, {k.lower(): email.utils.collapse_rfc2231_value(v) for k, v in params[1:]}
+
+
+class _UploadSink:
+	"""Collects the 'image' part to a temp file, enforcing the size limit while streaming."""
+
+	def __init__(self, tmp_dir: Path, max_size: int):
+		self.tmp_dir = tmp_dir
+		self.max_size = max_size
+		self.filename: Optional[str] = None
+		self.path: Optional[Path] = None
+		self.size = 0
+		self.fields: Dict[str, str] = {}
+		self._fh = None
+		self._field_name: Optional[str] = None
+		self._field_buf = bytearray()
+
+	def on_part_begin(self, headers: Dict[str, str]) -> None:
+		_, params = _header_params(headers.get("content-disposition", ""), "content-disposition")
+		name = params.get("name")
+		if name == "image" and "filename" in params and self.path is None:
+			self.filename = params.get("filename") or ""
+			safe = secure_filename(self.filename) or "upload"
+			self.path = self.tmp_dir / f"upload_{uuid.uuid4().hex}_{safe}"
+			self._fh = self.path.open("wb")
+			self._field_name = None
+		else:
+			self._field_name = name if "filename" not in params else None
+			self._field_buf.clear()
+
+	def on_part_data(self, data: bytes) -> None:
+		if self._fh is not None:
+			self.size += len(data)
+			if self.size > self.max_size:
+				raise UploadTooLarge()
+			# Local disk writes of a chunk are fast; keeping them on the loop
+			# avoids contending with inference for executor threads.
+			self._fh.write(data)
+		elif self._field_name is not None:
+			self._field_buf += data
+			if len(self._field_buf) > MAX_FIELD_SIZE:
+				raise MultipartError("form field too large")
+
+	def on_part_end(self) -> None:
+		if self._fh is not None:
+			self._fh.close()
+			self._fh = None
+		elif self._field_name is not None:
+			self.fields[self._field_name] = self._field_buf.decode("utf-8", "replace")
+			self._field_name = None
+
+	def cleanup(self) -> None:
+		if self._fh is not None:
+			try:
+				self._fh.close()
+			except Exception:
+				pass
+			self._fh = None
+		if self.path is not None:
+			try:
+				self.path.unlink(missing_ok=True)
+			except Exception:
+				pass
+
+
+def _response_headers(content_type: str, content_length: int, extra_headers: Optional[List[Tuple[bytes, bytes]]]) -> List[Tuple[bytes, bytes]]:
+	headers = [
+		(b"content-type", content_type.encode("latin-1")),
+		(b"content-length", str(content_length).encode("latin-1")),
+		# Mirrors flask_cors defaults used by the Flask app
+		(b"access-control-allow-origin", b"*"),
+	]
+	if extra_headers:
+		headers.extend(extra_headers)
+	return headers
+
+
+async def _send_response(
+	send: Send,
+	status: int,
+	body: bytes,
+	content_type: str,
+	extra_headers: Optional[List[Tuple[bytes, bytes]]] = None,
+) -> None:
+	headers = _response_headers(content_type, len(body), extra_headers)
+	await send({"type": "http.response.start", "status": status, "headers": headers})
+	await send({"type": "http.response.body", "body": body})
+
+
+async def _send_head(
+	send: Send,
+	status: int,
+	content_length: int,
+	content_type: str,
+	extra_headers: Optional[List[Tuple[bytes, bytes]]] = None,
+) -> None:
+	"""The headers a GET would send (Content-Length included), without the body."""
+	headers = _response_headers(content_type, content_length, extra_headers)
+	await send({"type": "http.response.start", "status": status, "headers": headers})
+	await send({"type": "http.response.body", "body": b""})
+
+
+async def _send_json(
+	send: Send,
+	payload: Any,
+	status: int = 200,
+	extra_headers: Optional[List[Tuple[bytes, bytes]]] = None,
+) -> None:
+	body = (json.dumps(payload, separators=(",", ":")) + "\n").encode("utf-8")
+	await _send_response(send, status, body, "application/json", extra_headers)
+
+
+async def _send_rejection(
+	send: Send,
+	payload: Any,
+	status: int,
+	extra_headers: Optional[List[Tuple[bytes, bytes]]] = None,
+) -> None:
+	"""
+	Error response for a request whose body was not read to the end: the
+	connection is closed afterwards instead of reading (possibly gigabytes of)
+	upload the server already decided to refuse.
+	"""
+	await _send_json(send, payload, status, [(b"connection", b"close")] + (extra_headers or []))
+
+
+def _retry_after(rej: "Rejected") -> List[Tuple[bytes, bytes]]:
+	return [(b"retry-after", str(rej.retry_after).encode("latin-1"))]
+
+
+async def _send_text(send: Send, text: str, status: int = 200) -> None:
+	await _send_response(send, status, text.encode("utf-8"), "text/plain; charset=utf-8")
+
+
+async def _send_negotiated(send: Send, payload: Any, headers: Dict[str, str], config: AppConfig, packed: bool = False) -> None:
+	"""packed=True allows the packed binary layout (detection payloads only)."""
+	body, resp_headers = encode_response(
+		payload,
+		headers.get("accept"),
+		headers.get("accept-encoding"),
+		config.COMPRESS_MIN_BYTES,
+		packed=packed,
+	)
+	content_type = resp_headers.pop("Content-Type")
+	await _send_response(send, 200, body, content_type, [
+		(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in resp_headers.items()
+	])
+
+
+async def _send_stream(send: Send, chunks: Iterator[str], content_type: str, extra_headers: List[Tuple[bytes, bytes]]) -> None:
+	"""Send a blocking text iterator chunk by chunk, advancing it off the event loop."""
+	loop = asyncio.get_running_loop()
+	headers = [
+		(b"content-type", content_type.encode("latin-1")),
+		(b"access-control-allow-origin", b"*"),
+	] + extra_headers
+	await send({"type": "http.response.start", "status": 200, "headers": headers})
+	while True:
+		chunk = await loop.run_in_executor(None, next, chunks, None)
+		if chunk is None:
+			break
+		await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+	await send({"type": "http.response.body", "body": b""})
+
+
+async def _drain(receive: Receive) -> None:
+	"""Consume the rest of a request body we are not going to use."""
+	more = True
+	while more:
+		message = await receive()
+		if message["type"] == "http.disconnect":
+			return
+		more = message.get("more_body", False)
+
+
+def create_asgi_app(
+	config: Optional[AppConfig] = None,
+	overlays_dir: Optional[Path] = None,
+) -> Callable[[Scope, Receive, Send], Awaitable[None]]:
+	"""overlays_dir defaults to static/overlays, as in the Flask app."""
+	config = config or AppConfig()
+
+	static_dir = Path(__file__).resolve().parent / "static"
+	overlays_dir = Path(overlays_dir) if overlays_dir else static_dir / "overlays"
+	overlays_dir.mkdir(parents=True, exist_ok=True)
+	tmp_dir = Path(getattr(config, "UPLOAD_DIR", "tmp"))
+	tmp_dir.mkdir(parents=True, exist_ok=True)
+
+	# Bounded pool: at most INFERENCE_WORKERS detections run at once; the event
+	# loop keeps accepting and streaming uploads independently of it.
+	executor = ThreadPoolExecutor(max_workers=config.INFERENCE_WORKERS, thread_name_prefix="inference")
+	history = _open_history(config)
+	admission = _open_admission(config)
+	# AdmissionController.acquire blocks (for at most the latency budget), so
+	# waiters get their own threads: one per slot and per queue place
+	admission_pool = None
+	if admission is not None:
+		admission_pool = ThreadPoolExecutor(
+			max_workers=admission.max_concurrent + admission.max_queue, thread_name_prefix="admission"
+		)
+
+	async def analyze(scope: Scope, receive: Receive, send: Send) -> None:
+		headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+
+		content_length = headers.get("content-length", "")
+		if content_length.isdigit() and int(content_length) > config.MAX_IMAGE_SIZE:
+			await _send_rejection(send, {"error": "uploaded file too large"}, 413)
+			return
+
+		# Shed load before reading the upload
+		if admission is not None:
+			client = scope.get("client") or ("", 0)
+			try:
+				admission.check(headers.get("x-api-key") or client[0])
+			except Rejected as rej:
+				await _send_rejection(send, {"ok": False, "error": rej.reason}, rej.status, _retry_after(rej))
+				return
+
+		ctype, params = _header_params(headers.get("content-type", ""), "content-type")
+		boundary = params.get("boundary")
+		if ctype != "multipart/form-data" or not boundary:
+			await _drain(receive)
+			await _send_json(send, {"error": "missing multipart field 'image'"}, 400)
+			return
+
+		sink = _UploadSink(tmp_dir, config.MAX_IMAGE_SIZE)
+		try:
+			parser = MultipartStreamParser(
+				boundary.encode("latin-1"), sink.on_part_begin, sink.on_part_data, sink.on_part_end
+			)
+			received = 0
+			more = True
+			while more:
+				message = await receive()
+				if message["type"] == "http.disconnect":
+					sink.cleanup()
+					return
+				chunk = message.get("body", b"")
+				received += len(chunk)
+				if received > config.MAX_IMAGE_SIZE + MAX_BODY_OVERHEAD:
+					raise UploadTooLarge()
+				parser.feed(chunk)
+				more = message.get("more_body", False)
+			parser.close()
+		except UploadTooLarge:
+			sink.cleanup()
+			await _send_rejection(send, {"error": "uploaded file too large"}, 413)
+			return
+		except MultipartError as e:
+			sink.cleanup()
+			await _send_rejection(send, {"error": str(e)}, 400)
+			return
+
+		if sink.path is None:
+			await _send_json(send, {"error": "missing multipart field 'image'"}, 400)
+			return
+		tmp_path = sink.path
+		try:
+			filename = secure_filename(sink.filename or "")
+			if not filename:
+				await _send_json(send, {"error": "empty filename"}, 400)
+				return
+			if not _allowed_file(filename, set(config.ALLOWED_EXTENSIONS)):
+				await _send_json(send, {"error": "unsupported file type"}, 415)
+				return
+			try:
+				region, lat, lon = parse_location(sink.fields)
+			except ValueError as e:
+				await _send_json(send, {"error": str(e)}, 400)
+				return
+
+			overlay_path = overlays.temp_overlay_path(overlays_dir)
+			request_id = uuid.uuid4().hex
+			loop = asyncio.get_running_loop()
+
+			# Inference slot is only taken once the upload is on disk
+			started = None
+			if admission is not None:
+				try:
+					started = await loop.run_in_executor(admission_pool, admission.acquire)
+				except Rejected as rej:
+					await _send_json(send, {"ok": False, "error": rej.reason}, rej.status, _retry_after(rej))
+					return
+
+			try:
+				result = await loop.run_in_executor(executor, _run_detection, config, tmp_path, overlay_path)
+				overlay_name = await loop.run_in_executor(executor, overlays.finalize_overlay, overlay_path, overlays_dir)
+				if overlay_name:
+					overlay_path = overlays_dir / overlay_name
+					result["overlay_url"] = f"/overlays/{overlay_name}"
+				else:
+					result["overlay_url"] = None
+				ANALYSIS_CACHE[request_id] = {
+					"result": result,
+					"overlay_path": str(overlay_path),
+				}
+				if history is not None:
+					history.record(request_id, result, region=region, lat=lat, lon=lon, backend=config.INFERENCE_BACKEND)
+				await _send_negotiated(send, {"ok": True, "request_id": request_id, "result": result}, headers, config, packed=True)
+			except Exception as e:
+				if overlay_path.name.startswith(".tmp_"):
+					overlay_path.unlink(missing_ok=True)
+				await _send_json(send, {"ok": False, "error": str(e)}, 500)
+			finally:
+				if started is not None:
+					admission.release(started)
+		finally:
+			sink.cleanup()
+
+	async def report_text(scope: Scope, receive: Receive, send: Send) -> None:
+		query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+		request_id = (query.get("request_id") or [""])[0]
+		if not request_id:
+			await _send_text(send, "missing request_id\n", 400)
+			return
+		entry = ANALYSIS_CACHE.get(request_id)
+		if not entry:
+			await _send_text(send, "unknown request_id\n", 404)
+			return
+		await _send_text(send, _format_text_report(entry), 200)
+
+	async def history_endpoint(scope: Scope, receive: Receive, send: Send, name: str) -> None:
+		if history is None:
+			await _send_json(send, {"error": "history disabled"}, 404)
+			return
+		args = {k: v[0] for k, v in parse_qs(scope.get("query_string", b"").decode("latin-1")).items()}
+		try:
+			filters = parse_filters(args)
+			group_by = parse_group_by(args.get("group_by"))
+		except ValueError as e:
+			await _send_json(send, {"error": str(e)}, 400)
+			return
+		if name == "stats.csv":
+			await _send_stream(send, history.iter_label_stats_csv(filters, group_by), "text/csv; charset=utf-8", [
+				(b"content-disposition", b'attachment; filename="label_stats.csv"'),
+			])
+			return
+		query = history.query_detections if name == "detections" else history.query_analyses
+		page = await asyncio.get_running_loop().run_in_executor(None, query, filters)
+		headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+		await _send_negotiated(send, page, headers, config)
+
+	async def overlay_file(scope: Scope, receive: Receive, send: Send, name: str) -> None:
+		head = scope["method"] == "HEAD"
+		path = overlays_dir / name
+		if not overlays.is_overlay_name(name) or not path.is_file():
+			# Legacy uuid-named overlays are still served, without immutable caching
+			safe = secure_filename(name)
+			if safe and safe == name and path.is_file() and scope["path"].startswith("/static/"):
+				if head:
+					await _send_head(send, 200, path.stat().st_size, "image/png")
+					return
+				body = await asyncio.get_running_loop().run_in_executor(None, path.read_bytes)
+				await _send_response(send, 200, body, "image/png")
+				return
+			await _send_text(send, "not found\n", 404)
+			return
+		cache = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in overlays.cache_headers(name, config.OVERLAY_MAX_AGE).items()]
+		headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+		if overlays.etag_matches(headers.get("if-none-match"), overlays.overlay_etag(name)):
+			await send({"type": "http.response.start", "status": 304, "headers": cache})
+			await send({"type": "http.response.body", "body": b""})
+			return
+		offload = overlays.offload_headers(config.OVERLAY_SENDFILE, name, path, config.OVERLAY_ACCEL_PREFIX)
+		if offload:
+			extra = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in offload.items()]
+			await _send_response(send, 200, b"", "image/png", cache + extra)
+			return
+		if head:
+			await _send_head(send, 200, path.stat().st_size, "image/png", cache)
+			return
+		body = await asyncio.get_running_loop().run_in_executor(None, path.read_bytes)
+		await _send_response(send, 200, body, "image/png", cache)
+
+	async def lifespan(receive: Receive, send: Send) -> None:
+		while True:
+			message = await receive()
+			if message["type"] == "lifespan.startup":
+				await send({"type": "lifespan.startup.complete"})
+			elif message["type"] == "lifespan.shutdown":
+				executor.shutdown(wait=False)
+				if admission_pool is not None:
+					admission_pool.shutdown(wait=False)
+				if history is not None:
+					await asyncio.get_running_loop().run_in_executor(None, history.close)
+				await send({"type": "lifespan.shutdown.complete"})
+				return
+
+	async def app(scope: Scope, receive: Receive, send: Send) -> None:
+		if scope["type"] == "lifespan":
+			await lifespan(receive, send)
+			return
+		if scope["type"] != "http":
+			return
+
+		method = scope["method"]
+		path = scope["path"]
+		if method == "OPTIONS":
+			await _send_response(send, 200, b"", "text/plain", [
+				(b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+				(b"access-control-allow-headers", b"*"),
+			])
+		elif path == "/health" and method == "GET":
+			await _send_json(send, {"status": "ok"}, 200)
+		elif path == "/stats" and method == "GET":
+			await _send_json(send, _server_stats(config, admission, history), 200)
+		elif path == "/analyze" and method == "POST":
+			await analyze(scope, receive, send)
+		elif path == "/report_text" and method == "GET":
+			await report_text(scope, receive, send)
+		elif path in ("/history/detections", "/history/analyses", "/history/stats.csv") and method == "GET":
+			await history_endpoint(scope, receive, send, path[len("/history/"):])
+		elif path.startswith("/overlays/") and method in ("GET", "HEAD"):
+			await overlay_file(scope, receive, send, path[len("/overlays/"):])
+		elif path.startswith("/static/overlays/") and method in ("GET", "HEAD"):
+			await overlay_file(scope, receive, send, path[len("/static/overlays/"):])
+		else:
+			await _drain(receive)
+			await _send_text(send, "not found\n", 404)
+
+	return app
+
+
+if __name__ == "__main__":
+	try:
+		import uvicorn  # type: ignore
+	except Exception:
+		raise RuntimeError("uvicorn not installed. Install with: pip install uvicorn")
+	uvicorn.run(create_asgi_app(), host="0.0.0.0", port=int(os.getenv("PORT", "5000")))
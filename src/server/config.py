@@ -1,5 +1,5 @@
 import os
-from typing import Set
+from typing import Set, Tuple
 
 class AppConfig:
 	"""
@@ -36,6 +36,71 @@ class AppConfig:
 		# Bytes. You can specify MAX_IMAGE_SIZE (bytes) or MAX_IMAGE_SIZE_MB (megabytes).
 		self.MAX_IMAGE_SIZE: int = self._read_size_env()
 
+		# Cascade: a low-resolution classifier accepts confident CASCADE_ACCEPT_LABELS
+		# images on its own; everything else goes to the detector at MODEL_PATH
+		self.CASCADE_MODE: bool = self._read_bool_env(["CASCADE_MODE"], default=False)
+		self.CLASSIFIER_PATH: str = os.getenv("CLASSIFIER_PATH", "models/classifier.pt")
+		self.CASCADE_ACCEPT_LABELS: Tuple[str, ...] = self._read_list_env("CASCADE_ACCEPT_LABELS", default=("Healthy",))
+		self.CASCADE_ACCEPT_THRESHOLD: float = self._read_float_env("CASCADE_ACCEPT_THRESHOLD", default=0.9)
+		self.CASCADE_IMGSZ: int = self._read_int_env("CASCADE_IMGSZ", default=224)
+
+		# Inference backend: "model", "mock" (fixed box, instant) or "synthetic"
+		# (configurable latency/CPU/memory stand-in for load tests). Default follows MOCK_MODE.
+		self.INFERENCE_BACKEND: str = os.getenv("INFERENCE_BACKEND", "").strip().lower() or ("mock" if self.MOCK_MODE else "model")
+		# Synthetic backend: mean latency, distribution (fixed|uniform|normal|lognormal|exponential),
+		# relative spread, share of latency burned on CPU, mean boxes per image, held memory
+		self.SYNTHETIC_LATENCY_MS: float = self._read_float_env("SYNTHETIC_LATENCY_MS", default=80.0)
+		self.SYNTHETIC_DISTRIBUTION: str = os.getenv("SYNTHETIC_DISTRIBUTION", "lognormal").strip().lower()
+		self.SYNTHETIC_JITTER: float = self._read_float_env("SYNTHETIC_JITTER", default=0.3)
+		self.SYNTHETIC_CPU_FRACTION: float = self._read_float_env("SYNTHETIC_CPU_FRACTION", default=0.5)
+		self.SYNTHETIC_BOXES: float = self._read_float_env("SYNTHETIC_BOXES", default=3.0)
+		self.SYNTHETIC_MEMORY_MB: int = self._read_int_env("SYNTHETIC_MEMORY_MB", default=0)
+		self.SYNTHETIC_SEED: int = self._read_int_env("SYNTHETIC_SEED", default=0)
+
+		# Async (ASGI) server: number of threads running CPU-bound inference
+		self.INFERENCE_WORKERS: int = self._read_int_env("INFERENCE_WORKERS", default=max(1, (os.cpu_count() or 2) // 2))
+
+		# Admission control for /analyze (Flask and ASGI): concurrent inferences, wait queue and the
+		# queue-wait budget beyond which requests are shed with 503 + Retry-After.
+		# Off by default, since it adds 429/503 responses existing clients may not expect
+		self.ADMISSION_ENABLED: bool = self._read_bool_env(["ADMISSION_ENABLED"], default=False)
+		self.ADMISSION_MAX_CONCURRENT: int = self._read_int_env("ADMISSION_MAX_CONCURRENT", default=os.cpu_count() or 2)
+		self.ADMISSION_MAX_QUEUE: int = self._read_int_env("ADMISSION_MAX_QUEUE", default=32)
+		self.ADMISSION_LATENCY_BUDGET_MS: int = self._read_int_env("ADMISSION_LATENCY_BUDGET_MS", default=15000)
+		# Per-client token bucket keyed by X-API-Key header, else client IP (0 = off)
+		self.RATE_LIMIT_PER_MIN: int = self._read_int_env("RATE_LIMIT_PER_MIN", default=0)
+		self.RATE_LIMIT_BURST: int = self._read_int_env("RATE_LIMIT_BURST", default=0)
+
+		# /analyze responses at least this large are gzip/brotli-compressed when the client accepts it (0 = off)
+		self.COMPRESS_MIN_BYTES: int = self._read_int_env("COMPRESS_MIN_BYTES", default=1400)
+
+		# Overlay delivery. Overlay URLs are content-hashed, so they are cached as immutable.
+		self.OVERLAY_MAX_AGE: int = self._read_int_env("OVERLAY_MAX_AGE", default=365 * 24 * 3600)
+		# "" (serve from Python), "x-accel-redirect" (nginx) or "x-sendfile" (Apache/lighttpd)
+		self.OVERLAY_SENDFILE: str = os.getenv("OVERLAY_SENDFILE", "").strip().lower()
+		# nginx internal location that maps to static/overlays/ (used with x-accel-redirect)
+		self.OVERLAY_ACCEL_PREFIX: str = os.getenv("OVERLAY_ACCEL_PREFIX", "/_protected/overlays/")
+
+		# Admin endpoints (/admin/...) and the X-Profile header require X-Admin-Token == ADMIN_TOKEN ("" = disabled)
+		self.ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+		# Per-request profiling of /analyze: fraction of requests sampled, where profiles go
+		# (newest PROFILE_MAX_FILES kept), and whether allocations are traced with tracemalloc
+		self.PROFILE_SAMPLE_RATE: float = self._read_float_env("PROFILE_SAMPLE_RATE", default=0.0)
+		self.PROFILE_DIR: str = os.getenv("PROFILE_DIR", os.path.join("tmp", "profiles"))
+		self.PROFILE_MAX_FILES: int = self._read_int_env("PROFILE_MAX_FILES", default=50)
+		self.PROFILE_TRACE_MEMORY: bool = self._read_bool_env(["PROFILE_TRACE_MEMORY"], default=True)
+		self.PROFILE_TOP_ALLOCATIONS: int = self._read_int_env("PROFILE_TOP_ALLOCATIONS", default=25)
+
+		# Detection history (SQLite): /analyze results are queued and written in batches of
+		# HISTORY_BATCH_SIZE by a background thread; HISTORY_PAGE_MAX caps ?limit= on /history/*.
+		# Off by default (it writes every result to HISTORY_DB); /history/* returns 404 while off
+		self.HISTORY_ENABLED: bool = self._read_bool_env(["HISTORY_ENABLED"], default=False)
+		self.HISTORY_DB: str = os.getenv("HISTORY_DB", os.path.join("tmp", "history.sqlite3"))
+		self.HISTORY_BATCH_SIZE: int = self._read_int_env("HISTORY_BATCH_SIZE", default=500)
+		self.HISTORY_FLUSH_MS: int = self._read_int_env("HISTORY_FLUSH_MS", default=200)
+		self.HISTORY_QUEUE_MAX: int = self._read_int_env("HISTORY_QUEUE_MAX", default=10000)
+		self.HISTORY_PAGE_MAX: int = self._read_int_env("HISTORY_PAGE_MAX", default=1000)
+
 		# Backward-compatibility keys used elsewhere in the codebase
 		# (Prefer the new names above in new code)
 		self.MOCK = int(self.MOCK_MODE)  # legacy integer form
@@ -59,6 +124,21 @@ class AppConfig:
 					return False
 		return default
 
+	@staticmethod
+	def _read_int_env(name: str, default: int) -> int:
+		val = os.getenv(name)
+		if val and val.strip().isdigit():
+			return int(val.strip())
+		return default
+
+	@staticmethod
+	def _read_float_env(name: str, default: float) -> float:
+		val = os.getenv(name)
+		try:
+			return float(val) if val else default
+		except ValueError:
+			return default
+
 	@staticmethod
 	def _read_exts_env(name: str, default: Set[str]) -> Set[str]:
 		val = os.getenv(name)
@@ -66,6 +146,14 @@ class AppConfig:
 			return default
 		return {p.strip().lstrip(".").lower() for p in val.split(",") if p.strip()}
 
+	@staticmethod
+	def _read_list_env(name: str, default: Tuple[str, ...]) -> Tuple[str, ...]:
+		"""Comma-separated names, kept as written (case and order)."""
+		val = os.getenv(name)
+		if not val:
+			return default
+		return tuple(p.strip() for p in val.split(",") if p.strip())
+
 	@staticmethod
 	def _read_size_env() -> int:
 		# Prefer explicit bytes; else allow MB convenience var
@@ -0,0 +1,196 @@
+"""
+Negotiated response encodings for detection payloads.
+
+JSON stays the default. Clients may ask (via Accept) for:
+- application/msgpack: the same structure as JSON, MessagePack-encoded
+  (needs the optional msgpack package);
+- application/vnd.agrivision.packed: a flat little-endian layout that parses
+  with a few typed-array views:
+    header   "<4sBBHIIIH": magic b"AGVP", version=1, flags (bit0: int32 boxes,
+             else int16), reserved, width, height, n_detections, n_labels
+    labels   n_labels x ("<H" byte length + UTF-8 name)
+    label_ix n x uint16  (index into labels)
+    conf     n x uint16  (confidence * 10000, exact for the 4-decimal API values)
+    boxes    n x 4 x int16|int32  (x1, y1, x2, y2)
+    meta     "<I" byte length + UTF-8 JSON of the payload without detections
+             (ok, request_id, overlay_url, ...)
+Bodies of at least COMPRESS_MIN_BYTES are compressed with brotli (if installed)
+or gzip according to Accept-Encoding; 0 disables compression.
+"""
+import gzip
+import json
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+	import msgpack  # type: ignore
+	_HAS_MSGPACK = True
+except Exception:
+	_HAS_MSGPACK = False
+
+try:
+	import brotli  # type: ignore
+	_HAS_BROTLI = True
+except Exception:
+	_HAS_BROTLI = False
+
+JSON_TYPE = "application/json"
+MSGPACK_TYPE = "application/msgpack"
+PACKED_TYPE = "application/vnd.agrivision.packed"
+
+PACKED_MAGIC = b"AGVP"
+PACKED_VERSION = 1
+_HEADER = struct.Struct("<4sBBHIIIH")
+
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def _parse_accept(header: Optional[str]) -> List[Tuple[str, float]]:
+	"""Return (token, q) pairs sorted by descending q, original order kept on ties."""
+	items: List[Tuple[str, float, int]] = []
+	for pos, part in enumerate((header or "").split(",")):
+		fields = [f.strip() for f in part.split(";")]
+		token = fields[0].lower()
+		if not token:
+			continue
+		q = 1.0
+		for f in fields[1:]:
+			if f.startswith("q="):
+				try:
+					q = float(f[2:])
+				except ValueError:
+					q = 0.0
+		items.append((token, q, pos))
+	items.sort(key=lambda t: (-t[1], t[2]))
+	return [(t, q) for t, q, _ in items]
+
+
+def negotiate_format(accept: Optional[str], packed: bool = True) -> str:
+	"""
+	Pick the response media type; JSON unless a compact type is explicitly preferred.
+	packed=False leaves out the packed layout (it only fits detection payloads).
+	"""
+	for token, q in _parse_accept(accept):
+		if q <= 0:
+			continue
+		if token == PACKED_TYPE and packed:
+			return PACKED_TYPE
+		if token in (MSGPACK_TYPE, "application/x-msgpack") and _HAS_MSGPACK:
+			return MSGPACK_TYPE
+		if token in (JSON_TYPE, "application/*", "*/*"):
+			return JSON_TYPE
+	return JSON_TYPE
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+	offered = {t: q for t, q in _parse_accept(accept_encoding)}
+	if _HAS_BROTLI and offered.get("br", 0) > 0:
+		return "br"
+	if offered.get("gzip", 0) > 0:
+		return "gzip"
+	return None
+
+
+def pack_payload(payload: Dict[str, Any]) -> bytes:
+	"""Encode an /analyze payload ({"ok", "request_id", "result": {...}}) in the packed layout."""
+	result = payload.get("result") or {}
+	dets = result.get("detections") or []
+	labels: List[str] = []
+	label_ix: Dict[str, int] = {}
+	ix: List[int] = []
+	conf: List[int] = []
+	coords: List[int] = []
+	for d in dets:
+		name = str(d.get("label", ""))
+		if name not in label_ix:
+			label_ix[name] = len(labels)
+			labels.append(name)
+		ix.append(label_ix[name])
+		conf.append(max(0, min(10000, int(round(float(d.get("confidence", 0.0)) * 10000)))))
+		bbox = list(d.get("bbox") or [0, 0, 0, 0])[:4]
+		coords.extend(int(v) for v in bbox + [0] * (4 - len(bbox)))
+
+	wide = any(v < -32768 or v > 32767 for v in coords)
+	n = len(dets)
+	meta = dict(payload)
+	meta["result"] = {k: v for k, v in result.items() if k != "detections"}
+	meta_bytes = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+
+	parts = [_HEADER.pack(
+		PACKED_MAGIC, PACKED_VERSION, 1 if wide else 0, 0,
+		int(result.get("width") or 0), int(result.get("height") or 0), n, len(labels),
+	)]
+	for name in labels:
+		raw = name.encode("utf-8")
+		parts.append(struct.pack("<H", len(raw)) + raw)
+	parts.append(struct.pack(f"<{n}H", *ix))
+	parts.append(struct.pack(f"<{n}H", *conf))
+	parts.append(struct.pack(f"<{4 * n}{'i' if wide else 'h'}", *coords))
+	parts.append(struct.pack("<I", len(meta_bytes)) + meta_bytes)
+	return b"".join(parts)
+
+
+def unpack_payload(data: bytes) -> Dict[str, Any]:
+	"""Inverse of pack_payload (reference decoder for clients and tests)."""
+	magic, version, flags, _, w, h, n, n_labels = _HEADER.unpack_from(data, 0)
+	if magic != PACKED_MAGIC or version != PACKED_VERSION:
+		raise ValueError("not a packed AgriVision payload")
+	off = _HEADER.size
+	labels = []
+	for _ in range(n_labels):
+		(ln,) = struct.unpack_from("<H", data, off)
+		off += 2
+		labels.append(data[off:off + ln].decode("utf-8"))
+		off += ln
+	ix = struct.unpack_from(f"<{n}H", data, off)
+	off += 2 * n
+	conf = struct.unpack_from(f"<{n}H", data, off)
+	off += 2 * n
+	wide = flags & 1
+	coords = struct.unpack_from(f"<{4 * n}{'i' if wide else 'h'}", data, off)
+	off += (4 if wide else 2) * 4 * n
+	(ln,) = struct.unpack_from("<I", data, off)
+	off += 4
+	payload = json.loads(data[off:off + ln].decode("utf-8"))
+	payload.setdefault("result", {})
+	payload["result"]["width"] = w
+	payload["result"]["height"] = h
+	payload["result"]["detections"] = [
+		{"label": labels[ix[i]], "confidence": conf[i] / 10000.0, "bbox": list(coords[4 * i:4 * i + 4])}
+		for i in range(n)
+	]
+	return payload
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+	if encoding == "br":
+		return brotli.compress(body, quality=BROTLI_QUALITY)
+	return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def encode_response(
+	payload: Dict[str, Any],
+	accept: Optional[str],
+	accept_encoding: Optional[str],
+	min_compress_bytes: int,
+	packed: bool = True,
+) -> Tuple[bytes, Dict[str, str]]:
+	"""
+	Serialize payload per Accept/Accept-Encoding; returns (body, headers incl. Content-Type).
+	Pass packed=False for payloads that are not /analyze results.
+	"""
+	fmt = negotiate_format(accept, packed)
+	if fmt == PACKED_TYPE:
+		body = pack_payload(payload)
+	elif fmt == MSGPACK_TYPE:
+		body = msgpack.packb(payload, use_bin_type=True)
+	else:
+		body = (json.dumps(payload, separators=(",", ":")) + "\n").encode("utf-8")
+	headers = {"Content-Type": fmt, "Vary": "Accept, Accept-Encoding"}
+	if min_compress_bytes > 0 and len(body) >= min_compress_bytes:
+		encoding = negotiate_encoding(accept_encoding)
+		if encoding:
+			body = compress(body, encoding)
+			headers["Content-Encoding"] = encoding
+	return body, headers
@@ -0,0 +1,617 @@
+"""
+Persistent detection history for /analyze.
+
+Every analysis and each of its boxes is stored in SQLite (WAL mode):
+- analyses:    one row per request (request_id, time, region, lat/lon, image size)
+- detections:  one row per box, with created/region denormalized so label,
+               region and time queries are answered from the indexes alone
+- label_daily: per (day, region, label) count and confidence sum/min/max,
+               kept up to date on insert, so per-label statistics never scan boxes
+- analyses_geo: R-tree over analysis lat/lon for bounding-box queries
+
+/analyze only enqueues the result; a single writer thread drains the queue
+and inserts up to batch_size analyses per transaction. If the queue is full
+(disk stalled, burst far above write capacity), records are dropped and
+counted rather than slowing requests down. A record that fails to insert is
+logged and counted as a write error; the rest of its batch is still written.
+The store is off unless HISTORY_ENABLED is set (see config.py).
+
+Listing endpoints use keyset pagination on (created, id), newest first: the
+response carries next_cursor, which is passed back as ?cursor= for the next
+page, so page N costs the same as page 1 at any table size.
+"""
+import csv
+import io
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+BATCH_SIZE = 500
+FLUSH_INTERVAL_S = 0.2
+QUEUE_MAX = 10000
+PAGE_DEFAULT = 100
+PAGE_MAX = 1000
+CSV_CHUNK_ROWS = 1000
+BUSY_TIMEOUT_MS = 5000
+
+STATS_FIELDS = ["label", "day", "region", "detections", "mean_confidence", "min_confidence", "max_confidence"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+	id INTEGER PRIMARY KEY,
+	request_id TEXT NOT NULL UNIQUE,
+	created REAL NOT NULL,
+	region TEXT,
+	lat REAL,
+	lon REAL,
+	width INTEGER,
+	height INTEGER,
+	backend TEXT,
+	stage TEXT,
+	num_detections INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_analyses_created ON analyses(created);
+CREATE INDEX IF NOT EXISTS ix_analyses_region_created ON analyses(region, created);
+
+CREATE TABLE IF NOT EXISTS detections (
+	id INTEGER PRIMARY KEY,
+	analysis_id INTEGER NOT NULL REFERENCES analyses(id),
+	created REAL NOT NULL,
+	region TEXT,
+	label TEXT NOT NULL,
+	confidence REAL NOT NULL,
+	x1 REAL,
+	y1 REAL,
+	x2 REAL,
+	y2 REAL
+);
+CREATE INDEX IF NOT EXISTS ix_detections_label ON detections(label, created, confidence);
+CREATE INDEX IF NOT EXISTS ix_detections_region_label ON detections(region, label, created, confidence);
+CREATE INDEX IF NOT EXISTS ix_detections_created ON detections(created);
+CREATE INDEX IF NOT EXISTS ix_detections_analysis ON detections(analysis_id);
+
+CREATE TABLE IF NOT EXISTS label_daily (
+	day TEXT NOT NULL,
+	region TEXT NOT NULL,
+	label TEXT NOT NULL,
+	detections INTEGER NOT NULL,
+	conf_sum REAL NOT NULL,
+	conf_min REAL NOT NULL,
+	conf_max REAL NOT NULL,
+	PRIMARY KEY (day, region, label)
+) WITHOUT ROWID;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS analyses_geo USING rtree(id, min_lon, max_lon, min_lat, max_lat);
+"""
+
+_INSERT_ANALYSIS = (
+	"INSERT INTO analyses (request_id, created, region, lat, lon, width, height, backend, stage, num_detections) "
+	"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_INSERT_DETECTION = (
+	"INSERT INTO detections (analysis_id, created, region, label, confidence, x1, y1, x2, y2) "
+	"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_UPSERT_DAILY = (
+	"INSERT INTO label_daily (day, region, label, detections, conf_sum, conf_min, conf_max) VALUES (?, ?, ?, ?, ?, ?, ?) "
+	"ON CONFLICT(day, region, label) DO UPDATE SET "
+	"detections = detections + excluded.detections, conf_sum = conf_sum + excluded.conf_sum, "
+	"conf_min = min(conf_min, excluded.conf_min), conf_max = max(conf_max, excluded.conf_max)"
+)
+
+_STOP = object()
+
+log = logging.getLogger(__name__)
+
+
+def _day(ts: float) -> str:
+	return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d")
+
+
+def _iso(ts: float) -> str:
+	return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def parse_time(value: str) -> float:
+	"""Unix seconds, or an ISO 8601 date/datetime (UTC unless an offset is given)."""
+	value = value.strip()
+	try:
+		return float(value)
+	except ValueError:
+		pass
+	try:
+		dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+	except ValueError:
+		raise ValueError(f"invalid time: {value!r}")
+	if dt.tzinfo is None:
+		dt = dt.replace(tzinfo=timezone.utc)
+	return dt.timestamp()
+
+
+def parse_location(fields: Mapping[str, str]) -> Tuple[Optional[str], Optional[float], Optional[float]]:
+	"""Optional region / lat / lon form fields of an /analyze upload."""
+	region = (fields.get("region") or "").strip() or None
+	lat_s = (fields.get("lat") or "").strip()
+	lon_s = (fields.get("lon") or "").strip()
+	if not lat_s and not lon_s:
+		return region, None, None
+	try:
+		lat, lon = float(lat_s), float(lon_s)
+	except ValueError:
+		raise ValueError("lat and lon must both be given as numbers")
+	if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+		raise ValueError("lat/lon out of range")
+	return region, lat, lon
+
+
+def parse_filters(args: Mapping[str, str]) -> Dict[str, Any]:
+	"""
+	Query-string filters shared by the history endpoints:
+	label, region, min_confidence, since, until, bbox=min_lon,min_lat,max_lon,max_lat,
+	limit, cursor. Raises ValueError with a client-facing message.
+	"""
+	filters: Dict[str, Any] = {}
+	for key in ("label", "region"):
+		if args.get(key):
+			filters[key] = args[key]
+	if args.get("min_confidence"):
+		try:
+			filters["min_confidence"] = float(args["min_confidence"])
+		except ValueError:
+			raise ValueError("min_confidence must be a number")
+	for key in ("since", "until"):
+		if args.get(key):
+			filters[key] = parse_time(args[key])
+	if args.get("bbox"):
+		try:
+			bbox = [float(v) for v in args["bbox"].split(",")]
+		except ValueError:
+			bbox = []
+		if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+			raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+		filters["bbox"] = bbox
+	limit = args.get("limit")
+	if limit:
+		if not limit.isdigit() or int(limit) < 1:
+			raise ValueError("limit must be a positive integer")
+		filters["limit"] = int(limit)
+	if args.get("cursor"):
+		filters["cursor"] = _decode_cursor(args["cursor"])
+	return filters
+
+
+def _encode_cursor(created: float, row_id: int) -> str:
+	return f"{created!r}_{row_id}"
+
+
+def _decode_cursor(cursor: str) -> Tuple[float, int]:
+	try:
+		created, row_id = cursor.rsplit("_", 1)
+		return float(created), int(row_id)
+	except ValueError:
+		raise ValueError("invalid cursor")
+
+
+def _where(filters: Dict[str, Any], alias: str, detections: bool) -> Tuple[List[str], List[Any]]:
+	clauses: List[str] = []
+	params: List[Any] = []
+	if detections and "label" in filters:
+		clauses.append(f"{alias}.label = ?")
+		params.append(filters["label"])
+	if "region" in filters:
+		clauses.append(f"{alias}.region = ?")
+		params.append(filters["region"])
+	if detections and "min_confidence" in filters:
+		clauses.append(f"{alias}.confidence >= ?")
+		params.append(filters["min_confidence"])
+	if "since" in filters:
+		clauses.append(f"{alias}.created >= ?")
+		params.append(filters["since"])
+	if "until" in filters:
+		clauses.append(f"{alias}.created < ?")
+		params.append(filters["until"])
+	if "bbox" in filters:
+		min_lon, min_lat, max_lon, max_lat = filters["bbox"]
+		column = f"{alias}.analysis_id" if detections else f"{alias}.id"
+		clauses.append(
+			f"{column} IN (SELECT id FROM analyses_geo WHERE min_lon >= ? AND max_lon <= ? AND min_lat >= ? AND max_lat <= ?)"
+		)
+		params.extend([min_lon, max_lon, min_lat, max_lat])
+	return clauses, params
+
+
+class HistoryStore:
+	def __init__(
+		self,
+		path: Path,
+		batch_size: int = BATCH_SIZE,
+		flush_interval_s: float = FLUSH_INTERVAL_S,
+		queue_max: int = QUEUE_MAX,
+		page_max: int = PAGE_MAX,
+	):
+		self.path = Path(path)
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		self.batch_size = max(1, batch_size)
+		self.flush_interval_s = max(0.0, flush_interval_s)
+		self.page_max = max(1, page_max)
+		self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, queue_max))
+		self._local = threading.local()
+		self._lock = threading.Lock()
+		self._counters: Dict[str, int] = {
+			"queued": 0,
+			"dropped": 0,
+			"batches": 0,
+			"analyses_written": 0,
+			"detections_written": 0,
+			"write_errors": 0,
+		}
+		conn = self._connect()
+		conn.execute("PRAGMA journal_mode=WAL")
+		conn.executescript(SCHEMA)
+		conn.close()
+		self._writer = threading.Thread(target=self._run, name="history-writer", daemon=True)
+		self._writer.start()
+
+	def _connect(self, check_same_thread: bool = True) -> sqlite3.Connection:
+		conn = sqlite3.connect(str(self.path), timeout=BUSY_TIMEOUT_MS / 1000.0, check_same_thread=check_same_thread)
+		conn.execute("PRAGMA synchronous=NORMAL")
+		return conn
+
+	def _reader(self) -> sqlite3.Connection:
+		conn = getattr(self._local, "conn", None)
+		if conn is None:
+			conn = self._connect()
+			conn.execute("PRAGMA query_only=ON")
+			self._local.conn = conn
+		return conn
+
+	def _count(self, key: str, n: int = 1) -> None:
+		with self._lock:
+			self._counters[key] += n
+
+	def stats(self) -> Dict[str, int]:
+		with self._lock:
+			return {**self._counters, "pending": self._queue.qsize()}
+
+	# --- writes ---
+
+	def record(
+		self,
+		request_id: str,
+		result: Dict[str, Any],
+		region: Optional[str] = None,
+		lat: Optional[float] = None,
+		lon: Optional[float] = None,
+		backend: Optional[str] = None,
+		created: Optional[float] = None,
+	) -> bool:
+		"""Queue one analysis for writing; returns False if it was dropped."""
+		item = (request_id, created if created is not None else time.time(), region, lat, lon, backend, result)
+		try:
+			self._queue.put_nowait(item)
+		except queue.Full:
+			self._count("dropped")
+			return False
+		self._count("queued")
+		return True
+
+	def flush(self, timeout: Optional[float] = 10.0) -> bool:
+		"""Block until everything queued so far is committed; False on timeout or a dead writer."""
+		if not self._writer.is_alive():
+			return False
+		done = threading.Event()
+		try:
+			self._queue.put(done, timeout=timeout)
+		except queue.Full:
+			return False
+		return done.wait(timeout)
+
+	def close(self, timeout: Optional[float] = 10.0) -> None:
+		if not self._writer.is_alive():
+			return
+		try:
+			self._queue.put(_STOP, timeout=timeout)
+		except queue.Full:
+			log.error("history writer did not drain its queue within %ss; %d records not written", timeout, self._queue.qsize())
+			return
+		self._writer.join(timeout)
+
+	def _run(self) -> None:
+		conn = self._connect()
+		stop = False
+		while not stop:
+			batch: List[Any] = []
+			events: List[threading.Event] = []
+			taken = 0
+			try:
+				item = self._queue.get()
+				taken = 1
+				deadline = time.monotonic() + self.flush_interval_s
+				while True:
+					if item is _STOP:
+						stop = True
+					elif isinstance(item, threading.Event):
+						events.append(item)
+					else:
+						batch.append(item)
+					if stop or len(batch) >= self.batch_size:
+						break
+					remaining = deadline - time.monotonic()
+					try:
+						item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+					except queue.Empty:
+						break
+					taken += 1
+				if batch:
+					self._write_batch(conn, batch)
+			except Exception:
+				log.exception("history writer: unexpected error")
+			finally:
+				for ev in events:
+					ev.set()
+				for _ in range(taken):
+					self._queue.task_done()
+		try:
+			conn.execute("PRAGMA optimize")
+		finally:
+			conn.close()
+
+	def _write_batch(self, conn: sqlite3.Connection, batch: List[Any]) -> None:
+		"""Write a batch in one transaction; if it fails, retry item by item so one bad record costs only itself."""
+		try:
+			self._write(conn, batch)
+			return
+		except Exception:
+			if len(batch) == 1:
+				self._count("write_errors")
+				log.exception("history writer: dropping analysis %s", batch[0][0])
+				return
+		for item in batch:
+			try:
+				self._write(conn, [item])
+			except Exception:
+				self._count("write_errors")
+				log.exception("history writer: dropping analysis %s", item[0])
+
+	def _write(self, conn: sqlite3.Connection, batch: List[Any]) -> None:
+		det_rows: List[Tuple[Any, ...]] = []
+		geo_rows: List[Tuple[Any, ...]] = []
+		daily: Dict[Tuple[str, str, str], List[float]] = {}
+		written = 0
+		with conn:
+			cur = conn.cursor()
+			for request_id, created, region, lat, lon, backend, result in batch:
+				dets = result.get("detections") or []
+				try:
+					cur.execute(_INSERT_ANALYSIS, (
+						request_id, created, region, lat, lon,
+						result.get("width"), result.get("height"), backend, result.get("stage"), len(dets),
+					))
+				except sqlite3.IntegrityError:
+					continue
+				written += 1
+				analysis_id = cur.lastrowid
+				if lat is not None and lon is not None:
+					geo_rows.append((analysis_id, lon, lon, lat, lat))
+				day = _day(created)
+				for d in dets:
+					label = str(d.get("label", "?"))
+					conf = float(d.get("confidence") or 0.0)
+					bbox = list(d.get("bbox") or [])[:4]
+					bbox += [None] * (4 - len(bbox))
+					det_rows.append((analysis_id, created, region, label, conf, *bbox))
+					agg = daily.get((day, region or "", label))
+					if agg is None:
+						daily[(day, region or "", label)] = [1, conf, conf, conf]
+					else:
+						agg[0] += 1
+						agg[1] += conf
+						agg[2] = min(agg[2], conf)
+						agg[3] = max(agg[3], conf)
+			cur.executemany(_INSERT_DETECTION, det_rows)
+			cur.executemany("INSERT INTO analyses_geo VALUES (?, ?, ?, ?, ?)", geo_rows)
+			cur.executemany(_UPSERT_DAILY, [(*key, *agg) for key, agg in daily.items()])
+		with self._lock:
+			self._counters["batches"] += 1
+			self._counters["analyses_written"] += written
+			self._counters["detections_written"] += len(det_rows)
+
+	# --- queries ---
+
+	def _limit(self, filters: Dict[str, Any]) -> int:
+		return min(self.page_max, filters.get("limit", PAGE_DEFAULT))
+
+	def query_detections(self, filters: Dict[str, Any]) -> Dict[str, Any]:
+		"""One page of boxes matching filters, newest first."""
+		clauses, params = _where(filters, "d", detections=True)
+		if "cursor" in filters:
+			created, row_id = filters["cursor"]
+			clauses.append("d.created <= ? AND (d.created < ? OR d.id < ?)")
+			params.extend([created, created, row_id])
+		limit = self._limit(filters)
+		sql = (
+			"SELECT d.id, d.created, d.region, d.label, d.confidence, d.x1, d.y1, d.x2, d.y2, a.request_id, a.lat, a.lon "
+			"FROM detections d CROSS JOIN analyses a ON a.id = d.analysis_id"
+			+ (" WHERE " + " AND ".join(clauses) if clauses else "")
+			+ " ORDER BY d.created DESC, d.id DESC LIMIT ?"
+		)
+		rows = self._reader().execute(sql, params + [limit + 1]).fetchall()
+		items = [{
+			"id": r[0],
+			"created": _iso(r[1]),
+			"region": r[2],
+			"label": r[3],
+			"confidence": r[4],
+			"bbox": [r[5], r[6], r[7], r[8]],
+			"request_id": r[9],
+			"lat": r[10],
+			"lon": r[11],
+		} for r in rows[:limit]]
+		next_cursor = _encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+		return {"items": items, "next_cursor": next_cursor}
+
+	def query_analyses(self, filters: Dict[str, Any]) -> Dict[str, Any]:
+		"""One page of analyses matching filters (label/min_confidence: any box matches), newest first."""
+		clauses, params = _where(filters, "a", detections=False)
+		if "label" in filters or "min_confidence" in filters:
+			sub, sub_params = _where({k: v for k, v in filters.items() if k in ("label", "min_confidence")}, "d", detections=True)
+			clauses.append("EXISTS (SELECT 1 FROM detections d WHERE d.analysis_id = a.id AND " + " AND ".join(sub) + ")")
+			params.extend(sub_params)
+		if "cursor" in filters:
+			created, row_id = filters["cursor"]
+			clauses.append("a.created <= ? AND (a.created < ? OR a.id < ?)")
+			params.extend([created, created, row_id])
+		limit = self._limit(filters)
+		sql = (
+			"SELECT a.id, a.request_id, a.created, a.region, a.lat, a.lon, a.width, a.height, a.backend, a.stage, a.num_detections "
+			"FROM analyses a"
+			+ (" WHERE " + " AND ".join(clauses) if clauses else "")
+			+ " ORDER BY a.created DESC, a.id DESC LIMIT ?"
+		)
+		rows = self._reader().execute(sql, params + [limit + 1]).fetchall()
+		items = [{
+			"request_id": r[1],
+			"created": _iso(r[2]),
+			"region": r[3],
+			"lat": r[4],
+			"lon": r[5],
+			"width": r[6],
+			"height": r[7],
+			"backend": r[8],
+			"stage": r[9],
+			"detections": r[10],
+		} for r in rows[:limit]]
+		next_cursor = _encode_cursor(rows[limit - 1][2], rows[limit - 1][0]) if len(rows) > limit else None
+		return {"items": items, "next_cursor": next_cursor}
+
+	def _stats_query(self, filters: Dict[str, Any], group_by: List[str]) -> Tuple[str, List[Any]]:
+		"""
+		Per-label aggregate SQL. Served from label_daily unless a filter needs the
+		boxes themselves (min_confidence, bbox, or since/until not on a UTC day boundary).
+		"""
+		aligned = all(filters[k] % 86400 == 0 for k in ("since", "until") if k in filters)
+		if aligned and "min_confidence" not in filters and "bbox" not in filters:
+			keys = {"label": "label", "day": "day", "region": "NULLIF(region, '')"}
+			clauses, params = [], []
+			if "label" in filters:
+				clauses.append("label = ?")
+				params.append(filters["label"])
+			if "region" in filters:
+				clauses.append("region = ?")
+				params.append(filters["region"])
+			if "since" in filters:
+				clauses.append("day >= ?")
+				params.append(_day(filters["since"]))
+			if "until" in filters:
+				clauses.append("day < ?")
+				params.append(_day(filters["until"]))
+			aggregates = "SUM(detections), SUM(conf_sum) / SUM(detections), MIN(conf_min), MAX(conf_max)"
+			source = "label_daily"
+		else:
+			keys = {"label": "d.label", "day": "date(d.created, 'unixepoch')", "region": "d.region"}
+			clauses, params = _where(filters, "d", detections=True)
+			aggregates = "COUNT(*), AVG(d.confidence), MIN(d.confidence), MAX(d.confidence)"
+			source = "detections d"
+		columns = [keys[g] for g in group_by]
+		sql = (
+			f"SELECT {', '.join(columns)}, {aggregates} FROM {source}"
+			+ (" WHERE " + " AND ".join(clauses) if clauses else "")
+			+ f" GROUP BY {', '.join(columns)} ORDER BY {', '.join(columns)}"
+		)
+		return sql, params
+
+	def iter_label_stats_csv(self, filters: Dict[str, Any], group_by: Optional[List[str]] = None) -> Iterator[str]:
+		"""
+		Stream per-label statistics as CSV text chunks. group_by is a subset of
+		["day", "region"] (label is always a key). Uses its own connection, so the
+		iterator may be advanced from any thread.
+		"""
+		group_by = ["label"] + [g for g in ("day", "region") if g in (group_by or [])]
+		sql, params = self._stats_query(filters, group_by)
+		fields = group_by + STATS_FIELDS[3:]
+		buf = io.StringIO()
+		writer = csv.writer(buf)
+		writer.writerow(fields)
+		conn = self._connect(check_same_thread=False)
+		try:
+			cur = conn.execute(sql, params)
+			while True:
+				rows = cur.fetchmany(CSV_CHUNK_ROWS)
+				for r in rows:
+					n = len(group_by)
+					writer.writerow(list(r[:n]) + [r[n], round(r[n + 1], 4), round(r[n + 2], 4), round(r[n + 3], 4)])
+				if buf.tell():
+					yield buf.getvalue()
+					buf.seek(0)
+					buf.truncate()
+				if not rows:
+					break
+		finally:
+			conn.close()
+
+
+def parse_group_by(value: Optional[str]) -> List[str]:
+	parts = [p.strip() for p in (value or "").split(",") if p.strip()]
+	unknown = [p for p in parts if p not in ("label", "day", "region")]
+	if unknown:
+		raise ValueError(f"unknown group_by: {', '.join(unknown)} (use label, day, region)")
+	return parts
+
+
+if __name__ == "__main__":
+	import argparse
+	import json
+	import random
+	import uuid
+
+	ap = argparse.ArgumentParser(description="Fill a history database with synthetic detections and time queries")
+	ap.add_argument("--db", type=str, default="tmp/history_bench.sqlite3")
+	ap.add_argument("--analyses", type=int, default=100000)
+	ap.add_argument("--boxes", type=float, default=4.0, help="mean boxes per analysis")
+	ap.add_argument("--days", type=int, default=30)
+	args = ap.parse_args()
+
+	labels = ["Broken", "Immature", "Intact", "Skin-damaged", "Spotted"]
+	regions = [f"field-{i}" for i in range(20)]
+	store = HistoryStore(Path(args.db), batch_size=2000, queue_max=args.analyses + 1)
+	rng = random.Random(0)
+	now = time.time()
+	t0 = time.perf_counter()
+	for i in range(args.analyses):
+		created = now - args.days * 86400 * (1 - i / args.analyses)
+		dets = [{
+			"label": rng.choice(labels),
+			"confidence": round(rng.random(), 4),
+			"bbox": [10, 10, 100, 100],
+		} for _ in range(int(rng.expovariate(1 / args.boxes)))]
+		store.record(uuid.uuid4().hex, {"detections": dets, "width": 640, "height": 640},
+			region=rng.choice(regions), lat=rng.uniform(40, 41), lon=rng.uniform(-90, -89), created=created)
+	store.flush(timeout=None)
+	insert_s = time.perf_counter() - t0
+
+	def timed(fn, *a):
+		t = time.perf_counter()
+		out = fn(*a)
+		return round((time.perf_counter() - t) * 1000.0, 2), out
+
+	week = {"label": "Spotted", "region": "field-3", "min_confidence": 0.8, "since": now - 7 * 86400, "limit": 100}
+	ms_page1, page = timed(store.query_detections, week)
+	ms_page2, _ = timed(store.query_detections, {**week, "cursor": _decode_cursor(page["next_cursor"])}) if page["next_cursor"] else (None, None)
+	ms_bbox, _ = timed(store.query_analyses, {"bbox": [-89.6, 40.4, -89.5, 40.5], "limit": 100})
+	ms_stats, _ = timed(lambda: "".join(store.iter_label_stats_csv({}, ["day"])))
+	ms_stats_raw, _ = timed(lambda: "".join(store.iter_label_stats_csv({"min_confidence": 0.8})))
+	print(json.dumps({
+		**store.stats(),
+		"insert_s": round(insert_s, 2),
+		"week_query_page1_ms": ms_page1,
+		"week_query_page2_ms": ms_page2,
+		"bbox_query_ms": ms_bbox,
+		"label_stats_rollup_ms": ms_stats,
+		"label_stats_min_conf_ms": ms_stats_raw,
+	}, indent=2))
+	store.close()
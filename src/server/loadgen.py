@@ -0,0 +1,325 @@
+"""
+HTTP load generator for /analyze (stdlib only: http.client + threads).
+
+Runs a series of steps, each for --duration seconds, and reports per step the
+achieved throughput, latency percentiles, error rate (by status) and the first
+step at which the server saturates.
+
+Two load models:
+- closed loop (--concurrency 1,2,4,8): N clients send back-to-back requests;
+- open loop (--rates 5,10,20): requests are scheduled at a fixed rate whatever
+  the server does. Latency is measured from the scheduled send time, so time a
+  request spent waiting for a free client counts too (no coordinated omission).
+
+A step is saturated when its error rate exceeds --max_error_rate, its p99
+exceeds --slo_ms, an open-loop step achieves < 90% of the offered rate, or a
+closed-loop step gains < 5% throughput over the previous one.
+
+Example (against the synthetic backend):
+  INFERENCE_BACKEND=synthetic SYNTHETIC_LATENCY_MS=120 python src/server/app.py
+  python src/server/loadgen.py --url http://127.0.0.1:5000/analyze --images samples/ \
+      --concurrency 1,2,4,8,16 --duration 20 --json load.json
+"""
+import http.client
+import json
+import mimetypes
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff"}
+PERCENTILES = (50, 90, 95, 99)
+OPEN_LOOP_SHORTFALL = 0.9
+CLOSED_LOOP_MIN_GAIN = 1.05
+
+
+def collect_images(paths: List[str]) -> List[Path]:
+	files: List[Path] = []
+	for p in map(Path, paths):
+		if p.is_dir():
+			files.extend(sorted(f for f in p.rglob("*") if f.suffix.lower() in IMAGE_EXTS))
+		elif p.is_file():
+			files.append(p)
+	return files
+
+
+def build_multipart(path: Path, field: str = "image") -> Tuple[bytes, str]:
+	"""Encode one file as a multipart/form-data body; returns (body, content_type)."""
+	boundary = uuid.uuid4().hex
+	ctype = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+	head = (
+		f"--{boundary}\r\n"
+		f'Content-Disposition: form-data; name="{field}"; filename="{path.name}"\r\n'
+		f"Content-Type: {ctype}\r\n\r\n"
+	).encode("utf-8")
+	body = head + path.read_bytes() + f"\r\n--{boundary}--\r\n".encode("ascii")
+	return body, f"multipart/form-data; boundary={boundary}"
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+	"""Nearest-rank percentile of an already sorted list."""
+	if not sorted_values:
+		return None
+	k = max(0, min(len(sorted_values) - 1, int(-(-pct * len(sorted_values) // 100)) - 1))
+	return sorted_values[k]
+
+
+class Client:
+	"""One keep-alive connection; reconnects after errors."""
+
+	def __init__(self, url: str, timeout: float, headers: Dict[str, str]):
+		parts = urlsplit(url)
+		self.https = parts.scheme == "https"
+		self.host = parts.hostname or "127.0.0.1"
+		self.port = parts.port or (443 if self.https else 80)
+		self.path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+		self.timeout = timeout
+		self.headers = headers
+		self._conn: Optional[http.client.HTTPConnection] = None
+
+	def _connection(self) -> http.client.HTTPConnection:
+		if self._conn is None:
+			cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+			self._conn = cls(self.host, self.port, timeout=self.timeout)
+		return self._conn
+
+	def request(self, method: str, path: str, body: Optional[bytes] = None, headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+		conn = self._connection()
+		try:
+			conn.request(method, path, body=body, headers={**self.headers, **(headers or {})})
+			resp = conn.getresponse()
+			data = resp.read()
+			if resp.getheader("Connection", "").lower() == "close":
+				self.close()
+			return resp.status, data
+		except Exception:
+			self.close()
+			raise
+
+	def post(self, body: bytes, content_type: str) -> int:
+		status, _ = self.request("POST", self.path, body, {"Content-Type": content_type})
+		return status
+
+	def close(self) -> None:
+		if self._conn is not None:
+			try:
+				self._conn.close()
+			except Exception:
+				pass
+			self._conn = None
+
+
+class StepRecorder:
+	def __init__(self):
+		self._lock = threading.Lock()
+		self.latencies: List[float] = []
+		self.statuses: Dict[str, int] = {}
+
+	def record(self, latency_s: float, status: str) -> None:
+		with self._lock:
+			self.statuses[status] = self.statuses.get(status, 0) + 1
+			if status.startswith("2"):
+				self.latencies.append(latency_s)
+
+	def summary(self, elapsed_s: float) -> Dict[str, Any]:
+		with self._lock:
+			lat = sorted(self.latencies)
+			statuses = dict(self.statuses)
+		total = sum(statuses.values())
+		ok = len(lat)
+		out: Dict[str, Any] = {
+			"requests": total,
+			"ok": ok,
+			"errors": total - ok,
+			"error_rate": round((total - ok) / total, 4) if total else 0.0,
+			"statuses": statuses,
+			"throughput_rps": round(ok / elapsed_s, 2) if elapsed_s > 0 else 0.0,
+		}
+		for p in PERCENTILES:
+			v = percentile(lat, p)
+			out[f"p{p}_ms"] = round(v * 1000.0, 1) if v is not None else None
+		out["max_ms"] = round(lat[-1] * 1000.0, 1) if lat else None
+		return out
+
+
+def _send(client: Client, bodies: List[Tuple[bytes, str]], i: int, recorder: StepRecorder, t_start: float) -> None:
+	body, ctype = bodies[i % len(bodies)]
+	try:
+		status = str(client.post(body, ctype))
+	except Exception as e:
+		status = type(e).__name__
+	recorder.record(time.perf_counter() - t_start, status)
+
+
+def run_closed_loop(url: str, bodies: List[Tuple[bytes, str]], concurrency: int, duration_s: float, timeout: float, headers: Dict[str, str]) -> Dict[str, Any]:
+	recorder = StepRecorder()
+	deadline = time.perf_counter() + duration_s
+	counter = iter(range(sys.maxsize))
+	lock = threading.Lock()
+
+	def worker() -> None:
+		client = Client(url, timeout, headers)
+		try:
+			while time.perf_counter() < deadline:
+				with lock:
+					i = next(counter)
+				_send(client, bodies, i, recorder, time.perf_counter())
+		finally:
+			client.close()
+
+	t0 = time.perf_counter()
+	threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+	for t in threads:
+		t.start()
+	for t in threads:
+		t.join()
+	result = recorder.summary(time.perf_counter() - t0)
+	result.update(mode="closed", concurrency=concurrency)
+	return result
+
+
+def run_open_loop(url: str, bodies: List[Tuple[bytes, str]], rate: float, duration_s: float, timeout: float, headers: Dict[str, str], max_inflight: int) -> Dict[str, Any]:
+	recorder = StepRecorder()
+	schedule: "queue.Queue" = queue.Queue()
+	n = int(rate * duration_s)
+
+	def worker() -> None:
+		client = Client(url, timeout, headers)
+		try:
+			while True:
+				item = schedule.get()
+				if item is None:
+					return
+				i, t_sched = item
+				_send(client, bodies, i, recorder, t_sched)
+		finally:
+			client.close()
+
+	threads = [threading.Thread(target=worker, daemon=True) for _ in range(max_inflight)]
+	for t in threads:
+		t.start()
+	t0 = time.perf_counter()
+	late = 0
+	for i in range(n):
+		t_sched = t0 + i / rate
+		delay = t_sched - time.perf_counter()
+		if delay > 0:
+			time.sleep(delay)
+		if schedule.qsize() > 0:
+			late += 1  # every client is busy: this request will start late
+		schedule.put((i, t_sched))
+	for _ in threads:
+		schedule.put(None)
+	for t in threads:
+		t.join()
+	result = recorder.summary(time.perf_counter() - t0)
+	result.update(mode="open", offered_rps=rate, started_late=late)
+	return result
+
+
+def fetch_server_stats(url: str, timeout: float) -> Optional[Dict[str, Any]]:
+	"""GET /stats next to the target URL (admission counters), if the server has it."""
+	client = Client(url, timeout, {})
+	try:
+		status, data = client.request("GET", "/stats")
+		return json.loads(data) if status == 200 else None
+	except Exception:
+		return None
+	finally:
+		client.close()
+
+
+def find_saturation(steps: List[Dict[str, Any]], max_error_rate: float, slo_ms: float) -> Optional[Dict[str, Any]]:
+	prev: Optional[Dict[str, Any]] = None
+	for i, s in enumerate(steps):
+		reason = None
+		if s["error_rate"] > max_error_rate:
+			reason = f"error rate {s['error_rate']:.2%}"
+		elif slo_ms and s["p99_ms"] is not None and s["p99_ms"] > slo_ms:
+			reason = f"p99 {s['p99_ms']} ms > {slo_ms} ms"
+		elif s["mode"] == "open" and s["throughput_rps"] < OPEN_LOOP_SHORTFALL * s["offered_rps"]:
+			reason = f"throughput {s['throughput_rps']} rps < offered {s['offered_rps']} rps"
+		elif s["mode"] == "closed" and prev is not None and s["throughput_rps"] < CLOSED_LOOP_MIN_GAIN * prev["throughput_rps"]:
+			reason = f"throughput flat ({prev['throughput_rps']} -> {s['throughput_rps']} rps)"
+		if reason:
+			return {"step": i, "load": s.get("offered_rps", s.get("concurrency")), "reason": reason}
+		prev = s
+	return None
+
+
+def _print_table(steps: List[Dict[str, Any]]) -> None:
+	cols = ["load", "requests", "throughput_rps", "error_rate", "p50_ms", "p90_ms", "p99_ms", "max_ms"]
+	print("  ".join(f"{c:>14}" for c in cols))
+	for s in steps:
+		row = dict(s, load=s.get("offered_rps", s.get("concurrency")))
+		print("  ".join(f"{str(row[c]):>14}" for c in cols))
+
+
+def main():
+	import argparse
+	parser = argparse.ArgumentParser(description="Load-test /analyze and report latency percentiles, errors and saturation.")
+	parser.add_argument("--url", default="http://127.0.0.1:5000/analyze")
+	parser.add_argument("--images", nargs="+", required=True, help="Image files or directories to upload (round-robin)")
+	parser.add_argument("--concurrency", type=str, default="1,2,4,8", help="Closed loop: comma-separated client counts")
+	parser.add_argument("--rates", type=str, default="", help="Open loop: comma-separated request rates (req/s); overrides --concurrency")
+	parser.add_argument("--duration", type=float, default=20.0, help="Seconds per step")
+	parser.add_argument("--warmup", type=float, default=2.0, help="Seconds of single-client traffic before the first step")
+	parser.add_argument("--timeout", type=float, default=60.0, help="Per-request socket timeout (s)")
+	parser.add_argument("--max_inflight", type=int, default=256, help="Open loop: maximum concurrent requests")
+	parser.add_argument("--accept", type=str, default="", help="Accept header to send (e.g. application/vnd.agrivision.packed)")
+	parser.add_argument("--api_key", type=str, default=os.getenv("API_KEY", ""), help="Sent as X-API-Key")
+	parser.add_argument("--slo_ms", type=float, default=0.0, help="p99 latency objective; 0 = not checked")
+	parser.add_argument("--max_error_rate", type=float, default=0.01)
+	parser.add_argument("--json", type=str, default="", help="Write the full report to this file")
+	args = parser.parse_args()
+
+	images = collect_images(args.images)
+	if not images:
+		parser.error("no images found")
+	bodies = [build_multipart(p) for p in images]
+	headers: Dict[str, str] = {}
+	if args.accept:
+		headers["Accept"] = args.accept
+	if args.api_key:
+		headers["X-API-Key"] = args.api_key
+
+	if args.warmup > 0:
+		run_closed_loop(args.url, bodies, 1, args.warmup, args.timeout, headers)
+
+	steps: List[Dict[str, Any]] = []
+	if args.rates:
+		loads = [float(r) for r in args.rates.split(",") if r.strip()]
+	else:
+		loads = [int(c) for c in args.concurrency.split(",") if c.strip()]
+	for load in loads:
+		if args.rates:
+			step = run_open_loop(args.url, bodies, load, args.duration, args.timeout, headers, args.max_inflight)
+		else:
+			step = run_closed_loop(args.url, bodies, int(load), args.duration, args.timeout, headers)
+		step["server"] = fetch_server_stats(args.url, args.timeout)
+		steps.append(step)
+		print(json.dumps({k: v for k, v in step.items() if k != "server"}), file=sys.stderr)
+
+	report = {
+		"url": args.url,
+		"images": len(images),
+		"duration_s": args.duration,
+		"steps": steps,
+		"saturation": find_saturation(steps, args.max_error_rate, args.slo_ms),
+	}
+	_print_table(steps)
+	sat = report["saturation"]
+	print(f"saturation: step {sat['step']} (load {sat['load']}): {sat['reason']}" if sat else "saturation: not reached")
+	if args.json:
+		with open(args.json, "w", encoding="utf-8") as f:
+			json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+	main()
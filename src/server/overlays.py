@@ -0,0 +1,82 @@
+"""
+Content-addressed overlay files.
+
+Overlay PNGs are renamed to the SHA-256 of their bytes once written, so a URL
+always refers to the same content and can be cached as immutable by browsers and
+CDNs. The hash doubles as the ETag. Delivery can optionally be handed to the
+front proxy (nginx X-Accel-Redirect or Apache/lighttpd X-Sendfile).
+"""
+import hashlib
+import os
+import re
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+# 40 hex digits: legacy overlays are named uuid4().hex (32), and must not be
+# mistaken for content-addressed ones and cached as immutable
+HASH_LEN = 40
+_NAME_RE = re.compile(r"^[0-9a-f]{%d}\.png$" % HASH_LEN)
+ONE_YEAR = 365 * 24 * 3600
+
+
+def temp_overlay_path(overlays_dir: Path) -> Path:
+	"""Where detection should write the overlay before it is content-addressed."""
+	return overlays_dir / f".tmp_{uuid.uuid4().hex}.png"
+
+
+def finalize_overlay(tmp_path: Path, overlays_dir: Path) -> Optional[str]:
+	"""
+	Rename a freshly written overlay to <sha256[:40]>.png and return that name.
+	Identical overlays share one file. Returns None if nothing was written.
+	"""
+	if not tmp_path.exists():
+		return None
+	h = hashlib.sha256()
+	with tmp_path.open("rb") as f:
+		for chunk in iter(lambda: f.read(1024 * 1024), b""):
+			h.update(chunk)
+	name = f"{h.hexdigest()[:HASH_LEN]}.png"
+	final = overlays_dir / name
+	if final.exists():
+		tmp_path.unlink(missing_ok=True)
+	else:
+		os.replace(tmp_path, final)
+	return name
+
+
+def is_overlay_name(name: str) -> bool:
+	return bool(_NAME_RE.match(name or ""))
+
+
+def overlay_etag(name: str) -> str:
+	return name.rsplit(".", 1)[0]
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+	if not if_none_match:
+		return False
+	if if_none_match.strip() == "*":
+		return True
+	tags = [t.strip() for t in if_none_match.split(",")]
+	return any(t in (f'"{etag}"', f'W/"{etag}"') for t in tags)
+
+
+def cache_headers(name: str, max_age: int = ONE_YEAR) -> Dict[str, str]:
+	return {
+		"Cache-Control": f"public, max-age={max_age}, immutable",
+		"ETag": f'"{overlay_etag(name)}"',
+	}
+
+
+def offload_headers(mode: str, name: str, path: Path, accel_prefix: str) -> Dict[str, str]:
+	"""
+	Headers that tell the front proxy to send the file itself, or {} when
+	mode is empty. mode: "x-accel-redirect" (nginx) or "x-sendfile".
+	"""
+	mode = (mode or "").lower()
+	if mode == "x-accel-redirect":
+		return {"X-Accel-Redirect": accel_prefix.rstrip("/") + "/" + name}
+	if mode == "x-sendfile":
+		return {"X-Sendfile": str(path.resolve())}
+	return {}
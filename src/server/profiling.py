@@ -0,0 +1,228 @@
+"""
+Opt-in per-request profiling for /analyze.
+
+A request is profiled when it carries `X-Profile: 1` together with a valid
+`X-Admin-Token`, or when it is picked by PROFILE_SAMPLE_RATE. A profiled request
+runs under cProfile and (optionally) tracemalloc, and phase() markers from
+src/ml/inference.py and app.py (upload, save_upload, decode, predict, encode ...) are recorded
+with their wall time and net allocation. Each profile is written to PROFILE_DIR
+as <stamp>_<request_id>.json (phases, top allocations, top functions) plus a
+.prof file readable by pstats / snakeviz; only the newest PROFILE_MAX_FILES are
+kept. When no request is profiled, the cost is an in-flight counter update,
+one header lookup and one random().
+
+cProfile can only profile one request at a time; a request that asks for a
+profile while another one is being profiled runs unprofiled.
+
+tracemalloc is process-wide: peak_kb and top_allocations include whatever other
+threads allocated meanwhile. Sampled profiles are therefore only taken while
+the request is the only /analyze in flight; admin-requested profiles always
+run and record max_in_flight, so figures with max_in_flight > 1 should be read
+as an upper bound (profile an idle server for exact numbers).
+"""
+import cProfile
+import hmac
+import io
+import json
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, Optional
+
+try:
+	from src.ml.inference import collect_phases  # type: ignore
+except Exception:
+	try:
+		from ..ml.inference import collect_phases  # type: ignore
+	except Exception:
+		import sys
+		sys.path.append(str(Path(__file__).resolve().parents[2]))
+		from src.ml.inference import collect_phases  # type: ignore
+
+
+PROFILE_HEADER = "X-Profile"
+# X-Profile values that ask for a profile; anything else ("0", "false", ...) does not
+PROFILE_ON_VALUES = {"1", "true", "yes", "on"}
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+PROFILE_ID_HEADER = "X-Profile-Id"
+TRACE_FRAMES = 10
+TOP_FUNCTIONS = 40
+
+_NAME_RE = re.compile(r"^\d{8}T\d{6}_[0-9a-f]{32}\.(json|prof)$")
+
+
+def admin_authorized(headers: Mapping[str, str], admin_token: str) -> bool:
+	supplied = headers.get(ADMIN_TOKEN_HEADER) or ""
+	return bool(admin_token) and hmac.compare_digest(supplied.encode("utf-8"), admin_token.encode("utf-8"))
+
+
+class ProfileStore:
+	"""Bounded directory of profile files; the oldest are deleted first."""
+
+	def __init__(self, directory: Path, max_files: int = 50):
+		self.directory = Path(directory)
+		self.max_files = max(1, max_files)
+		self._lock = threading.Lock()
+
+	def save(self, request_id: str, summary: Dict[str, Any], profiler: cProfile.Profile) -> str:
+		self.directory.mkdir(parents=True, exist_ok=True)
+		stem = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}_{request_id}"
+		profiler.dump_stats(str(self.directory / f"{stem}.prof"))
+		with (self.directory / f"{stem}.json").open("w", encoding="utf-8") as f:
+			json.dump(summary, f, indent=2)
+		self._prune()
+		return f"{stem}.json"
+
+	def _prune(self) -> None:
+		with self._lock:
+			summaries = sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime)
+			for p in summaries[:-self.max_files]:
+				p.unlink(missing_ok=True)
+				p.with_suffix(".prof").unlink(missing_ok=True)
+
+	def list(self) -> List[Dict[str, Any]]:
+		out: List[Dict[str, Any]] = []
+		if not self.directory.exists():
+			return out
+		for p in sorted(self.directory.glob("*.json"), reverse=True):
+			if not _NAME_RE.match(p.name):
+				continue
+			try:
+				with p.open("r", encoding="utf-8") as f:
+					s = json.load(f)
+			except Exception:
+				continue
+			out.append({
+				"name": p.name,
+				"pstats": p.with_suffix(".prof").name,
+				"request_id": s.get("request_id"),
+				"started": s.get("started"),
+				"wall_ms": s.get("wall_ms"),
+				"peak_kb": s.get("peak_kb"),
+				"reason": s.get("reason"),
+			})
+		return out
+
+	def path(self, name: str) -> Optional[Path]:
+		if not _NAME_RE.match(name or ""):
+			return None
+		p = self.directory / name
+		return p if p.is_file() else None
+
+
+class RequestProfiler:
+	def __init__(
+		self,
+		store: ProfileStore,
+		sample_rate: float = 0.0,
+		admin_token: str = "",
+		trace_memory: bool = True,
+		top_allocations: int = 25,
+	):
+		self.store = store
+		self.sample_rate = max(0.0, min(1.0, sample_rate))
+		self.admin_token = admin_token
+		self.trace_memory = trace_memory
+		self.top_allocations = top_allocations
+		self._busy = threading.Lock()
+		self._lock = threading.Lock()
+		self._in_flight = 0
+		self._max_in_flight = 0
+
+	@contextmanager
+	def track(self) -> Iterator[None]:
+		"""Count /analyze requests in flight around the block (see wants() and session())."""
+		with self._lock:
+			self._in_flight += 1
+			self._max_in_flight = max(self._max_in_flight, self._in_flight)
+		try:
+			yield
+		finally:
+			with self._lock:
+				self._in_flight -= 1
+
+	def wants(self, headers: Mapping[str, str]) -> Optional[str]:
+		"""
+		Why this request should be profiled ("admin" or "sampled"), or None.
+		Sampling skips requests that overlap others, whose allocations would be mixed in.
+		"""
+		requested = (headers.get(PROFILE_HEADER) or "").strip().lower() in PROFILE_ON_VALUES
+		if requested and admin_authorized(headers, self.admin_token):
+			return "admin"
+		if self.sample_rate and self._in_flight <= 1 and random.random() < self.sample_rate:
+			return "sampled"
+		return None
+
+	@contextmanager
+	def session(self, request_id: str, reason: str) -> Iterator[Dict[str, Any]]:
+		"""
+		Profile the enclosed block. Yields a dict that receives "name" (the saved
+		summary file) on exit, or stays empty if another profile was in progress.
+		"""
+		info: Dict[str, Any] = {}
+		if not self._busy.acquire(blocking=False):
+			yield info
+			return
+		started_tracing = False
+		try:
+			if self.trace_memory and not tracemalloc.is_tracing():
+				tracemalloc.start(TRACE_FRAMES)
+				started_tracing = True
+			if tracemalloc.is_tracing():
+				tracemalloc.reset_peak()
+			with self._lock:
+				self._max_in_flight = self._in_flight
+			profiler = cProfile.Profile()
+			started = time.time()
+			t0 = time.perf_counter()
+			with collect_phases() as phases:
+				profiler.enable()
+				try:
+					yield info
+				finally:
+					profiler.disable()
+			wall_ms = (time.perf_counter() - t0) * 1000.0
+			summary: Dict[str, Any] = {
+				"request_id": request_id,
+				"reason": reason,
+				"started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(started)),
+				"wall_ms": round(wall_ms, 3),
+				"phases": [
+					{**{k: v for k, v in p.items() if k != "t0"}, "start_ms": round((p["t0"] - t0) * 1000.0, 3)}
+					for p in sorted(phases, key=lambda p: p["t0"])
+				],
+				"top_functions": self._top_functions(profiler),
+				"max_in_flight": self._max_in_flight,
+			}
+			if tracemalloc.is_tracing():
+				_, peak = tracemalloc.get_traced_memory()
+				summary["peak_kb"] = round(peak / 1024.0, 1)
+				summary["top_allocations"] = self._top_allocations(tracemalloc.take_snapshot())
+			info["name"] = self.store.save(request_id, summary, profiler)
+		finally:
+			if started_tracing:
+				tracemalloc.stop()
+			self._busy.release()
+
+	@staticmethod
+	def _top_functions(profiler: cProfile.Profile) -> str:
+		buf = io.StringIO()
+		pstats.Stats(profiler, stream=buf).strip_dirs().sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+		return buf.getvalue()
+
+	def _top_allocations(self, snapshot: "tracemalloc.Snapshot") -> List[Dict[str, Any]]:
+		snapshot = snapshot.filter_traces((
+			tracemalloc.Filter(False, tracemalloc.__file__),
+			tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+			tracemalloc.Filter(False, "<unknown>"),
+		))
+		out = []
+		for stat in snapshot.statistics("lineno")[:self.top_allocations]:
+			frame = stat.traceback[0]
+			out.append({"where": f"{frame.filename}:{frame.lineno}", "size_kb": round(stat.size / 1024.0, 1), "count": stat.count})
+		return out
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Tests import modules as src.ml.* / src.server.*, like the apps' absolute-import fallbacks
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,103 @@
+import threading
+
+import pytest
+
+from src.server import admission
+from src.server.admission import AdmissionController, Rejected, TokenBucket
+
+
+class _Clock:
+	def __init__(self):
+		self.now = 1000.0
+
+	def __call__(self) -> float:
+		return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+	c = _Clock()
+	monkeypatch.setattr(admission.time, "monotonic", c)
+	return c
+
+
+def test_token_bucket_burst_then_refill(clock):
+	bucket = TokenBucket(rate_per_s=2.0, burst=3)
+	assert [bucket.take() for _ in range(3)] == [0.0, 0.0, 0.0]
+	assert bucket.take() == pytest.approx(0.5)
+	clock.now += 0.5
+	assert bucket.take() == 0.0
+	# Refill is capped at the burst size
+	clock.now += 60.0
+	assert [bucket.take() for _ in range(3)] == [0.0, 0.0, 0.0]
+	assert bucket.take() > 0
+
+
+def test_rate_limit_is_per_client(clock):
+	ctl = AdmissionController(max_concurrent=4, max_queue=4, latency_budget_s=5.0, rate_per_min=60, burst=2)
+	ctl.check("a")
+	ctl.check("a")
+	with pytest.raises(Rejected) as exc:
+		ctl.check("a")
+	assert exc.value.status == 429 and exc.value.reason == "rate_limited"
+	assert exc.value.retry_after == 1
+	ctl.check("b")
+	assert ctl.stats()["rejected_rate_limited"] == 1
+
+
+def test_client_buckets_are_bounded(clock):
+	ctl = AdmissionController(max_concurrent=1, max_queue=0, latency_budget_s=1.0, rate_per_min=60, burst=1, max_clients=2)
+	for key in ("a", "b", "c"):
+		ctl.check(key)
+	assert list(ctl._buckets) == ["b", "c"]
+	# "a" was evicted, so it starts again with a full bucket
+	ctl.check("a")
+
+
+def test_queue_full_and_overloaded(clock):
+	ctl = AdmissionController(max_concurrent=1, max_queue=1, latency_budget_s=2.0)
+	started = ctl.acquire()
+	clock.now += 3.0
+	ctl.release(started)
+	assert ctl.stats()["ewma_service_ms"] == 3000.0
+
+	ctl.acquire()
+	# One slot busy, empty queue: estimated wait 1 * 3s exceeds the 2s budget
+	with pytest.raises(Rejected) as exc:
+		ctl.check()
+	assert (exc.value.status, exc.value.reason, exc.value.retry_after) == (503, "overloaded", 3)
+
+	ctl._waiting = 1
+	with pytest.raises(Rejected) as exc:
+		ctl.check()
+	assert exc.value.reason == "queue_full"
+	assert ctl.stats()["rejected_queue_full"] == 1
+
+
+def test_acquire_waits_for_release():
+	ctl = AdmissionController(max_concurrent=1, max_queue=1, latency_budget_s=5.0)
+	first = ctl.acquire()
+	acquired = threading.Event()
+
+	def waiter():
+		ctl.release(ctl.acquire())
+		acquired.set()
+
+	t = threading.Thread(target=waiter)
+	t.start()
+	assert not acquired.wait(0.1)
+	assert ctl.stats()["waiting"] == 1
+	ctl.release(first)
+	assert acquired.wait(2.0)
+	t.join()
+	stats = ctl.stats()
+	assert (stats["admitted"], stats["completed"], stats["active"], stats["waiting"]) == (2, 2, 0, 0)
+
+
+def test_acquire_times_out_within_budget():
+	ctl = AdmissionController(max_concurrent=1, max_queue=1, latency_budget_s=0.05)
+	ctl.acquire()
+	with pytest.raises(Rejected) as exc:
+		ctl.acquire()
+	assert (exc.value.status, exc.value.reason) == (503, "queue_timeout")
+	assert ctl.stats()["waiting"] == 0
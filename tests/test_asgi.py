@@ -0,0 +1,161 @@
+import asyncio
+import io
+import json
+
+import pytest
+from PIL import Image
+
+from src.server import overlays
+from src.server.asgi import MultipartError, MultipartStreamParser, create_asgi_app
+from src.server.config import AppConfig
+
+BOUNDARY = b"XyZ123"
+
+
+def _multipart(*parts):
+	out = b"preamble\r\n"
+	for headers, data in parts:
+		out += b"--" + BOUNDARY + b"\r\n" + headers + b"\r\n\r\n" + data + b"\r\n"
+	return out + b"--" + BOUNDARY + b"--\r\n"
+
+
+def _parse(chunks):
+	parts = []
+	parser = MultipartStreamParser(
+		BOUNDARY,
+		lambda headers: parts.append([headers, b""]),
+		lambda data: parts[-1].__setitem__(1, parts[-1][1] + data),
+		lambda: None,
+	)
+	for chunk in chunks:
+		parser.feed(chunk)
+	parser.close()
+	return parts
+
+
+BODY = _multipart(
+	(b'Content-Disposition: form-data; name="region"', b"field-7"),
+	(b'Content-Disposition: form-data; name="image"; filename="a.png"\r\nContent-Type: image/png', b"\x89PNG\r\n--XyZ12\r\n" * 3),
+)
+
+
+def test_parser_whole_body():
+	parts = _parse([BODY])
+	assert [p[0]["content-disposition"] for p in parts] == [
+		'form-data; name="region"',
+		'form-data; name="image"; filename="a.png"',
+	]
+	assert parts[0][1] == b"field-7"
+	assert parts[1][1] == b"\x89PNG\r\n--XyZ12\r\n" * 3
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 11])
+def test_parser_any_chunking(size):
+	# Boundaries, CRLFs and header terminators split across every possible chunk edge
+	chunks = [BODY[i:i + size] for i in range(0, len(BODY), size)]
+	assert _parse(chunks) == _parse([BODY])
+
+
+def test_parser_every_split_point():
+	expected = _parse([BODY])
+	for i in range(len(BODY)):
+		assert _parse([BODY[:i], BODY[i:]]) == expected
+
+
+def test_parser_truncated_body():
+	with pytest.raises(MultipartError):
+		_parse([BODY[:-10]])
+
+
+def _call(app, method, path, headers=(), chunks=(b"",)):
+	pending = [{"type": "http.request", "body": c, "more_body": i < len(chunks) - 1} for i, c in enumerate(chunks)]
+	consumed = []
+	sent = []
+
+	async def receive():
+		if pending:
+			consumed.append(pending.pop(0))
+			return consumed[-1]
+		return {"type": "http.disconnect"}
+
+	async def send(message):
+		sent.append(message)
+
+	scope = {"type": "http", "method": method, "path": path, "headers": list(headers), "query_string": b""}
+	asyncio.run(app(scope, receive, send))
+	start = sent[0]
+	return start["status"], dict(start["headers"]), b"".join(m.get("body", b"") for m in sent[1:]), len(consumed)
+
+
+@pytest.fixture()
+def overlays_dir(tmp_path):
+	return tmp_path / "overlays"
+
+
+@pytest.fixture()
+def app(monkeypatch, overlays_dir):
+	monkeypatch.setenv("MAX_IMAGE_SIZE", "1024")
+	monkeypatch.setenv("INFERENCE_BACKEND", "mock")
+	return create_asgi_app(AppConfig(), overlays_dir=overlays_dir)
+
+
+def test_oversized_content_length_is_refused_without_reading(app):
+	status, headers, _, consumed = _call(app, "POST", "/analyze", [
+		(b"content-type", b"multipart/form-data; boundary=" + BOUNDARY),
+		(b"content-length", b"999999999"),
+	], [b"x" * 1024] * 4)
+	assert status == 413 and headers[b"connection"] == b"close"
+	assert consumed == 0
+
+
+def test_oversized_stream_closes_connection(app):
+	chunks = [b"--" + BOUNDARY + b'\r\nContent-Disposition: form-data; name="image"; filename="a.png"\r\n\r\n'] + [b"x" * 65536] * 40
+	status, headers, _, consumed = _call(app, "POST", "/analyze", [
+		(b"content-type", b"multipart/form-data; boundary=" + BOUNDARY),
+	], chunks)
+	assert status == 413 and headers[b"connection"] == b"close"
+	assert consumed < len(chunks)
+
+
+def test_head_overlay_sends_headers_only(app, overlays_dir):
+	tmp = overlays.temp_overlay_path(overlays_dir)
+	tmp.write_bytes(b"not really a png, just overlay bytes")
+	name = overlays.finalize_overlay(tmp, overlays_dir)
+	get = _call(app, "GET", f"/overlays/{name}")
+	head = _call(app, "HEAD", f"/overlays/{name}")
+	assert get[0] == head[0] == 200
+	assert head[2] == b""
+	assert head[1][b"content-length"] == get[1][b"content-length"] == str(len(get[2])).encode()
+	assert head[1][b"etag"] == get[1][b"etag"]
+
+
+def _png_upload():
+	buf = io.BytesIO()
+	Image.new("RGB", (8, 8), (0, 128, 0)).save(buf, format="PNG")
+	body = _multipart((b'Content-Disposition: form-data; name="image"; filename="leaf.png"\r\nContent-Type: image/png', buf.getvalue()))
+	return [(b"content-type", b"multipart/form-data; boundary=" + BOUNDARY), (b"x-api-key", b"client-1")], body
+
+
+def test_admission_rate_limit(monkeypatch, overlays_dir):
+	monkeypatch.setenv("ADMISSION_ENABLED", "1")
+	monkeypatch.setenv("RATE_LIMIT_PER_MIN", "1")
+	monkeypatch.setenv("RATE_LIMIT_BURST", "1")
+	monkeypatch.setenv("INFERENCE_BACKEND", "mock")
+	app = create_asgi_app(AppConfig(), overlays_dir=overlays_dir)
+	headers, body = _png_upload()
+
+	first = _call(app, "POST", "/analyze", headers, [body])
+	assert first[0] == 200 and json.loads(first[2])["ok"] is True
+
+	status, resp_headers, resp_body, consumed = _call(app, "POST", "/analyze", headers, [body])
+	assert status == 429 and json.loads(resp_body)["error"] == "rate_limited"
+	assert resp_headers[b"retry-after"] == b"60" and resp_headers[b"connection"] == b"close"
+	assert consumed == 0
+
+	stats = json.loads(_call(app, "GET", "/stats")[2])
+	assert stats["admission"]["admitted"] == stats["admission"]["completed"] == 1
+	assert stats["admission"]["rejected_rate_limited"] == 1 and stats["admission"]["active"] == 0
+
+
+def test_admission_off_by_default(app):
+	assert json.loads(_call(app, "GET", "/stats")[2])["admission"] is None
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from src.ml.augment import BatchAugmenter, augment_shard, letterbox_batch
+from src.ml.preprocess import preprocess_dataset
+from src.ml.shards import ShardReader, ShardWriter
+
+
+def _batch(b=6, s=64):
+	rng = np.random.default_rng(0)
+	images = rng.integers(0, 256, size=(b, s, s, 3), dtype=np.uint8)
+	labels = [np.array([[i % 3, 0.5, 0.5, 0.4, 0.3], [1, 0.9, 0.1, 0.2, 0.2]], dtype=np.float32) for i in range(b)]
+	return images, labels
+
+
+def _assert_valid(images, labels, b, s):
+	assert images.shape == (b, s, s, 3) and images.dtype == np.uint8
+	assert len(labels) == b
+	for lab in labels:
+		assert lab.shape[1] == 5 and lab.dtype == np.float32
+		x0, y0 = lab[:, 1] - lab[:, 3] / 2, lab[:, 2] - lab[:, 4] / 2
+		x1, y1 = lab[:, 1] + lab[:, 3] / 2, lab[:, 2] + lab[:, 4] / 2
+		eps = 1e-5
+		assert (x0 >= -eps).all() and (y0 >= -eps).all() and (x1 <= 1 + eps).all() and (y1 <= 1 + eps).all()
+		assert (lab[:, 3] * s >= 2 - eps).all() and (lab[:, 4] * s >= 2 - eps).all()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_mosaic_keeps_shapes_and_clips_boxes(seed):
+	images, labels = _batch()
+	aug = BatchAugmenter("heavy", seed=seed, mosaic=1.0)
+	out, out_labels = aug.mosaic(images, labels)
+	_assert_valid(out, out_labels, 6, 64)
+	assert sum(len(l) for l in out_labels) > 0
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_scale_crop_keeps_shapes_and_clips_boxes(seed):
+	images, labels = _batch()
+	out, out_labels = BatchAugmenter("heavy", seed=seed).scale_crop(images, labels)
+	_assert_valid(out, out_labels, 6, 64)
+
+
+def test_scale_crop_identity_preserves_boxes():
+	images, labels = _batch(2)
+	out, out_labels = BatchAugmenter("light", seed=0, scale=0.0, translate=0.0).scale_crop(images, labels)
+	assert np.array_equal(out, images)
+	np.testing.assert_allclose(out_labels[0], labels[0], atol=1e-6)
+
+
+def test_full_pipeline_is_seeded():
+	images, labels = _batch()
+	a, la = BatchAugmenter("heavy", seed=3)(images, labels)
+	b, lb = BatchAugmenter("heavy", seed=3)(images, labels)
+	_assert_valid(a, la, 6, 64)
+	assert np.array_equal(a, b)
+	assert all(np.array_equal(x, y) for x, y in zip(la, lb))
+
+
+def test_letterbox_batch_maps_boxes():
+	im = np.zeros((20, 40, 3), dtype=np.uint8)
+	batch, labels = letterbox_batch([im], [np.array([[0, 0.5, 0.5, 1.0, 1.0]])], 40)
+	assert batch.shape == (1, 40, 40, 3)
+	np.testing.assert_allclose(labels[0], [[0, 0.5, 0.5, 1.0, 0.5]], atol=1e-6)
+
+
+def test_augment_shard_writes_copies(tmp_path):
+	images, labels = _batch(4, 32)
+	with ShardWriter(tmp_path, "train") as writer:
+		for i, (im, lab) in enumerate(zip(images, labels)):
+			writer.add(f"im{i}.jpg", im, lab)
+	stats = augment_shard(tmp_path, "train", copies=2, size=32, batch_size=3)
+	reader = ShardReader(tmp_path, "train_aug")
+	assert stats["images"] == len(reader) == 8
+	assert sorted(reader.names)[:2] == ["im0_aug0.jpg", "im0_aug1.jpg"]
+	assert reader.image(0).shape == (32, 32, 3)
+
+
+def test_augment_copies_require_shards(tmp_path):
+	with pytest.raises(ValueError):
+		preprocess_dataset(tmp_path, tmp_path / "a.csv", tmp_path / "out", augment_copies=1)
@@ -0,0 +1,45 @@
+import json
+
+import pytest
+from PIL import Image
+
+from src.ml.bulk_infer import JsonlSink, ModelLoadError, bulk_score
+
+
+def _images(tmp_path, n):
+	paths = []
+	for i in range(n):
+		p = tmp_path / f"im{i}.png"
+		Image.new("RGB", (32, 32), (i, 0, 0)).save(p)
+		paths.append(str(p))
+	return paths
+
+
+def test_done_paths_retries_failed_rows(tmp_path):
+	out = tmp_path / "scores.jsonl"
+	rows = [
+		{"path": "a.jpg", "ok": True},
+		{"path": "b.jpg", "ok": False},
+		{"path": "c.jpg", "ok": True},
+		{"path": "c.jpg", "ok": False},
+	]
+	out.write_text("".join(json.dumps(r) + "\n" for r in rows) + '{"path": "d.j')
+	assert JsonlSink.done_paths(out) == {"a.jpg"}
+	# The partial line from a killed run is truncated
+	assert out.read_text().endswith("}\n")
+
+
+def test_unloadable_model_aborts_without_rows(tmp_path):
+	out = tmp_path / "scores.jsonl"
+	with pytest.raises(ModelLoadError):
+		bulk_score(_images(tmp_path, 3), out, model_path=str(tmp_path / "missing.pt"), procs=1)
+	assert not out.exists() or out.read_text() == ""
+
+
+def test_mock_run_then_resume_skips_scored(tmp_path):
+	out = tmp_path / "scores.jsonl"
+	paths = _images(tmp_path, 3)
+	stats = bulk_score(paths, out, mock=True, procs=1)
+	assert stats["scored"] == 3 and stats["failed"] == 0
+	stats = bulk_score(paths, out, mock=True, procs=1)
+	assert stats["skipped_existing"] == 3 and stats["scored"] == 0
@@ -0,0 +1,21 @@
+from src.server.config import AppConfig
+
+
+def test_cascade_accept_labels_keep_case_and_dots(monkeypatch):
+	monkeypatch.setenv("CASCADE_ACCEPT_LABELS", " Healthy, .Leaf.Spot ,,No_Defect")
+	assert AppConfig().CASCADE_ACCEPT_LABELS == ("Healthy", ".Leaf.Spot", "No_Defect")
+
+
+def test_cascade_accept_labels_default(monkeypatch):
+	monkeypatch.delenv("CASCADE_ACCEPT_LABELS", raising=False)
+	assert AppConfig().CASCADE_ACCEPT_LABELS == ("Healthy",)
+
+
+def test_allowed_extensions_still_normalized(monkeypatch):
+	monkeypatch.setenv("ALLOWED_EXTENSIONS", ".JPG, png")
+	assert AppConfig().ALLOWED_EXTENSIONS == {"jpg", "png"}
+
+
+def test_admission_off_by_default(monkeypatch):
+	monkeypatch.delenv("ADMISSION_ENABLED", raising=False)
+	assert AppConfig().ADMISSION_ENABLED is False
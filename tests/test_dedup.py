@@ -0,0 +1,55 @@
+import random
+
+from src.ml.dedup import BKTree, group_near_duplicates, hamming
+from src.ml.preprocess_simple import _split_by_group
+
+
+def test_bktree_query_matches_brute_force():
+	rng = random.Random(0)
+	hashes = {f"img{i}.jpg": rng.getrandbits(64) for i in range(200)}
+	# Plant a few close neighbours so small radii return something
+	for i in range(20):
+		hashes[f"near{i}.jpg"] = hashes[f"img{i}.jpg"] ^ (1 << rng.randrange(64))
+	tree = BKTree()
+	for name, h in hashes.items():
+		tree.add(h, name)
+	assert len(tree) == len(hashes)
+
+	for radius in (0, 1, 4, 30):
+		for probe in list(hashes.values())[:25]:
+			expected = sorted((hamming(probe, h), n) for n, h in hashes.items() if hamming(probe, h) <= radius)
+			assert sorted(tree.query(probe, radius)) == expected
+
+
+def test_bktree_keeps_identical_hashes():
+	tree = BKTree()
+	tree.add(0b1010, "a")
+	tree.add(0b1010, "b")
+	assert sorted(tree.query(0b1010, 0)) == [(0, "a"), (0, "b")]
+
+
+def test_group_near_duplicates_is_transitive():
+	hashes = {
+		"a.jpg": 0b0000,
+		"b.jpg": 0b0011,  # 2 from a
+		"c.jpg": 0b1111,  # 2 from b, 4 from a
+		"far.jpg": (1 << 63) | (1 << 40) | (1 << 20) | (1 << 10) | (1 << 5),
+	}
+	groups = group_near_duplicates(hashes, radius=2)
+	assert groups == [["a.jpg", "b.jpg", "c.jpg"], ["far.jpg"]]
+
+
+def test_split_by_group_never_spans_splits():
+	rng = random.Random(1)
+	images = [f"img{i}.jpg" for i in range(100)]
+	groups = {name: rng.randrange(15) for name in images[:70]}
+	rng.shuffle(images)
+
+	train, val, test = _split_by_group(images, groups, n_train=80, n_val=10)
+	assert sorted(train + val + test) == sorted(images)
+	split_of = {}
+	for split, files in (("train", train), ("val", val), ("test", test)):
+		for name in files:
+			if name in groups:
+				split_of.setdefault(groups[name], set()).add(split)
+	assert all(len(splits) == 1 for splits in split_of.values())
@@ -0,0 +1,175 @@
+import hashlib
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.ml import downloader
+
+PAYLOAD = bytes(range(256)) * 64  # 16 KiB
+
+
+class _Server:
+	"""Local stand-in for a file host: Range (optional), ETag/Last-Modified, and optional cut-off responses."""
+
+	def __init__(self):
+		self.data = PAYLOAD
+		self.etag = '"v1"'
+		self.last_modified = "Mon, 05 Oct 2026 10:00:00 GMT"
+		self.cut_after = None  # bytes sent per response before the connection drops
+		self.accept_ranges = True
+		self.ranges = []
+		server = self
+
+		class Handler(BaseHTTPRequestHandler):
+			protocol_version = "HTTP/1.1"
+
+			def log_message(self, *args):
+				pass
+
+			def _headers(self, status, length, extra=()):
+				self.send_response(status)
+				self.send_header("Content-Length", str(length))
+				if server.accept_ranges:
+					self.send_header("Accept-Ranges", "bytes")
+				if server.etag:
+					self.send_header("ETag", server.etag)
+				if server.last_modified:
+					self.send_header("Last-Modified", server.last_modified)
+				for k, v in extra:
+					self.send_header(k, v)
+				self.end_headers()
+
+			def do_HEAD(self):
+				self._headers(200, len(server.data))
+
+			def do_GET(self):
+				data, status, extra = server.data, 200, []
+				rng = self.headers.get("Range")
+				if_range = self.headers.get("If-Range")
+				if rng and server.accept_ranges and (not if_range or if_range in (server.etag, server.last_modified)):
+					start, _, end = rng[len("bytes="):].partition("-")
+					start, end = int(start), int(end) if end else len(data) - 1
+					server.ranges.append(start)
+					data, status = data[start:end + 1], 206
+					extra = [("Content-Range", f"bytes {start}-{end}/{len(server.data)}")]
+				else:
+					server.ranges.append(None)
+				self._headers(status, len(data), extra)
+				if server.cut_after is not None:
+					self.wfile.write(data[:server.cut_after])
+					self.wfile.flush()
+					self.close_connection = True
+					return
+				self.wfile.write(data)
+
+		self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+		self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/data.bin"
+		threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+
+@pytest.fixture()
+def server(monkeypatch):
+	monkeypatch.setattr(downloader, "CHUNK_SIZE", 512)
+	monkeypatch.setattr(downloader, "MIN_SEGMENT_BYTES", 4096)
+	monkeypatch.setattr(downloader, "CHECKPOINT_BYTES", 512)
+	monkeypatch.setattr(downloader.time, "sleep", lambda s: None)
+	srv = _Server()
+	yield srv
+	srv.httpd.shutdown()
+	srv.httpd.server_close()
+
+
+def _download(server, out, **kwargs):
+	session = downloader.make_session(retries=0)
+	return downloader.download(server.url, out, session=session, retries=0, show_progress=False, **kwargs)
+
+
+def _interrupt(server, out, segments):
+	server.cut_after = 1500
+	with pytest.raises(Exception):
+		_download(server, out, segments=segments)
+	server.cut_after = None
+	server.ranges.clear()
+
+
+def test_resumes_segments_after_interruption(server, tmp_path):
+	out = tmp_path / "data.bin"
+	_interrupt(server, out, segments=4)
+	assert out.with_name("data.bin.part.json").exists()
+	_download(server, out, segments=4, sha256=hashlib.sha256(PAYLOAD).hexdigest())
+	assert out.read_bytes() == PAYLOAD
+	# Every segment continued past its start instead of refetching from it
+	assert server.ranges and all(r is not None and r % 4096 > 0 for r in server.ranges)
+
+
+def test_changed_etag_restarts(server, tmp_path):
+	out = tmp_path / "data.bin"
+	_interrupt(server, out, segments=4)
+	server.data = PAYLOAD[::-1]
+	server.etag = '"v2"'
+	_download(server, out, segments=4)
+	assert out.read_bytes() == PAYLOAD[::-1]
+	assert sorted(server.ranges) == [0, 4096, 8192, 12288]
+
+
+def test_no_validators_restarts(server, tmp_path):
+	server.etag = None
+	server.last_modified = None
+	out = tmp_path / "data.bin"
+	_interrupt(server, out, segments=4)
+	_download(server, out, segments=4)
+	assert out.read_bytes() == PAYLOAD
+	assert sorted(server.ranges) == [0, 4096, 8192, 12288]
+
+
+def test_resume_without_etag_uses_last_modified(server, tmp_path):
+	server.etag = None
+	out = tmp_path / "data.bin"
+	_interrupt(server, out, segments=1)
+	_download(server, out, segments=1)
+	assert out.read_bytes() == PAYLOAD
+	assert server.ranges[0] not in (None, 0)
+
+
+def test_sha256_mismatch_removes_partial_files(server, tmp_path):
+	out = tmp_path / "data.bin"
+	with pytest.raises(ValueError, match="SHA-256 mismatch"):
+		_download(server, out, segments=4, sha256=hashlib.sha256(b"something else").hexdigest())
+	assert not out.exists()
+	assert not out.with_name("data.bin.part").exists()
+	assert not out.with_name("data.bin.part.json").exists()
+
+
+def test_no_range_support_uses_single_stream(server, tmp_path):
+	server.accept_ranges = False
+	out = tmp_path / "data.bin"
+	_download(server, out, segments=4, sha256=hashlib.sha256(PAYLOAD).hexdigest())
+	assert out.read_bytes() == PAYLOAD
+	assert server.ranges == [None]
+
+
+def test_no_range_support_restarts_interrupted_download(server, tmp_path):
+	server.accept_ranges = False
+	out = tmp_path / "data.bin"
+	_interrupt(server, out, segments=4)
+	assert 0 < out.with_name("data.bin.part").stat().st_size < len(PAYLOAD)
+	_download(server, out, segments=4)
+	assert out.read_bytes() == PAYLOAD
+	# Without ranges the partial file cannot be continued, so it is fetched whole
+	assert server.ranges == [None]
+
+
+def test_extract_rejects_zip_slip(tmp_path):
+	archive = tmp_path / "a.zip"
+	with zipfile.ZipFile(archive, "w") as zf:
+		zf.writestr("images/ok.jpg", b"ok")
+		zf.writestr("../evil.jpg", b"evil")
+		zf.writestr("images/../../evil2.jpg", b"evil")
+		zf.writestr("notes.txt", b"skip")
+	dest = tmp_path / "out"
+	written = downloader.extract_archive(archive, dest, extensions=["jpg"])
+	assert written == [(dest / "images" / "ok.jpg").resolve()]
+	assert not (tmp_path / "evil.jpg").exists() and not (tmp_path / "evil2.jpg").exists()
+	assert not (dest / "notes.txt").exists()
@@ -0,0 +1,63 @@
+import io
+import json
+
+import pytest
+from PIL import Image
+
+from src.server.encoding import JSON_TYPE, PACKED_TYPE, encode_response, negotiate_format, unpack_payload
+
+
+PAYLOAD = {
+	"ok": True,
+	"request_id": "abc",
+	"result": {"width": 64, "height": 48, "detections": [{"label": "rot", "confidence": 0.9123, "bbox": [1, 2, 30, 40]}]},
+}
+
+
+def test_packed_roundtrip():
+	body, headers = encode_response(PAYLOAD, PACKED_TYPE, None, 0)
+	assert headers["Content-Type"] == PACKED_TYPE
+	assert unpack_payload(body) == PAYLOAD
+
+
+def test_packed_only_when_allowed():
+	assert negotiate_format(f"{PACKED_TYPE}, application/json;q=0.5", packed=False) == JSON_TYPE
+	body, headers = encode_response({"items": [1]}, PACKED_TYPE, None, 0, packed=False)
+	assert headers["Content-Type"] == JSON_TYPE
+	assert json.loads(body) == {"items": [1]}
+
+
+@pytest.fixture()
+def client(tmp_path, monkeypatch):
+	monkeypatch.setenv("HISTORY_ENABLED", "1")
+	monkeypatch.setenv("HISTORY_DB", str(tmp_path / "history.sqlite3"))
+	monkeypatch.setenv("INFERENCE_BACKEND", "mock")
+	from src.server.app import create_app
+	return create_app(overlays_dir=tmp_path / "overlays").test_client()
+
+
+def _upload(client, accept):
+	buf = io.BytesIO()
+	Image.new("RGB", (64, 48), (0, 128, 0)).save(buf, format="PNG")
+	buf.seek(0)
+	return client.post("/analyze", data={"image": (buf, "leaf.png")}, headers={"Accept": accept})
+
+
+def test_analyze_json_is_encoded_once(client):
+	resp = _upload(client, JSON_TYPE)
+	assert resp.status_code == 200 and resp.content_type == JSON_TYPE
+	assert resp.get_json()["result"]["detections"][0]["label"] == "healthy_crop"
+	assert resp.headers["Vary"] == "Accept, Accept-Encoding"
+
+
+def test_analyze_packed(client):
+	resp = _upload(client, PACKED_TYPE)
+	assert resp.content_type == PACKED_TYPE
+	assert unpack_payload(resp.data)["result"]["width"] == 64
+
+
+def test_history_pages_never_packed(client):
+	_upload(client, JSON_TYPE)
+	resp = client.get("/history/analyses", headers={"Accept": PACKED_TYPE})
+	assert resp.status_code == 200 and resp.content_type == JSON_TYPE
+	assert "items" in resp.get_json()
@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.ml.evaluate import Evaluator, ap_per_class, box_iou, load_names, load_split, match_predictions, update_confusion
+from src.ml.preprocess_simple import convert_dataset_to_yolo_simple
+
+
+def test_box_iou_values():
+	a = np.array([[0, 0, 10, 10], [0, 0, 10, 10]], dtype=float)
+	b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]], dtype=float)
+	iou = box_iou(a, b)
+	assert iou.shape == (2, 3)
+	np.testing.assert_allclose(iou[0], [1.0, 50 / 150, 0.0])
+
+
+def test_match_predictions_requires_same_class():
+	thresholds = np.array([0.5, 0.95])
+	gt = np.array([[0, 0, 10, 10]], dtype=float)
+	pred = np.array([[0, 0, 10, 10], [0, 0, 10, 9]], dtype=float)
+	tp = match_predictions(np.array([1, 0]), np.array([0]), box_iou(gt, pred), thresholds)
+	# The exact box has the wrong class; the slightly smaller one only clears 0.5
+	assert tp.tolist() == [[False, False], [True, False]]
+
+
+def test_ap_per_class_perfect_predictions():
+	tp = np.ones((4, 10), dtype=bool)
+	conf = np.array([0.9, 0.8, 0.7, 0.6])
+	cls = np.array([0, 1, 0, 1])
+	m = ap_per_class(tp, conf, cls, cls, nc=2)
+	np.testing.assert_allclose(m["ap"], 1.0)
+	assert m["instances"].tolist() == [2, 2]
+
+
+def test_evaluator_perfect_predictions_give_map_one():
+	ev = Evaluator(["weed", "crop"])
+	rng = np.random.default_rng(0)
+	for _ in range(5):
+		xy = rng.uniform(0, 500, size=(3, 2))
+		boxes = np.concatenate([xy, xy + rng.uniform(20, 100, size=(3, 2))], axis=1)
+		cls = rng.integers(0, 2, size=3)
+		ev.add(boxes, rng.uniform(0.5, 1.0, size=3), cls, boxes, cls)
+	summary = ev.summary()
+	assert summary["images"] == 5 and summary["instances"] == 15
+	assert summary["map50"] == pytest.approx(1.0)
+	assert summary["map50_95"] == pytest.approx(1.0)
+	assert summary["precision"] == pytest.approx(1.0) and summary["recall"] == pytest.approx(1.0)
+
+
+def test_evaluator_misses_lower_recall():
+	ev = Evaluator(["weed"])
+	gt = np.array([[0, 0, 10, 10], [20, 20, 30, 30]], dtype=float)
+	ev.add(gt[:1], np.array([0.9]), np.array([0]), gt, np.array([0, 0]))
+	summary = ev.summary()
+	assert summary["recall"] == pytest.approx(0.5)
+	assert summary["map50"] < 1.0
+
+
+def test_competing_predictions_match_one_to_one():
+	thresholds = np.array([0.5])
+	gt = np.array([[0, 0, 100, 100]], dtype=float)
+	# Higher IoU wins the ground truth, whatever the confidence order
+	pred = np.array([[0, 0, 100, 70], [0, 0, 100, 95]], dtype=float)
+	tp = match_predictions(np.array([0, 0]), np.array([0]), box_iou(gt, pred), thresholds)
+	assert tp[:, 0].tolist() == [False, True]
+
+	ev = Evaluator(["weed"])
+	ev.add(pred, np.array([0.9, 0.8]), np.array([0, 0]), gt, np.array([0]))
+	summary = ev.summary()
+	# The false positive outranks the match: precision is 1/2 when recall reaches 1
+	assert summary["map50"] == pytest.approx(0.5)
+
+
+def test_map50_95_counts_thresholds_cleared():
+	ev = Evaluator(["weed"])
+	gt = np.array([[0, 0, 100, 100]], dtype=float)
+	# IoU 0.72 clears 0.50..0.70 (5 of the 10 thresholds)
+	ev.add(np.array([[0, 0, 100, 72]], dtype=float), np.array([0.9]), np.array([0]), gt, np.array([0]))
+	summary = ev.summary()
+	assert summary["map50"] == pytest.approx(1.0)
+	assert summary["map50_95"] == pytest.approx(0.5)
+
+
+def test_update_confusion_background_counts():
+	matrix = np.zeros((3, 3), dtype=np.int64)
+	gt_boxes = np.array([[0, 0, 10, 10], [20, 20, 30, 30], [40, 40, 50, 50]], dtype=float)
+	gt_cls = np.array([0, 1, 1])
+	pred_boxes = np.array([
+		[0, 0, 10, 10],  # class 0 predicted as 1
+		[20, 20, 30, 30],  # correct
+		[60, 60, 70, 70],  # nothing there: background -> 0
+		[40, 40, 50, 50],  # below the confidence cut: class 1 missed
+	], dtype=float)
+	update_confusion(matrix, pred_boxes, np.array([0.9, 0.9, 0.9, 0.1]), np.array([1, 1, 0, 1]), gt_boxes, gt_cls)
+	assert matrix.tolist() == [
+		[0, 1, 0],
+		[0, 1, 1],
+		[1, 0, 0],
+	]
+
+
+def test_load_split_reads_preprocess_simple_output(tmp_path):
+	images = tmp_path / "raw"
+	images.mkdir()
+	labels = [f"class_{i:02d}" for i in range(12)]
+	records = []
+	for i, label in enumerate(labels):
+		Image.new("RGB", (200, 100), (i * 20, 0, 0)).save(images / f"img{i}.jpg")
+		records.append({"filename": f"img{i}.jpg", "xmin": 10, "ymin": 20, "xmax": 110, "ymax": 80, "label": label})
+	out = tmp_path / "yolo"
+	convert_dataset_to_yolo_simple(images, tmp_path / "unused.csv", out, splits=(0.0, 0.0, 1.0), records=records)
+
+	# Ids above 9 must sort numerically, not as strings
+	assert load_names(out) == labels
+	items = load_split(out, "test")
+	assert len(items) == 12
+	for path, boxes, cls in items:
+		i = int(path.stem[len("img"):])
+		assert cls.tolist() == [i]
+		np.testing.assert_allclose(boxes, [[10, 20, 110, 80]], atol=0.01)
@@ -0,0 +1,68 @@
+import pytest
+
+from src.server.history import HistoryStore, parse_filters
+
+
+@pytest.fixture()
+def store(tmp_path):
+	s = HistoryStore(tmp_path / "history.sqlite3", batch_size=4, flush_interval_s=0.01)
+	yield s
+	s.close()
+
+
+def _result(n):
+	return {"width": 64, "height": 64, "detections": [
+		{"label": "rot", "confidence": 0.5, "bbox": [0, 0, 10, 10]} for _ in range(n)
+	]}
+
+
+def _pages(query, limit, **extra):
+	seen, cursor = [], None
+	while True:
+		args = {"limit": str(limit), **extra}
+		if cursor:
+			args["cursor"] = cursor
+		page = query(parse_filters(args))
+		assert len(page["items"]) <= limit
+		seen.extend(page["items"])
+		cursor = page["next_cursor"]
+		if cursor is None:
+			return seen
+
+
+def test_keyset_pagination_across_equal_timestamps(store):
+	# 7 analyses share one timestamp, between an older and a newer one
+	store.record("old", _result(1), created=1000.0)
+	for i in range(7):
+		store.record(f"same{i}", _result(2), created=2000.0)
+	store.record("new", _result(1), created=3000.0)
+	assert store.flush()
+
+	analyses = _pages(store.query_analyses, 3)
+	ids = [a["request_id"] for a in analyses]
+	assert ids == ["new"] + [f"same{i}" for i in reversed(range(7))] + ["old"]
+
+	boxes = _pages(store.query_detections, 4)
+	assert len(boxes) == 16
+	assert len({b["id"] for b in boxes}) == 16
+	assert [b["request_id"] for b in boxes[:3]] == ["new", "same6", "same6"]
+
+
+def test_bad_record_does_not_stop_writer(store):
+	store.record("good1", _result(1), created=1.0)
+	store.record("bad", {"detections": [{"label": "x", "confidence": "high"}]}, created=2.0)
+	store.record("good2", _result(1), created=3.0)
+	assert store.flush()
+	assert [a["request_id"] for a in store.query_analyses({})["items"]] == ["good2", "good1"]
+	stats = store.stats()
+	assert stats["write_errors"] == 1 and stats["analyses_written"] == 2
+	# The writer is still alive and the queue is fully accounted for
+	store.record("good3", _result(0), created=4.0)
+	assert store.flush()
+	assert store._queue.unfinished_tasks == 0
+	assert store.query_analyses({"limit": 1})["items"][0]["request_id"] == "good3"
+
+
+def test_flush_after_close_returns_false(store):
+	store.close()
+	assert store.flush(timeout=0.1) is False
@@ -0,0 +1,121 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.ml import inference, video
+
+
+def _frames(n=3, h=40, w=60):
+	return [np.zeros((h, w, 3), dtype=np.uint8) for _ in range(n)]
+
+
+class _BrokenModel:
+	names = {0: "x"}
+
+	def predict(self, *args, **kwargs):
+		raise ValueError("boom")
+
+
+def test_detect_batch_missing_model_raises(tmp_path):
+	with pytest.raises(RuntimeError):
+		inference.detect_batch(_frames(), str(tmp_path / "missing.pt"))
+
+
+def test_detect_batch_mock_only_when_selected(tmp_path):
+	out = inference.detect_batch(_frames(2), str(tmp_path / "missing.pt"), mock=True)
+	assert [r["detections"][0]["bbox"] for r in out] == [[6, 4, 54, 36]] * 2
+
+
+def test_detect_batch_prediction_failure_is_explicit(monkeypatch):
+	monkeypatch.setattr(inference, "load_model", lambda path: _BrokenModel())
+	out = inference.detect_batch(_frames(2), "model.pt")
+	assert all(r["detections"] == [] and "ValueError: boom" in r["error"] for r in out)
+	assert (out[0]["width"], out[0]["height"]) == (60, 40)
+
+
+def test_detect_image_missing_model_raises(tmp_path):
+	with pytest.raises(RuntimeError):
+		inference.detect_image(str(tmp_path / "img.png"), model_path=str(tmp_path / "missing.pt"))
+
+
+def test_process_stream_reports_failed_batches(monkeypatch):
+	monkeypatch.setattr(video, "load_model", lambda path: _BrokenModel())
+	monkeypatch.setattr(inference, "load_model", lambda path: _BrokenModel())
+	stats = {}
+	events = list(video.process_stream(_frames(4), model_path="model.pt", batch_size=2, stats=stats))
+	assert len(events) == 4
+	assert all(ev["detections"] == [] and "error" in ev for ev in events)
+	assert stats["failed"] == stats["inferred"] > 0
+
+
+def test_process_stream_refuses_missing_model(tmp_path):
+	with pytest.raises(RuntimeError):
+		next(video.process_stream(_frames(1), model_path=str(tmp_path / "missing.pt")))
+
+
+class _Classifier:
+	names = {0: "Healthy", 1: "Defective"}
+
+	def __init__(self, verdict):
+		self.verdict = verdict
+
+	def predict(self, *args, **kwargs):
+		if isinstance(self.verdict, Exception):
+			raise self.verdict
+		label, conf = self.verdict
+		top1 = [k for k, v in self.names.items() if v == label][0]
+		return [SimpleNamespace(probs=SimpleNamespace(top1=top1, top1conf=conf), names=self.names)]
+
+
+def _cascade(monkeypatch, tmp_path, verdict, classifier_path="cls.pt"):
+	img = tmp_path / "img.png"
+	Image.new("RGB", (60, 40)).save(img)
+	monkeypatch.setattr(inference, "load_model", lambda path: _Classifier(verdict) if path == "cls.pt" else None)
+	monkeypatch.setattr(inference, "detect_image", lambda path, overlay, model_path=None: {"detections": [], "width": 60, "height": 40})
+	monkeypatch.setattr(inference, "_CASCADE_COUNTS", {})
+	return inference.cascade_detect(str(img), classifier_path=classifier_path)
+
+
+def test_cascade_confident_accept_skips_detector(monkeypatch, tmp_path):
+	out = _cascade(monkeypatch, tmp_path, ("Healthy", 0.97))
+	assert out["stage"] == "classifier"
+	assert out["detections"] == [{"label": "Healthy", "confidence": 0.97, "bbox": [0, 0, 59, 39]}]
+	assert inference.cascade_stats() == {"classifier": 1}
+
+
+@pytest.mark.parametrize("verdict", [("Healthy", 0.6), ("Defective", 0.99)])
+def test_cascade_falls_through_to_detector(monkeypatch, tmp_path, verdict):
+	out = _cascade(monkeypatch, tmp_path, verdict)
+	assert out["stage"] == "detector"
+	assert out["cascade"] == {"label": verdict[0], "confidence": verdict[1]}
+	assert inference.cascade_stats() == {"detector": 1}
+
+
+def test_cascade_without_classifier_reports_bypass(monkeypatch, tmp_path):
+	monkeypatch.delenv("CLASSIFIER_PATH", raising=False)
+	out = _cascade(monkeypatch, tmp_path, None, classifier_path=None)
+	assert out["stage"] == "detector" and out["cascade"] == {"bypass": "no_classifier"}
+	assert inference.cascade_stats() == {"bypass_no_classifier": 1}
+
+
+def test_cascade_classifier_failure_reports_bypass(monkeypatch, tmp_path):
+	out = _cascade(monkeypatch, tmp_path, ValueError("bad tensor"))
+	assert out["stage"] == "detector"
+	assert out["cascade"] == {"bypass": "classifier_error", "error": "ValueError: bad tensor"}
+	assert inference.cascade_stats() == {"bypass_classifier_error": 1}
+
+
+def test_cascade_missing_classifier_raises(monkeypatch, tmp_path):
+	with pytest.raises(RuntimeError, match="classifier"):
+		_cascade(monkeypatch, tmp_path, ("Healthy", 0.99), classifier_path="missing.pt")
+
+
+def test_classify_image_surfaces_errors(monkeypatch):
+	monkeypatch.setattr(inference, "load_model", lambda path: None)
+	with pytest.raises(RuntimeError):
+		inference.classify_image("img.png", "missing.pt")
+	monkeypatch.setattr(inference, "load_model", lambda path: _BrokenModel())
+	with pytest.raises(ValueError):
+		inference.classify_image("img.png", "cls.pt")
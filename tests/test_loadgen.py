@@ -0,0 +1,111 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.server import loadgen
+
+
+@pytest.mark.parametrize("pct, expected", [(0, 1), (10, 1), (11, 2), (50, 5), (90, 9), (95, 10), (99, 10), (100, 10)])
+def test_percentile_nearest_rank(pct, expected):
+	assert loadgen.percentile([float(v) for v in range(1, 11)], pct) == expected
+
+
+def test_percentile_edges():
+	assert loadgen.percentile([], 50) is None
+	assert loadgen.percentile([7.0], 99) == 7.0
+
+
+def _step(mode, load, rps, error_rate=0.0, p99=10.0):
+	step = {"mode": mode, "throughput_rps": rps, "error_rate": error_rate, "p99_ms": p99}
+	step["concurrency" if mode == "closed" else "offered_rps"] = load
+	return step
+
+
+def test_saturation_closed_loop_flat_throughput():
+	steps = [_step("closed", 1, 10.0), _step("closed", 2, 19.0), _step("closed", 4, 19.5)]
+	sat = loadgen.find_saturation(steps, max_error_rate=0.01, slo_ms=0)
+	assert (sat["step"], sat["load"]) == (2, 4) and "flat" in sat["reason"]
+
+
+def test_saturation_errors_and_slo():
+	steps = [_step("closed", 1, 10.0), _step("closed", 2, 20.0, error_rate=0.05)]
+	assert loadgen.find_saturation(steps, 0.01, 0)["step"] == 1
+	steps = [_step("closed", 1, 10.0, p99=80.0), _step("closed", 2, 20.0, p99=250.0)]
+	assert loadgen.find_saturation(steps, 0.01, 200.0)["reason"] == "p99 250.0 ms > 200.0 ms"
+	assert loadgen.find_saturation(steps, 0.01, 0) is None
+
+
+def test_saturation_open_loop_shortfall():
+	steps = [_step("open", 5.0, 5.0), _step("open", 10.0, 9.5), _step("open", 20.0, 12.0)]
+	sat = loadgen.find_saturation(steps, 0.01, 0)
+	assert (sat["step"], sat["load"]) == (2, 20.0)
+
+
+class _Server:
+	"""Stub /analyze: answers 200, or 503 for every reject_every-th request."""
+
+	def __init__(self, reject_every=0):
+		self.requests = 0
+		self.bodies = []
+		lock = threading.Lock()
+		server = self
+
+		class Handler(BaseHTTPRequestHandler):
+			protocol_version = "HTTP/1.1"
+
+			def log_message(self, *args):
+				pass
+
+			def do_POST(self):
+				body = self.rfile.read(int(self.headers["Content-Length"]))
+				with lock:
+					server.requests += 1
+					n = server.requests
+					server.bodies.append(body)
+				status = 503 if reject_every and n % reject_every == 0 else 200
+				self.send_response(status)
+				self.send_header("Content-Length", "2")
+				self.end_headers()
+				self.wfile.write(b"{}")
+
+		self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+		self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/analyze"
+		threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+	def close(self):
+		self.httpd.shutdown()
+		self.httpd.server_close()
+
+
+@pytest.fixture()
+def bodies(tmp_path):
+	out = []
+	for name in ("a.png", "b.png"):
+		(tmp_path / name).write_bytes(name.encode() * 10)
+		out.append(loadgen.build_multipart(tmp_path / name))
+	return out
+
+
+def test_closed_loop_against_stub(bodies):
+	srv = _Server(reject_every=4)
+	try:
+		step = loadgen.run_closed_loop(srv.url, bodies, concurrency=3, duration_s=0.3, timeout=5.0, headers={})
+	finally:
+		srv.close()
+	assert step["mode"] == "closed" and step["concurrency"] == 3
+	assert step["requests"] == srv.requests > 4
+	assert step["statuses"]["503"] == srv.requests // 4
+	assert step["ok"] == step["statuses"]["200"]
+	assert step["error_rate"] == pytest.approx(step["errors"] / step["requests"], abs=1e-4)
+	assert step["p50_ms"] <= step["p99_ms"] <= step["max_ms"]
+	# Both images are sent round-robin
+	assert any(b"a.png" in b for b in srv.bodies) and any(b"b.png" in b for b in srv.bodies)
+
+
+def test_closed_loop_counts_connection_errors(bodies):
+	srv = _Server()
+	srv.close()
+	step = loadgen.run_closed_loop(srv.url, bodies, concurrency=1, duration_s=0.1, timeout=1.0, headers={})
+	assert step["ok"] == 0 and step["error_rate"] == 1.0
+	assert step["p99_ms"] is None and "ConnectionRefusedError" in step["statuses"]
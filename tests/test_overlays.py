@@ -0,0 +1,116 @@
+import uuid
+from pathlib import Path
+
+import pytest
+
+from src.server import overlays
+
+
+def _write(overlays_dir: Path, data: bytes) -> str:
+	tmp = overlays.temp_overlay_path(overlays_dir)
+	tmp.write_bytes(data)
+	return overlays.finalize_overlay(tmp, overlays_dir)
+
+
+def test_finalize_renames_to_content_hash(tmp_path):
+	name = _write(tmp_path, b"overlay one")
+	assert overlays.is_overlay_name(name)
+	assert (tmp_path / name).read_bytes() == b"overlay one"
+	assert [p.name for p in tmp_path.iterdir()] == [name]
+
+
+def test_finalize_dedups_identical_overlays(tmp_path):
+	first = _write(tmp_path, b"same pixels")
+	second = _write(tmp_path, b"same pixels")
+	other = _write(tmp_path, b"other pixels")
+	assert first == second != other
+	assert sorted(p.name for p in tmp_path.iterdir()) == sorted([first, other])
+
+
+def test_finalize_without_file(tmp_path):
+	assert overlays.finalize_overlay(tmp_path / "missing.png", tmp_path) is None
+
+
+def test_legacy_uuid_names_are_not_content_addressed():
+	assert not overlays.is_overlay_name(f"{uuid.uuid4().hex}.png")
+	assert not overlays.is_overlay_name("../" + "a" * overlays.HASH_LEN + ".png")
+	assert overlays.is_overlay_name("a" * overlays.HASH_LEN + ".png")
+
+
+@pytest.mark.parametrize("header, expected", [
+	(None, False),
+	("", False),
+	("*", True),
+	(' "abc" ', True),
+	('W/"abc"', True),
+	('"xyz", W/"abc"', True),
+	('"xyz","abc"', True),
+	('"abcd"', False),
+	("abc", False),
+])
+def test_etag_matches(header, expected):
+	assert overlays.etag_matches(header, "abc") is expected
+
+
+def test_cache_headers():
+	name = "b" * overlays.HASH_LEN + ".png"
+	assert overlays.cache_headers(name, 60) == {
+		"Cache-Control": "public, max-age=60, immutable",
+		"ETag": f'"{"b" * overlays.HASH_LEN}"',
+	}
+
+
+def test_offload_headers(tmp_path):
+	path = tmp_path / "x.png"
+	assert overlays.offload_headers("", "x.png", path, "/p/") == {}
+	assert overlays.offload_headers("X-Accel-Redirect", "x.png", path, "/_protected/overlays") == {"X-Accel-Redirect": "/_protected/overlays/x.png"}
+	assert overlays.offload_headers("x-sendfile", "x.png", path, "/p/") == {"X-Sendfile": str(path.resolve())}
+
+
+def _client(monkeypatch, tmp_path, sendfile=""):
+	monkeypatch.setenv("INFERENCE_BACKEND", "mock")
+	monkeypatch.setenv("OVERLAY_SENDFILE", sendfile)
+	from src.server.app import create_app
+	overlays_dir = tmp_path / "overlays"
+	client = create_app(overlays_dir=overlays_dir).test_client()
+	return client, overlays_dir, _write(overlays_dir, b"overlay bytes")
+
+
+def test_flask_serves_immutable_overlay(monkeypatch, tmp_path):
+	client, _, name = _client(monkeypatch, tmp_path)
+	resp = client.get(f"/overlays/{name}")
+	assert resp.status_code == 200 and resp.data == b"overlay bytes"
+	assert resp.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+	assert resp.headers["ETag"] == f'"{overlays.overlay_etag(name)}"'
+
+
+def test_flask_not_modified(monkeypatch, tmp_path):
+	client, _, name = _client(monkeypatch, tmp_path)
+	etag = client.get(f"/overlays/{name}").headers["ETag"]
+	resp = client.get(f"/overlays/{name}", headers={"If-None-Match": f"W/{etag}"})
+	assert resp.status_code == 304 and resp.data == b""
+	assert resp.headers["ETag"] == etag
+
+
+def test_flask_rejects_unknown_and_legacy_names(monkeypatch, tmp_path):
+	client, overlays_dir, _ = _client(monkeypatch, tmp_path)
+	legacy = f"{uuid.uuid4().hex}.png"
+	(overlays_dir / legacy).write_bytes(b"legacy")
+	assert client.get(f"/overlays/{legacy}").status_code == 404
+	assert client.get("/overlays/" + "0" * overlays.HASH_LEN + ".png").status_code == 404
+
+
+def test_flask_x_accel_redirect(monkeypatch, tmp_path):
+	monkeypatch.setenv("OVERLAY_ACCEL_PREFIX", "/_protected/overlays/")
+	client, _, name = _client(monkeypatch, tmp_path, "x-accel-redirect")
+	resp = client.get(f"/overlays/{name}")
+	assert resp.status_code == 200 and resp.data == b""
+	assert resp.headers["X-Accel-Redirect"] == f"/_protected/overlays/{name}"
+	assert "immutable" in resp.headers["Cache-Control"]
+
+
+def test_flask_x_sendfile(monkeypatch, tmp_path):
+	client, overlays_dir, name = _client(monkeypatch, tmp_path, "x-sendfile")
+	resp = client.get(f"/overlays/{name}")
+	assert resp.status_code == 200 and resp.data == b""
+	assert resp.headers["X-Sendfile"] == str((overlays_dir / name).resolve())
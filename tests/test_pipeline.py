@@ -0,0 +1,49 @@
+from pathlib import Path
+
+from src.ml.pipeline import Pipeline, Stage
+
+
+def _write_stage(inputs, out_dir, names):
+	for name in names.split(","):
+		path = Path(out_dir) / name
+		path.parent.mkdir(parents=True, exist_ok=True)
+		path.write_text(name)
+	return {"written": names}
+
+
+def _pipeline(tmp_path, names, force=False):
+	pipe = Pipeline(tmp_path / ".cache", force=force)
+	pipe.add(Stage(
+		"write", _write_stage,
+		params={"out_dir": tmp_path / "out", "names": names},
+		sources=[tmp_path / "out" / "raw"],
+		outputs=[tmp_path / "out"],
+	))
+	return pipe
+
+
+def test_rerun_removes_only_recorded_files(tmp_path):
+	out = tmp_path / "out"
+	(out / "raw").mkdir(parents=True)
+	(out / "raw" / "input.jpg").write_text("input")
+	(out / "notes.txt").write_text("kept")
+
+	reports = _pipeline(tmp_path, "a.txt,b.txt").run()
+	assert reports["write"]["status"] == "ran"
+	assert _pipeline(tmp_path, "a.txt,b.txt").run()["write"]["status"] == "cached"
+
+	# Changed params: b.txt from the previous run is stale and removed; files the
+	# stage never wrote, and the raw input directory, are left alone
+	_pipeline(tmp_path, "a.txt,c.txt").run()
+	assert sorted(p.name for p in out.iterdir()) == ["a.txt", "c.txt", "notes.txt", "raw"]
+	assert (out / "raw" / "input.jpg").read_text() == "input"
+
+
+def test_sources_are_never_deleted(tmp_path):
+	out = tmp_path / "out"
+	_pipeline(tmp_path, "raw/x.jpg,a.txt").run()
+	assert (out / "raw" / "x.jpg").exists()
+	_pipeline(tmp_path, "a.txt", force=True).run()
+	# x.jpg was written by the stage but lives under a source path
+	assert (out / "raw" / "x.jpg").exists()
+	assert (out / "a.txt").exists()
@@ -0,0 +1,46 @@
+import io
+import json
+
+from PIL import Image
+
+from src.server.profiling import ProfileStore, RequestProfiler
+
+
+def test_sampling_skips_overlapping_requests(tmp_path):
+	profiler = RequestProfiler(ProfileStore(tmp_path), sample_rate=1.0)
+	with profiler.track():
+		assert profiler.wants({}) == "sampled"
+		with profiler.track():
+			assert profiler.wants({}) is None
+
+
+def test_profile_header_must_be_on(tmp_path):
+	profiler = RequestProfiler(ProfileStore(tmp_path), admin_token="secret")
+	for value in ("1", "true", "On"):
+		assert profiler.wants({"X-Profile": value, "X-Admin-Token": "secret"}) == "admin"
+	for value in ("0", "false", "off", "", "no"):
+		assert profiler.wants({"X-Profile": value, "X-Admin-Token": "secret"}) is None
+	assert profiler.wants({"X-Profile": "1", "X-Admin-Token": "wrong"}) is None
+
+
+def test_admin_profile_records_upload_and_overlap(tmp_path, monkeypatch):
+	monkeypatch.setenv("ADMIN_TOKEN", "secret")
+	monkeypatch.setenv("PROFILE_DIR", str(tmp_path))
+	monkeypatch.setenv("INFERENCE_BACKEND", "mock")
+	from src.server.app import create_app
+	app = create_app(overlays_dir=tmp_path / "overlays")
+	buf = io.BytesIO()
+	Image.new("RGB", (32, 32)).save(buf, format="PNG")
+	buf.seek(0)
+	resp = app.test_client().post(
+		"/analyze",
+		data={"image": (buf, "leaf.png")},
+		headers={"X-Profile": "1", "X-Admin-Token": "secret"},
+	)
+	assert resp.status_code == 200
+	summary = json.loads((tmp_path / resp.headers["X-Profile-Id"]).read_text())
+	names = [p["name"] for p in summary["phases"]]
+	# The multipart body is parsed inside the upload phase, before the file is saved
+	assert names.index("upload") < names.index("save_upload")
+	assert summary["max_in_flight"] == 1
+	assert "peak_kb" in summary
@@ -0,0 +1,74 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.ml.shards import ShardReader, ShardWriter, attach_shard_to_yolo_dataset, extend_yolo_dataset_with_shard
+
+
+def _write_shard(tmp_path: Path, n: int, size: int = 32) -> ShardReader:
+	with ShardWriter(tmp_path, "train") as writer:
+		for i in range(n):
+			image = np.full((size, size, 3), i, dtype=np.uint8)
+			writer.add(f"im{i}.jpg", image, np.array([[0, 0.5, 0.5, 0.2, 0.2]]))
+	return ShardReader(tmp_path, "train")
+
+
+def _dataset(n: int, size: int = 32, augment: bool = True, max_buffer_length: int = 3) -> SimpleNamespace:
+	# The attributes BaseDataset.load_image reads and writes
+	return SimpleNamespace(
+		im_files=[f"images/train/im{i}.jpg" for i in range(n)],
+		imgsz=size,
+		augment=augment,
+		cache=None,
+		buffer=[],
+		max_buffer_length=max_buffer_length,
+		ims=[None] * n,
+		im_hw0=[None] * n,
+		im_hw=[None] * n,
+	)
+
+
+def test_loader_reads_pixels_as_bgr(tmp_path):
+	reader = _write_shard(tmp_path, 2)
+	ds = _dataset(2, augment=False)
+	attach_shard_to_yolo_dataset(ds, reader)
+	im, hw0, hw = ds.load_image(1)
+	assert im.shape == (32, 32, 3) and hw0 == (32, 32) and hw == (32, 32)
+	assert (im == 1).all()
+	assert ds.buffer == []
+
+
+def test_loader_fills_and_evicts_mosaic_buffer(tmp_path):
+	reader = _write_shard(tmp_path, 5)
+	ds = _dataset(5, max_buffer_length=3)
+	attach_shard_to_yolo_dataset(ds, reader)
+	for i in range(5):
+		ds.load_image(i)
+	# Evicted as soon as the buffer reaches max_buffer_length, as in ultralytics
+	assert ds.buffer == [3, 4]
+	assert all(ds.ims[i] is None and ds.im_hw0[i] is None for i in range(3))
+	assert all(ds.ims[i] is not None for i in ds.buffer)
+	# Buffered images are served from RAM without being added twice
+	im, hw0, _ = ds.load_image(4)
+	assert im is ds.ims[4] and hw0 == (32, 32)
+	assert ds.buffer == [3, 4]
+
+
+def test_extend_adds_augmented_samples(tmp_path):
+	reader = _write_shard(tmp_path, 2)
+	with ShardWriter(tmp_path, "train_aug") as writer:
+		for i in range(3):
+			writer.add(f"im{i}_aug0.jpg", np.full((32, 32, 3), 10 + i, dtype=np.uint8), np.array([[1, 0.5, 0.5, 0.4, 0.4]]))
+	ds = _dataset(2)
+	ds.labels = [{"im_file": f} for f in ds.im_files]
+	attach_shard_to_yolo_dataset(ds, reader)
+	added = extend_yolo_dataset_with_shard(ds, ShardReader(tmp_path, "train_aug"))
+	assert added == 3 and ds.ni == 5
+	assert len(ds.im_files) == len(ds.ims) == len(ds.im_hw0) == len(ds.im_hw) == 5
+	lab = ds.labels[3]
+	assert lab["shape"] == (32, 32) and lab["cls"].tolist() == [[1.0]]
+	np.testing.assert_allclose(lab["bboxes"], [[0.5, 0.5, 0.4, 0.4]])
+	# Original and augmented samples are both read from their shards
+	assert (ds.load_image(1)[0] == 1).all()
+	assert (ds.load_image(4)[0] == 12).all()
@@ -0,0 +1,98 @@
+import random
+import statistics
+import time
+
+import pytest
+from PIL import Image
+
+from src.ml.synthetic import SyntheticBackend
+
+
+def _image(tmp_path, name="leaf.png", color=(0, 128, 0)):
+	path = tmp_path / name
+	Image.new("RGB", (320, 240), color).save(path)
+	return str(path)
+
+
+def test_latency_varies_per_request_for_one_image(tmp_path, monkeypatch):
+	img = _image(tmp_path)
+	slept = []
+	monkeypatch.setattr("src.ml.synthetic.time.sleep", slept.append)
+	backend = SyntheticBackend(latency_ms=50, distribution="uniform", jitter=0.5, cpu_fraction=0.0)
+	for _ in range(20):
+		backend.detect(img)
+	assert len(set(slept)) == 20
+
+	# Same seed replays the same latency sequence
+	replay = []
+	monkeypatch.setattr("src.ml.synthetic.time.sleep", replay.append)
+	again = SyntheticBackend(latency_ms=50, distribution="uniform", jitter=0.5, cpu_fraction=0.0)
+	for _ in range(20):
+		again.detect(img)
+	assert replay == slept
+
+
+def test_detections_are_deterministic_per_image_and_seed(tmp_path):
+	a, b = _image(tmp_path, "a.png"), _image(tmp_path, "b.png", (90, 40, 10))
+	backend = SyntheticBackend(latency_ms=0, boxes=5.0, seed=7)
+	first = backend.detect(a)
+	assert backend.detect(a) == first
+	assert SyntheticBackend(latency_ms=0, boxes=5.0, seed=7).detect(a) == first
+	assert SyntheticBackend(latency_ms=0, boxes=5.0, seed=8).detect(a) != first
+	assert backend.detect(b) != first
+	assert (first["width"], first["height"]) == (320, 240)
+	for det in first["detections"]:
+		x1, y1, x2, y2 = det["bbox"]
+		assert 0 <= x1 < x2 <= 320 and 0 <= y1 < y2 <= 240
+		assert 0.25 <= det["confidence"] <= 0.99
+		assert det["label"] in backend.labels
+	assert backend.calls == 3
+
+
+@pytest.mark.parametrize("distribution", ["fixed", "uniform", "normal", "lognormal", "exponential"])
+def test_latency_distribution_mean_and_bounds(distribution):
+	backend = SyntheticBackend(latency_ms=100, distribution=distribution, jitter=0.2)
+	rng = random.Random(3)
+	draws = [backend.sample_latency_s(rng) for _ in range(4000)]
+	assert min(draws) >= 0.0
+	assert statistics.mean(draws) == pytest.approx(0.1, rel=0.05)
+	if distribution == "fixed":
+		assert set(draws) == {0.1}
+	if distribution == "uniform":
+		assert 0.08 <= min(draws) and max(draws) <= 0.12
+
+
+def test_box_count_is_poisson_around_mean():
+	backend = SyntheticBackend(boxes=3.0)
+	rng = random.Random(5)
+	counts = [backend._poisson(rng) for _ in range(4000)]
+	assert statistics.mean(counts) == pytest.approx(3.0, rel=0.05)
+	assert statistics.variance(counts) == pytest.approx(3.0, rel=0.1)
+	assert SyntheticBackend(boxes=0.0)._poisson(rng) == 0
+
+
+def test_unknown_distribution():
+	with pytest.raises(ValueError):
+		SyntheticBackend(distribution="pareto")
+
+
+def test_cpu_fraction_splits_burn_and_sleep(tmp_path):
+	img = _image(tmp_path)
+	busy = SyntheticBackend(latency_ms=60, distribution="fixed", cpu_fraction=1.0)
+	c0, w0 = time.thread_time(), time.perf_counter()
+	busy.detect(img)
+	assert time.thread_time() - c0 >= 0.06
+	assert time.perf_counter() - w0 >= 0.06
+
+	idle = SyntheticBackend(latency_ms=60, distribution="fixed", cpu_fraction=0.0)
+	c0, w0 = time.thread_time(), time.perf_counter()
+	idle.detect(img)
+	assert time.thread_time() - c0 < 0.04
+	assert time.perf_counter() - w0 >= 0.06
+
+
+def test_memory_is_allocated_and_touched():
+	assert SyntheticBackend(memory_mb=0)._allocate() is None
+	buf = SyntheticBackend(memory_mb=2)._allocate()
+	assert len(buf) == 2 * 1024 * 1024
+	assert buf[::4096] == b"\1" * 512
@@ -0,0 +1,27 @@
+import multiprocessing as mp
+import sys
+import time
+
+import pytest
+
+from src.ml.train_profile import _RssSampler
+
+
+def _hold_memory(mb, seconds):
+	block = bytearray(mb * 1024 * 1024)
+	block[::4096] = b"x" * len(block[::4096])
+	time.sleep(seconds)
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs fork and /proc or psutil")
+def test_sampler_sums_live_workers():
+	sampler = _RssSampler(interval_s=0.05).start()
+	workers = [mp.get_context("fork").Process(target=_hold_memory, args=(64, 0.8)) for _ in range(2)]
+	for w in workers:
+		w.start()
+	for w in workers:
+		w.join()
+	memory = sampler.stop()
+	assert memory["rss_worker_mb"] >= 60
+	# Both workers were alive at the same time, so the peak counts both of them
+	assert memory["peak_rss_mb"] >= memory["rss_main_mb"] + 2 * 60
@@ -0,0 +1,67 @@
+import numpy as np
+
+from src.ml import video
+from src.ml.video import MotionGate
+
+
+def _frame(value, h=36, w=64):
+	return np.full((h, w, 3), value, dtype=np.uint8)
+
+
+def test_gate_skips_static_frames():
+	gate = MotionGate(threshold=6.0, max_skip=0)
+	assert gate.update(_frame(50)) == (True, 255.0)
+	for _ in range(20):
+		send, score = gate.update(_frame(50))
+		assert not send and score == 0.0
+
+
+def test_gate_sends_on_motion_and_moves_reference():
+	gate = MotionGate(threshold=6.0, max_skip=0)
+	gate.update(_frame(50))
+	assert gate.update(_frame(53)) == (False, 3.0)
+	moved = _frame(50)
+	moved[:, :32] = 200  # half the picture changes by 150
+	send, score = gate.update(moved)
+	assert send and score == 75.0
+	# The accepted frame is the new reference
+	assert gate.update(moved) == (False, 0.0)
+
+
+def test_gate_forces_refresh_after_max_skip():
+	gate = MotionGate(threshold=6.0, max_skip=4)
+	sends = [gate.update(_frame(50))[0] for _ in range(10)]
+	assert sends == [True, False, False, False, True, False, False, False, True, False]
+
+
+def _fake_detect(calls):
+	def detect_batch(frames, model_path=None, mock=False):
+		calls.append(len(frames))
+		return [
+			{"detections": [{"label": f"v{int(f[0, 0, 0])}", "confidence": 0.9, "bbox": [0, 0, 1, 1]}], "width": f.shape[1], "height": f.shape[0]}
+			for f in frames
+		]
+	return detect_batch
+
+
+def test_process_stream_reuses_last_detections(monkeypatch):
+	calls = []
+	monkeypatch.setattr(video, "detect_batch", _fake_detect(calls))
+	frames = [_frame(10)] * 3 + [_frame(200)] * 3
+	stats = {}
+	events = list(video.process_stream(frames, mock=True, batch_size=2, max_skip=0, stats=stats))
+
+	assert [ev["inferred"] for ev in events] == [True, False, False, True, False, False]
+	assert [ev["source_frame"] for ev in events] == [0, 0, 0, 3, 3, 3]
+	assert [ev["detections"][0]["label"] for ev in events] == ["v10"] * 3 + ["v200"] * 3
+	assert sum(calls) == stats["inferred"] == 2
+	assert stats["frames"] == 6 and stats["skip_rate"] == round(1 - 2 / 6, 4)
+
+
+def test_process_stream_max_skip_refreshes_static_scene(monkeypatch):
+	calls = []
+	monkeypatch.setattr(video, "detect_batch", _fake_detect(calls))
+	events = list(video.process_stream([_frame(10)] * 7, mock=True, batch_size=1, max_skip=3))
+	assert [ev["frame_index"] for ev in events if ev["inferred"]] == [0, 3, 6]
+	assert [ev["source_frame"] for ev in events] == [0, 0, 0, 3, 3, 3, 6]
+	assert sum(calls) == 3